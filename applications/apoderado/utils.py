@@ -3,6 +3,9 @@ from datetime import datetime, timedelta
 from django.apps import apps
 from django.utils import timezone
 
+from applications.core.asistencia_unificada import resumen
+from applications.core.models import AsistenciaUnificada
+
 
 def _rut_normaliza(rut: str) -> str:
     if not rut:
@@ -50,9 +53,8 @@ def hijos_de_apoderado(user):
 
 def porcentaje_asistencia_semana(estudiante):
     """
-    Calcula % de asistencia de la semana del atleta si hay modelo de asistencia.
-    Busca nombres comunes: core.AsistenciaAtleta, core.AsistenciaAlumno, atleta.Asistencia.
-    Usa asistencia__fecha (fecha está en la cabecera AsistenciaClase).
+    % de asistencia del estudiante en la semana actual, desde la asistencia
+    unificada (cursos, clases de atleta y clases sueltas en una sola consulta).
     """
     if not estudiante:
         return None
@@ -61,35 +63,10 @@ def porcentaje_asistencia_semana(estudiante):
     lunes = hoy - timedelta(days=hoy.weekday())
     domingo = lunes + timedelta(days=6)
 
-    Asis = (
-        get_model("core.AsistenciaAtleta")
-        or get_model("core.AsistenciaAlumno")
-        or get_model("atleta.Asistencia")
-    )
-    if not Asis:
-        return None
-
-    # detectar el nombre del FK hacia el estudiante (p.ej. 'estudiante' o 'atleta')
-    fk_name = None
-    for f in Asis._meta.fields:
-        if f.is_relation and getattr(f, "related_model", None):
-            if f.related_model == estudiante.__class__:
-                fk_name = f.name
-                break
-    if not fk_name:
-        return None
-
-    base = Asis.objects.filter(asistencia__fecha__range=(lunes, domingo))
-    tot = base.filter(**{fk_name: estudiante}).count()
-    if tot == 0:
+    r = resumen(AsistenciaUnificada.objects.filter(estudiante_id=estudiante.pk, fecha__range=(lunes, domingo)))
+    if not r["total"]:
         return 0
-
-    # 'presente' puede no existir en algunos esquemas
-    if "presente" in [f.name for f in Asis._meta.fields]:
-        presentes = base.filter(**{fk_name: estudiante, "presente": True}).count()
-    else:
-        presentes = 0
-    return round((presentes / max(tot, 1)) * 100)
+    return round((r["presentes"] / r["total"]) * 100)
 
 
 def proxima_clase_de(estudiante):
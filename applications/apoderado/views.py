@@ -12,8 +12,9 @@ from .utils import (
     proximas_citas_para, curso_actual_de
 )
 
-from applications.core.models import Comunicado, Estudiante
-from applications.atleta.models import Clase, AsistenciaAtleta
+from applications.core.asistencia_unificada import resumen
+from applications.core.models import AsistenciaUnificada, Comunicado, Estudiante
+from applications.atleta.models import Clase
 ###########################
 
 @login_required
@@ -74,28 +75,15 @@ def asistencia(request):
         hijo = hijos.first() if hasattr(hijos, "first") else None
 
     items = []
-    Asis = (
-        get_model("core.AsistenciaAtleta")
-        or get_model("core.AsistenciaAlumno")
-        or get_model("atleta.Asistencia")
-    )
-    if Asis and hijo:
+    if hijo:
         hoy = timezone.localdate()
         ini = hoy.replace(day=1)
         fin = (ini + timedelta(days=40)).replace(day=1) - timedelta(days=1)
-
-        fk_name = None
-        for f in Asis._meta.fields:
-            if f.is_relation and getattr(f, "related_model", None) == hijo.__class__:
-                fk_name = f.name
-                break
-
-        if fk_name:
-            items = (
-                Asis.objects.select_related("asistencia", "asistencia__profesor")
-                .filter(**{fk_name: hijo, "asistencia__fecha__range": (ini, fin)})
-                .order_by("-asistencia__fecha")
-            )
+        items = (
+            AsistenciaUnificada.objects.select_related("profesor")
+            .filter(estudiante_id=hijo.pk, fecha__range=(ini, fin))
+            .order_by("-fecha", "-inicio")
+        )
 
     return render(
         request,
@@ -236,9 +224,7 @@ def dashboard_apoderado(request):
     # % asistencia promedio
     asistencia_pct = None
     if atletas.exists():
-        total_registros = AsistenciaAtleta.objects.filter(atleta__in=atletas).count()
-        presentes = AsistenciaAtleta.objects.filter(atleta__in=atletas, presente=True).count()
-        asistencia_pct = round((presentes / total_registros) * 100, 1) if total_registros else None
+        asistencia_pct = resumen(AsistenciaUnificada.objects.filter(estudiante__in=atletas))["pct"]
 
     # próxima clase
     prox_clase = (
@@ -0,0 +1,128 @@
+# applications/atleta/alertas.py
+"""
+Alertas de faltas seguidas de los atletas.
+
+Guardar la asistencia de una clase deja pendiente UNA pasada por esa clase
+para después del commit: recalcula Atleta.faltas_consecutivas de todos sus
+atletas con un solo UPDATE (faltas posteriores a su último presente o
+justificado, así que repetir la pasada no suma dos veces) y emite un
+Comunicado por cada racha que llega al umbral. AlertaInasistencia recuerda
+las rachas ya avisadas (atleta + fecha de su primera falta).
+
+Las clases pendientes se juntan por hilo (como services.asistencia.propagar_despues):
+N registros guardados o borrados sueltos en una transacción dejan una sola
+pasada por clase.
+"""
+import threading
+from datetime import date, time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, DateField, IntegerField, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from applications.atleta.models import AlertaInasistencia, AsistenciaAtleta, Atleta, Clase
+from applications.core.models import Comunicado
+
+UMBRAL_FALTAS = 3
+
+_local = threading.local()
+
+
+def _find_author(curso):
+    """
+    Devuelve un autor válido:
+    1) el profesor del curso (si existe),
+    2) un superusuario,
+    3) cualquier usuario existente.
+    """
+    if curso is not None:
+        prof = getattr(curso, "profesor", None)
+        if prof:
+            return prof
+
+    User = get_user_model()
+    su = User.objects.filter(is_superuser=True).first()
+    if su:
+        return su
+
+    return User.objects.order_by("id").first()
+
+
+def _faltas_de_la_racha():
+    """Faltas del atleta (OuterRef) posteriores a su último presente o justificado."""
+    registros = AsistenciaAtleta.objects.filter(atleta_id=OuterRef("pk")).order_by()
+    ultimo_ok = (registros.filter(Q(presente=True) | Q(justificado=True))
+                 .order_by("-clase__fecha", "-clase__hora_inicio"))
+    fecha_ok = Coalesce(Subquery(ultimo_ok.values("clase__fecha")[:1]), Value(date.min), output_field=DateField())
+    hora_ok = Subquery(ultimo_ok.values("clase__hora_inicio")[:1])
+    return registros.filter(presente=False, justificado=False).filter(
+        Q(clase__fecha__gt=fecha_ok) | Q(clase__fecha=fecha_ok, clase__hora_inicio__gt=Coalesce(hora_ok, Value(time.min)))
+    )
+
+
+def procesar_sesion(clase_id, atleta_ids=()):
+    """
+    Actualiza las rachas de los atletas de la clase (más `atleta_ids`: los
+    de registros ya borrados, que no salen en la clase) y emite las alertas nuevas.
+    """
+    atleta_ids = list(set(atleta_ids) | set(
+        AsistenciaAtleta.objects.filter(clase_id=clase_id, atleta__isnull=False).values_list("atleta_id", flat=True)))
+    if not atleta_ids:
+        return 0
+    faltas = _faltas_de_la_racha()
+    with transaction.atomic():
+        # serializa pasadas concurrentes sobre los mismos atletas
+        list(Atleta.objects.select_for_update().filter(pk__in=atleta_ids).values_list("pk", flat=True))
+        Atleta.objects.filter(pk__in=atleta_ids).update(faltas_consecutivas=Coalesce(
+            Subquery(faltas.values("atleta_id").annotate(n=Count("id")).values("n"), output_field=IntegerField()),
+            Value(0),
+        ))
+        en_racha = list(
+            Atleta.objects.filter(pk__in=atleta_ids, faltas_consecutivas__gte=UMBRAL_FALTAS)
+            .select_related("usuario")
+            .annotate(desde=Subquery(faltas.values("atleta_id").annotate(d=Min("clase__fecha")).values("d")))
+        )
+        avisadas = set(AlertaInasistencia.objects.filter(atleta_id__in=[a.pk for a in en_racha])
+                       .values_list("atleta_id", "desde"))
+        nuevas = [a for a in en_racha if (a.pk, a.desde) not in avisadas]
+        if not nuevas:
+            return 0
+
+        clase = Clase.objects.select_related("curso__profesor").filter(pk=clase_id).first()
+        autor = _find_author(clase.curso if clase else None)
+        if not autor:
+            # No hay nadie a quien asignar como autor -> salimos para evitar IntegrityError
+            return 0
+        comunicados = Comunicado.objects.bulk_create([
+            Comunicado(
+                titulo=f"Alerta de inasistencias: {a}",
+                cuerpo=f"{a} acumula {a.faltas_consecutivas} faltas consecutivas.",
+                autor=autor,
+            )
+            for a in nuevas
+        ])
+        AlertaInasistencia.objects.bulk_create([
+            AlertaInasistencia(atleta=a, desde=a.desde, faltas=a.faltas_consecutivas, comunicado=c)
+            for a, c in zip(nuevas, comunicados)
+        ], ignore_conflicts=True)
+    return len(nuevas)
+
+
+def procesar_sesion_despues(clase_id, atleta_ids=()):
+    """
+    Deja pendiente la pasada por `clase_id` para después del commit. El
+    primer callback procesa todas las clases pendientes y los demás no hacen nada.
+    """
+    pendientes = getattr(_local, "pendientes", None)
+    if pendientes is None:
+        pendientes = _local.pendientes = {}
+    pendientes.setdefault(clase_id, set()).update(a for a in atleta_ids if a is not None)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def _procesar_pendientes():
+    pendientes = getattr(_local, "pendientes", None)
+    _local.pendientes = None
+    for clase_id, atleta_ids in (pendientes or {}).items():
+        procesar_sesion(clase_id, atleta_ids)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atleta', '0006_alter_asistenciaatleta_options_and_more'),
+        ('core', '0029_contadores_sesion_ultima_asistencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaInasistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateField()),
+                ('faltas', models.PositiveIntegerField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('atleta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_inasistencia', to='atleta.atleta')),
+                ('comunicado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.comunicado')),
+            ],
+            options={
+                'ordering': ['-creado'],
+                'constraints': [models.UniqueConstraint(fields=('atleta', 'desde'), name='uniq_alerta_atleta_desde')],
+            },
+        ),
+    ]
@@ -186,6 +186,26 @@ class AsistenciaAtleta(models.Model):
         return f"{self.atleta} - {self.clase} : {estado}"
 
 
+class AlertaInasistencia(models.Model):
+    """Alerta ya emitida por una racha de faltas seguidas: una por atleta y racha."""
+    atleta = models.ForeignKey(Atleta, on_delete=models.CASCADE, related_name="alertas_inasistencia")
+    desde = models.DateField()  # fecha de la primera falta de la racha
+    faltas = models.PositiveIntegerField()
+    comunicado = models.ForeignKey(
+        "core.Comunicado", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["atleta", "desde"], name="uniq_alerta_atleta_desde")
+        ]
+        ordering = ["-creado"]
+
+    def __str__(self):
+        return f"{self.atleta} · {self.faltas} faltas desde {self.desde}"
+
+
 class AsistenciaProfesor(models.Model):
     profesor = models.ForeignKey('usuarios.Profesor', on_delete=models.CASCADE)
     fecha = models.DateField(default=timezone.now)
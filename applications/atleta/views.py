@@ -16,10 +16,10 @@ from applications.usuarios.decorators import role_required
 from applications.usuarios.utils import normalizar_rut, formatear_rut
 from applications.usuarios.models import Usuario
 
-from applications.core.models import Estudiante, Curso, Planificacion
+from applications.core.models import AsistenciaUnificada, Estudiante, Curso, Planificacion
 from applications.pmul.models import Disponibilidad, Cita, FichaClinica
 
-from .models import AsistenciaAtleta, Clase, Inscripcion
+from .models import Atleta, Clase, Inscripcion
 
 
 # ----------------- helpers de semana -----------------
@@ -234,23 +234,30 @@ def asistencia_semana(request):
         dia = timezone.localdate()
     d1, d2 = dia - timedelta(days=dia.weekday()), dia + timedelta(days=(6 - dia.weekday()))
 
-    qs = AsistenciaAtleta.objects.select_related("clase").filter(
-        atleta__usuario=request.user,
-        clase__fecha__range=(d1, d2),
-    ).order_by("clase__fecha", "clase__hora_inicio")
-
-    # KPIs
-    total_hist_inasist = AsistenciaAtleta.objects.filter(
-        atleta__usuario=request.user, presente=False
-    ).count()
-    semana_inasist = qs.filter(presente=False).count()
-
+    # asistencia unificada: clases del atleta y sesiones de curso de su ficha de estudiante (mismo RUT)
+    atleta = Atleta.objects.filter(usuario=request.user).only("id", "rut").first()
+    if atleta:
+        filtro = Q(atleta=atleta)
+        estudiante_id = Estudiante.objects.filter(rut=atleta.rut).values_list("id", flat=True).first()
+        if estudiante_id:
+            filtro |= Q(estudiante_id=estudiante_id)
+        base = AsistenciaUnificada.objects.filter(filtro)
+    else:
+        base = AsistenciaUnificada.objects.none()
+    qs = base.filter(fecha__range=(d1, d2)).select_related("profesor").order_by("fecha", "inicio")
+
+    # KPIs (una sola consulta)
     hoy = timezone.localdate()
     m1 = hoy.replace(day=1)
     m2 = (m1 + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    mes_qs = AsistenciaAtleta.objects.filter(atleta__usuario=request.user, clase__fecha__range=(m1, m2))
-    presentes_mes = mes_qs.filter(presente=True).count()
-    total_mes = mes_qs.count()
+    kpi = base.aggregate(
+        total_inasist=Count("id", filter=~Q(estado="P")),
+        semana_inasist=Count("id", filter=Q(fecha__range=(d1, d2)) & ~Q(estado="P")),
+        total_mes=Count("id", filter=Q(fecha__range=(m1, m2))),
+        presentes_mes=Count("id", filter=Q(fecha__range=(m1, m2), estado="P")),
+    )
+    total_hist_inasist, semana_inasist = kpi["total_inasist"], kpi["semana_inasist"]
+    presentes_mes, total_mes = kpi["presentes_mes"], kpi["total_mes"]
     pct_mes = round((presentes_mes / total_mes) * 100, 1) if total_mes else 0
 
     ctx = {
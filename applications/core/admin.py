@@ -2,7 +2,7 @@
 from django.contrib import admin
 from .models import (
     Sede, Deporte, SedeDeporte, Evento,
-    Comunicado, Curso, Planificacion, PlanificacionVersion
+    Comunicado, Curso, Planificacion, PlanificacionVersion, TrabajoReporte
 )
 
 @admin.register(Sede)
@@ -95,4 +95,12 @@ class PlanificacionVersionAdmin(admin.ModelAdmin):
     list_select_related = ("planificacion", "planificacion__curso")
     search_fields = ("planificacion__curso__nombre", )
     date_hierarchy = "creado"
-    ordering = ("-creado",)
\ No newline at end of file
+    ordering = ("-creado",)
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "estado", "intentos", "solicitado_por", "creado", "terminado")
+    list_filter = ("estado", "tipo")
+    readonly_fields = ("clave", "intentos", "error", "iniciado", "terminado", "nombre_archivo", "content_type")
+    exclude = ("contenido",)
+    ordering = ("-creado",)
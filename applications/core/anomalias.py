@@ -0,0 +1,136 @@
+# applications/core/anomalias.py
+"""
+Detección de anomalías de asistencia (la corre `manage.py detectar_anomalias_asistencia`).
+
+Cada corrida evalúa solo las sesiones cuya fila de KpiAsistenciaDiaria
+cambió desde la última marca de agua (MarcaProceso); el historial anterior
+se carga únicamente como base de las estadísticas móviles. Todo se calcula
+con pandas por grupos, sin bucles por curso ni por estudiante:
+
+- curso: % de asistencia de la sesión contra la media y desviación de sus
+  VENTANA sesiones anteriores (z-score). Se marca si z <= Z_UMBRAL.
+- estudiante: AUSENCIAS_SEGUIDAS ausencias (A, no J) consecutivas de alguien
+  que antes asistía al menos TASA_REGULAR % de sus sesiones.
+"""
+from datetime import timedelta
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from applications.core.models import AlertaAsistencia, AsistenciaCursoDetalle, KpiAsistenciaDiaria, MarcaProceso
+
+MARCA = "anomalias_asistencia"
+VENTANA = 8              # sesiones previas para la media móvil
+MIN_SESIONES = 4         # sin esta historia no se evalúa
+Z_UMBRAL = -2.0
+DESVIACION_MIN = 5.0     # puntos %: evita z enormes en cursos muy estables
+AUSENCIAS_SEGUIDAS = 3
+TASA_REGULAR = 75.0
+HISTORIA_DIAS = 180      # cuánto historial se carga como base
+
+
+def _nuevas(desde_marca, hasta):
+    qs = KpiAsistenciaDiaria.objects.filter(actualizado__lte=hasta, total__gt=0)
+    if desde_marca is not None:
+        qs = qs.filter(actualizado__gt=desde_marca)
+    return pd.DataFrame.from_records(qs.values_list("curso_id", "fecha"), columns=["curso_id", "fecha"])
+
+
+def _evaluar(df, nuevas):
+    # solo las filas de sesiones nuevas o modificadas
+    claves = pd.MultiIndex.from_frame(nuevas.assign(fecha=pd.to_datetime(nuevas["fecha"])))
+    return df[pd.MultiIndex.from_frame(df[["curso_id", "fecha"]]).isin(claves)]
+
+
+def caidas_curso(cursos, inicio, nuevas):
+    """Sesiones nuevas con asistencia anormalmente baja para su curso."""
+    df = pd.DataFrame.from_records(
+        KpiAsistenciaDiaria.objects.filter(curso_id__in=cursos, fecha__gte=inicio, total__gt=0)
+        .order_by("curso_id", "fecha").values_list("curso_id", "fecha", "presentes", "total"),
+        columns=["curso_id", "fecha", "presentes", "total"],
+    )
+    if df.empty:
+        return df
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    df["tasa"] = df["presentes"] / df["total"] * 100
+    previas = df.groupby("curso_id")["tasa"].shift(1)
+    movil = previas.groupby(df["curso_id"]).rolling(VENTANA, min_periods=MIN_SESIONES)
+    df["media"] = movil.mean().reset_index(level=0, drop=True)
+    df["desv"] = movil.std(ddof=0).reset_index(level=0, drop=True)
+    df["z"] = (df["tasa"] - df["media"]) / df["desv"].clip(lower=DESVIACION_MIN)
+    df = _evaluar(df, nuevas)
+    return df[df["z"] <= Z_UMBRAL]
+
+
+def ausencias_estudiantes(cursos, inicio, nuevas):
+    """Estudiantes regulares que llegan a AUSENCIAS_SEGUIDAS ausencias seguidas en una sesión nueva."""
+    df = pd.DataFrame.from_records(
+        AsistenciaCursoDetalle.objects.tomados().filter(curso_id__in=cursos, fecha__gte=inicio)
+        .order_by("curso_id", "estudiante_id", "fecha")
+        .values_list("curso_id", "estudiante_id", "fecha", "estado"),
+        columns=["curso_id", "estudiante_id", "fecha", "estado"],
+    )
+    if df.empty:
+        return df
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    grupo = [df["curso_id"], df["estudiante_id"]]
+    ausente = (df["estado"] == "A").astype(int)
+    # largo de la racha de ausencias que termina en cada fila
+    tramo = (1 - ausente).groupby(grupo).cumsum()
+    df["racha"] = ausente.groupby([df["curso_id"], df["estudiante_id"], tramo]).cumsum()
+    # asistencia previa a la racha: sesiones anteriores a las últimas AUSENCIAS_SEGUIDAS
+    presente = (df["estado"] == "P").astype(float).groupby(grupo).shift(AUSENCIAS_SEGUIDAS)
+    df["tasa"] = (presente.groupby(grupo).rolling(VENTANA, min_periods=MIN_SESIONES).mean()
+                  .reset_index(level=[0, 1], drop=True) * 100)
+    df = _evaluar(df, nuevas)
+    return df[(df["racha"] == AUSENCIAS_SEGUIDAS) & (df["tasa"] >= TASA_REGULAR)]
+
+
+def detectar(desde=None):
+    """
+    Evalúa las sesiones modificadas desde la última marca (o todas las
+    sesiones desde `desde`, para recalcular) y guarda las alertas.
+    Devuelve (sesiones evaluadas, alertas nuevas).
+    """
+    ahora = timezone.now()
+    if desde is not None:
+        nuevas = pd.DataFrame.from_records(
+            KpiAsistenciaDiaria.objects.filter(fecha__gte=desde, total__gt=0).values_list("curso_id", "fecha"),
+            columns=["curso_id", "fecha"],
+        )
+    else:
+        marca = MarcaProceso.objects.filter(nombre=MARCA).values_list("marca", flat=True).first()
+        nuevas = _nuevas(marca, ahora)
+
+    alertas = []
+    if not nuevas.empty:
+        cursos = nuevas["curso_id"].unique().tolist()
+        inicio = nuevas["fecha"].min() - timedelta(days=HISTORIA_DIAS)
+        for r in caidas_curso(cursos, inicio, nuevas).itertuples():
+            alertas.append(AlertaAsistencia(
+                tipo=AlertaAsistencia.Tipo.CAIDA_CURSO, curso_id=r.curso_id, fecha=r.fecha.date(),
+                tasa=round(r.tasa, 1), referencia=round(r.media, 1), z=round(r.z, 2),
+                detalle=f"{r.tasa:.0f}% de asistencia frente a {r.media:.0f}% de media en las sesiones anteriores",
+            ))
+        for r in ausencias_estudiantes(cursos, inicio, nuevas).itertuples():
+            alertas.append(AlertaAsistencia(
+                tipo=AlertaAsistencia.Tipo.AUSENCIAS, curso_id=r.curso_id, estudiante_id=r.estudiante_id,
+                fecha=r.fecha.date(), tasa=round(r.tasa, 1),
+                detalle=f"{AUSENCIAS_SEGUIDAS} ausencias seguidas; antes asistía al {r.tasa:.0f}%",
+            ))
+
+    with transaction.atomic():
+        if not nuevas.empty:
+            # una sesión corregida puede dejar de ser anómala: se reemplazan sus alertas sin revisar
+            evaluadas = Q()
+            for curso_id, fechas in nuevas.groupby("curso_id")["fecha"]:
+                evaluadas |= Q(curso_id=curso_id, fecha__in=list(fechas))
+            AlertaAsistencia.objects.filter(evaluadas, revisada=False).delete()
+        antes = AlertaAsistencia.objects.count()
+        AlertaAsistencia.objects.bulk_create(alertas, ignore_conflicts=True)
+        creadas = AlertaAsistencia.objects.count() - antes
+        if desde is None:
+            MarcaProceso.objects.update_or_create(nombre=MARCA, defaults={"marca": ahora})
+    return len(nuevas), creadas
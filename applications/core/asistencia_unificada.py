@@ -0,0 +1,134 @@
+# applications/core/asistencia_unificada.py
+"""
+Proyección unificada de asistencia (AsistenciaUnificada).
+
+La asistencia vive en tres esquemas: AsistenciaCursoDetalle (sesiones de
+curso), atleta.AsistenciaAtleta (por Clase) y AsistenciaAlumno (por
+AsistenciaClase, con ids sueltos). Cada escritura en cualquiera de ellos
+reproyecta solo sus filas con una consulta (valores ya unidos a curso,
+sede y profesor) y un upsert; los portales y reportes leen la proyección
+con una consulta indexada por estudiante, atleta, curso o sede.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from applications.atleta.models import AsistenciaAtleta
+from applications.core.models import (
+    AsistenciaAlumno, AsistenciaCursoDetalle, AsistenciaUnificada, Curso, Estudiante,
+)
+
+Origen = AsistenciaUnificada.Origen
+CAMPOS = ["estudiante", "atleta", "curso", "sede", "profesor", "fecha", "inicio", "fin", "estado"]
+
+
+def _estado(presente, justificado):
+    return "P" if presente else ("J" if justificado else "A")
+
+
+def _filas_curso(qs):
+    for r in qs.tomados().values_list(
+        "id", "estudiante_id", "curso_id", "sede_id",
+        "curso__profesor_id", "fecha", "asistencia__inicio_real",
+        "asistencia__fin_real", "estado",
+    ).iterator(chunk_size=2000):
+        yield AsistenciaUnificada(origen=Origen.CURSO, origen_id=r[0], **dict(zip(
+            ["estudiante_id", "curso_id", "sede_id", "profesor_id", "fecha", "inicio", "fin", "estado"], r[1:]
+        )))
+
+
+def _filas_atleta(qs):
+    # el atleta se une al Estudiante por RUT (son dos registros de la misma persona)
+    qs = qs.annotate(
+        est_id=Subquery(Estudiante.objects.filter(rut=OuterRef("atleta__rut")).values("id")[:1]),
+        sede_ref=Coalesce("clase__curso__sede_id", "clase__sede_deporte__sede_id"),
+    )
+    for r in qs.values_list(
+        "id", "est_id", "atleta_id", "clase__curso_id", "sede_ref", "clase__profesor_id",
+        "clase__fecha", "clase__hora_inicio", "clase__hora_fin", "presente", "justificado",
+    ).iterator(chunk_size=2000):
+        yield AsistenciaUnificada(
+            origen=Origen.ATLETA, origen_id=r[0], estudiante_id=r[1], atleta_id=r[2], curso_id=r[3],
+            sede_id=r[4], profesor_id=r[5], fecha=r[6], inicio=r[7], fin=r[8], estado=_estado(r[9], r[10]),
+        )
+
+
+def _filas_clase(qs):
+    # AsistenciaClase/AsistenciaAlumno guardan ids sin FK: solo se enlazan si existen
+    curso = Curso.objects.filter(pk=OuterRef("asistencia__curso_id"))
+    qs = qs.annotate(
+        est_id=Subquery(Estudiante.objects.filter(pk=OuterRef("estudiante_id")).values("id")[:1]),
+        curso_ref=Subquery(curso.values("id")[:1]),
+        sede_ref=Subquery(curso.values("sede_id")[:1]),
+    )
+    for r in qs.values_list(
+        "id", "est_id", "curso_ref", "sede_ref", "asistencia__profesor_id", "asistencia__fecha",
+        "presente", "justificado",
+    ).iterator(chunk_size=2000):
+        yield AsistenciaUnificada(
+            origen=Origen.CLASE, origen_id=r[0], estudiante_id=r[1], curso_id=r[2], sede_id=r[3],
+            profesor_id=r[4], fecha=r[5], estado=_estado(r[6], r[7]),
+        )
+
+
+FUENTES = {
+    Origen.CURSO: (AsistenciaCursoDetalle, _filas_curso),
+    Origen.ATLETA: (AsistenciaAtleta, _filas_atleta),
+    Origen.CLASE: (AsistenciaAlumno, _filas_clase),
+}
+
+
+def proyectar(origen, **filtro):
+    """Reproyecta los registros de `origen` que cumplen `filtro` (lookups del modelo fuente)."""
+    modelo, filas = FUENTES[origen]
+    nuevas = list(filas(modelo.objects.filter(**filtro)))
+    AsistenciaUnificada.objects.bulk_create(
+        nuevas, update_conflicts=True, unique_fields=["origen", "origen_id"], update_fields=CAMPOS,
+    )
+    return len(nuevas)
+
+
+def quitar(origen, origen_id):
+    AsistenciaUnificada.objects.filter(origen=origen, origen_id=origen_id).delete()
+
+
+def actualizar_curso(curso):
+    """Propaga sede/profesor de un curso editado a sus filas."""
+    AsistenciaUnificada.objects.filter(curso=curso).exclude(sede_id=curso.sede_id).update(sede_id=curso.sede_id)
+    (AsistenciaUnificada.objects.filter(curso=curso, origen=Origen.CURSO)
+     .exclude(profesor_id=curso.profesor_id).update(profesor_id=curso.profesor_id))
+
+
+def enlazar_estudiante(estudiante):
+    """Asocia al estudiante la asistencia de atleta con su mismo RUT."""
+    (AsistenciaUnificada.objects.filter(origen=Origen.ATLETA, atleta__rut=estudiante.rut)
+     .exclude(estudiante_id=estudiante.pk).update(estudiante_id=estudiante.pk))
+
+
+def reconstruir_asistencia_unificada(batch_size=1000):
+    """Recalcula toda la proyección (backfill). Devuelve las filas creadas."""
+    total = 0
+    with transaction.atomic():
+        AsistenciaUnificada.objects.all().delete()
+        for modelo, filas in FUENTES.values():
+            lote = []
+            for fila in filas(modelo.objects.all()):
+                lote.append(fila)
+                if len(lote) >= batch_size:
+                    AsistenciaUnificada.objects.bulk_create(lote)
+                    total, lote = total + len(lote), []
+            AsistenciaUnificada.objects.bulk_create(lote)
+            total += len(lote)
+    return total
+
+
+def resumen(qs):
+    """Totales P/A/J y % de asistencia de un queryset de AsistenciaUnificada, en una consulta."""
+    agg = qs.aggregate(
+        total=Count("id"),
+        presentes=Count("id", filter=Q(estado="P")),
+        ausentes=Count("id", filter=Q(estado="A")),
+        justificados=Count("id", filter=Q(estado="J")),
+    )
+    agg["pct"] = round(agg["presentes"] / agg["total"] * 100, 1) if agg["total"] else None
+    return agg
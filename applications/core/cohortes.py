@@ -0,0 +1,180 @@
+# applications/core/cohortes.py
+"""
+Cohortes de ingreso y retención.
+
+Cada estudiante pertenece a la cohorte del mes en que se registró
+(Estudiante.creado) y tiene un mapa de bits de actividad en
+CohorteEstudiante: el bit k se prende si tuvo al menos un "Presente"
+k meses después de su ingreso. Registrar asistencia solo toca ese bit, y
+el triángulo de retención se arma contando bits, sin volver a recorrer
+AsistenciaCursoDetalle.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from applications.core.kpi_diario import _mes, _mes_siguiente
+from applications.core.models import AsistenciaCursoDetalle, CohorteEstudiante, Curso, Estudiante
+
+MAX_MESES = CohorteEstudiante.MAX_MESES
+
+
+def _desfase(cohorte, fecha):
+    """Meses entre la cohorte y `fecha` (0 = mes de ingreso)."""
+    return (fecha.year - cohorte.year) * 12 + fecha.month - cohorte.month
+
+
+def _cohorte_de(creado):
+    if not creado:
+        return None
+    return _mes(timezone.localtime(creado).date())
+
+
+def _dimensiones(curso):
+    if curso is None:
+        return {"sede_id": None, "programa": ""}
+    return {"sede_id": curso.sede_id, "programa": curso.programa}
+
+
+def _meses_presente(estudiante_ids=None, desde=None):
+    """(estudiante_id, mes) con al menos un Presente, sin repetir."""
+    qs = AsistenciaCursoDetalle.objects.tomados().filter(estado="P")
+    if estudiante_ids is not None:
+        qs = qs.filter(estudiante_id__in=estudiante_ids)
+    if desde is not None:
+        qs = qs.filter(fecha__gte=desde)
+    return (qs.annotate(mes=TruncMonth("fecha"))
+              .values_list("estudiante_id", "mes").distinct())
+
+
+def _bits(cohorte, meses):
+    actividad = 0
+    for mes in meses:
+        k = _desfase(cohorte, mes)
+        if 0 <= k < MAX_MESES:
+            actividad |= 1 << k
+    return actividad
+
+
+def asignar_cohorte(estudiante):
+    """
+    Crea o ajusta la fila de cohorte del estudiante. Si cambia el mes de
+    ingreso el mapa de bits se recalcula desde su asistencia.
+    """
+    cohorte = _cohorte_de(estudiante.creado)
+    if cohorte is None:
+        CohorteEstudiante.objects.filter(estudiante_id=estudiante.pk).delete()
+        return None
+    dims = _dimensiones(Curso.objects.filter(pk=estudiante.curso_id).first() if estudiante.curso_id else None)
+    fila = CohorteEstudiante.objects.filter(estudiante_id=estudiante.pk).first()
+    if fila is not None and fila.cohorte == cohorte:
+        if (fila.sede_id, fila.programa) != (dims["sede_id"], dims["programa"]):
+            CohorteEstudiante.objects.filter(pk=fila.pk).update(**dims, actualizado=timezone.now())
+        return fila
+
+    meses = [m for _, m in _meses_presente([estudiante.pk], desde=cohorte)]
+    fila, _ = CohorteEstudiante.objects.update_or_create(
+        estudiante_id=estudiante.pk,
+        defaults={**dims, "cohorte": cohorte, "actividad": _bits(cohorte, meses)},
+    )
+    return fila
+
+
+def marcar_actividad_grupo(estudiante_ids, fecha):
+    """
+    Recalcula solo el bit del mes de `fecha` para estos estudiantes (un
+    EXISTS por mes, no por estudiante) y lo prende o apaga en la base con
+    UPDATE bit a bit, uno por combinación de cohorte y valor del bit.
+    """
+    estudiante_ids = set(estudiante_ids)
+    filas = dict(CohorteEstudiante.objects.filter(estudiante_id__in=estudiante_ids)
+                 .values_list("estudiante_id", "cohorte"))
+    for estudiante in Estudiante.objects.filter(pk__in=estudiante_ids - set(filas)):
+        asignar_cohorte(estudiante)
+    if not filas:
+        return
+    mes = _mes(fecha)
+    activos = set(AsistenciaCursoDetalle.objects.tomados().filter(
+        estudiante_id__in=list(filas), estado="P",
+        fecha__gte=mes, fecha__lt=_mes_siguiente(mes),
+    ).values_list("estudiante_id", flat=True).distinct())
+
+    grupos = defaultdict(list)
+    for estudiante_id, cohorte in filas.items():
+        k = _desfase(cohorte, fecha)
+        if 0 <= k < MAX_MESES:
+            grupos[(k, estudiante_id in activos)].append(estudiante_id)
+    for (k, activo), ids in grupos.items():
+        bit = 1 << k
+        CohorteEstudiante.objects.filter(estudiante_id__in=ids).update(
+            actividad=F("actividad").bitor(bit) if activo else F("actividad").bitand(~bit),
+            actualizado=timezone.now(),
+        )
+
+
+def actualizar_dimensiones_curso(curso):
+    """Propaga sede/programa del curso a las cohortes de sus estudiantes."""
+    return (CohorteEstudiante.objects.filter(estudiante__curso=curso)
+            .exclude(sede_id=curso.sede_id, programa=curso.programa)
+            .update(**_dimensiones(curso)))
+
+
+def reconstruir_cohortes(batch_size=1000):
+    """Recalcula todas las cohortes (backfill). Devuelve las filas creadas."""
+    meses = defaultdict(list)
+    for estudiante_id, mes in _meses_presente().iterator(chunk_size=batch_size):
+        meses[estudiante_id].append(mes)
+
+    estudiantes = (Estudiante.objects.filter(creado__isnull=False)
+                   .values_list("id", "creado", "curso__sede_id", "curso__programa"))
+    filas = []
+    for pk, creado, sede_id, programa in estudiantes.iterator(chunk_size=batch_size):
+        cohorte = _cohorte_de(creado)
+        filas.append(CohorteEstudiante(
+            estudiante_id=pk, cohorte=cohorte, sede_id=sede_id, programa=programa or "",
+            actividad=_bits(cohorte, meses.get(pk, ())),
+        ))
+    with transaction.atomic():
+        CohorteEstudiante.objects.all().delete()
+        CohorteEstudiante.objects.bulk_create(filas, batch_size=batch_size)
+    return len(filas)
+
+
+def retencion(sede_id="", programa="", desde=None, hasta=None):
+    """
+    Triángulo de retención: por cohorte, su tamaño y el % de estudiantes con
+    actividad en cada mes desde el ingreso (solo meses ya transcurridos).
+    """
+    qs = CohorteEstudiante.objects.all()
+    try:
+        qs = qs.filter(sede_id=int(sede_id))
+    except (TypeError, ValueError):
+        pass
+    if programa:
+        qs = qs.filter(programa=programa)
+    if desde:
+        qs = qs.filter(cohorte__gte=_mes(desde))
+    if hasta:
+        qs = qs.filter(cohorte__lte=_mes(hasta))
+
+    por_cohorte = defaultdict(list)
+    for cohorte, actividad in qs.values_list("cohorte", "actividad").iterator():
+        por_cohorte[cohorte].append(actividad)
+
+    hoy = _mes(timezone.localdate())
+    filas = []
+    for cohorte in sorted(por_cohorte):
+        bits = np.array(por_cohorte[cohorte], dtype=np.int64)
+        n_meses = min(_desfase(cohorte, hoy) + 1, MAX_MESES)
+        activos = [int(((bits >> k) & 1).sum()) for k in range(n_meses)]
+        filas.append({
+            "cohorte": cohorte,
+            "tamano": len(bits),
+            "activos": activos,
+            "pct": [round(a / len(bits) * 100, 1) for a in activos],
+        })
+    return filas
@@ -0,0 +1,72 @@
+# applications/core/eventos.py
+"""
+Bitácora de cambios de asistencia para el tablero en vivo.
+
+Quien escribe asistencia (services.asistencia) deja un EventoAsistencia
+por sesión tocada con su estado y contadores. El tablero arranca con la
+foto del día y un cursor (el último id); después sondea cada
+INTERVALO_SONDEO segundos los eventos desde el cursor. Sin broker: la
+tabla es la cola.
+
+El id se asigna al insertar pero el evento se ve al confirmar, así que una
+transacción más lenta puede publicar un id menor que otro ya leído. Por eso
+cada consulta relee los últimos SOLAPE ids antes del cursor y el cliente
+descarta, por sesión, lo que no sea más nuevo que lo que ya mostró (en una
+misma sesión los ids siguen el orden de confirmación: la escritura bloquea
+sus detalles).
+"""
+from django.db.models import F, Max
+
+from applications.core.models import AsistenciaCurso, EventoAsistencia
+
+INTERVALO_SONDEO = 5    # segundos entre consultas del tablero
+INTERVALO_SSE = 2       # segundos entre consultas del stream (?formato=sse)
+DURACION_SSE = 55       # el stream se corta y el cliente reconecta con Last-Event-ID
+LIMITE = 200            # eventos por consulta
+SOLAPE = 20             # ids antes del cursor que se releen
+
+CAMPOS = ("id", "tipo", "asistencia_id", "curso_id", "sede_id", "fecha", "estado",
+          "presentes", "ausentes", "justificados", "total", "creado")
+
+
+def registrar(asistencias, tipo, usuario=None):
+    """Un evento por sesión con su estado y contadores actuales (una lectura y un insert)."""
+    ids = [a.pk for a in asistencias]
+    if not ids:
+        return []
+    filas = AsistenciaCurso.objects.filter(pk__in=ids).values_list(
+        "pk", "curso_id", "curso__sede_id", "fecha", "estado", "presentes", "ausentes", "justificados", "total",
+    )
+    return EventoAsistencia.objects.bulk_create([
+        EventoAsistencia(
+            tipo=tipo, asistencia_id=pk, curso_id=curso_id, sede_id=sede_id, fecha=fecha, estado=estado,
+            presentes=p, ausentes=a, justificados=j, total=t, usuario=usuario,
+        )
+        for pk, curso_id, sede_id, fecha, estado, p, a, j, t in filas
+    ])
+
+
+def ultimo_cursor():
+    return EventoAsistencia.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def ultimos_por_sesion(asistencia_ids):
+    """{asistencia_id: id de su último evento}, para la foto inicial del tablero."""
+    return dict(EventoAsistencia.objects.filter(asistencia_id__in=list(asistencia_ids))
+                .order_by().values("asistencia_id").annotate(ultimo=Max("id"))
+                .values_list("asistencia_id", "ultimo"))
+
+
+def despues_de(cursor, sede_id=None, limite=LIMITE):
+    """
+    Eventos con id > cursor - SOLAPE (de una sede si se indica), en orden,
+    como dicts serializables. Los repetidos los descarta quien los recibe.
+    """
+    qs = EventoAsistencia.objects.filter(id__gt=max(cursor - SOLAPE, 0))
+    if sede_id is not None:
+        qs = qs.filter(sede_id=sede_id)
+    return list(
+        qs.order_by("id")
+        .annotate(curso_nombre=F("curso__nombre"), sede_nombre=F("sede__nombre"))
+        .values(*CAMPOS, "curso_nombre", "sede_nombre")[:limite]
+    )
@@ -0,0 +1,107 @@
+# applications/core/exports/excel_export.py
+"""
+Exportaciones en streaming (Excel write-only y CSV).
+
+Las filas se escriben a medida que se leen de la BD (.iterator), así que la
+memoria no crece con el historial: el xlsx se arma en un archivo temporal
+(openpyxl write_only) y se envía por trozos; el CSV va directo en un
+StreamingHttpResponse.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+from applications.core.kpi_engine import q_dimensiones
+from applications.core.models import AsistenciaCursoDetalle
+
+CHUNK = 2000
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+DETALLE_COLUMNAS = (
+    ("fecha", "Fecha"),
+    ("curso__nombre", "Curso"),
+    ("sede__nombre", "Sede"),
+    ("curso__disciplina__nombre", "Disciplina"),
+    ("curso__programa", "Programa"),
+    ("estudiante__rut", "RUT"),
+    ("estudiante__nombres", "Nombres"),
+    ("estudiante__apellidos", "Apellidos"),
+    ("estado", "Estado"),
+    ("observaciones", "Observaciones"),
+)
+_ESTADOS = dict(AsistenciaCursoDetalle.ESTADOS)
+
+
+def detalle_qs(programa="", sede_id="", dep_id="", inicio=None, fin=None):
+    """Registros de asistencia (uno por alumno y sesión) con los filtros de los tableros."""
+    qs = AsistenciaCursoDetalle.objects.tomados().filter(q_dimensiones("detalles", programa, sede_id, dep_id))
+    if inicio:
+        qs = qs.filter(fecha__gte=inicio)
+    if fin:
+        qs = qs.filter(fecha__lte=fin)
+    return qs.order_by("fecha", "curso_id", "id")
+
+
+def filas_detalle(qs):
+    i_estado = [c for c, _ in DETALLE_COLUMNAS].index("estado")
+    for fila in qs.values_list(*[c for c, _ in DETALLE_COLUMNAS]).iterator(chunk_size=CHUNK):
+        fila = list(fila)
+        fila[i_estado] = _ESTADOS.get(fila[i_estado], fila[i_estado])
+        yield fila
+
+
+def hoja_detalle(qs):
+    return ("Detalle asistencia", [t for _, t in DETALLE_COLUMNAS], filas_detalle(qs))
+
+
+def hoja_df(titulo, df, index=False):
+    """(titulo, encabezado, filas) desde un DataFrame (agregados ya acotados)."""
+    if index:
+        df = df.reset_index()
+    return (titulo, [str(c) for c in df.columns], df.itertuples(index=False, name=None))
+
+
+def hoja_dicts(titulo, filas):
+    encabezado = list(filas[0].keys()) if filas else []
+    return (titulo, encabezado, ([f[c] for c in encabezado] for f in filas))
+
+
+def respuesta_xlsx(nombre, hojas):
+    """
+    `hojas`: iterable de (titulo, encabezado, filas). Cada fila se agrega al
+    libro write-only apenas se lee, y el archivo resultante se envía por
+    trozos (FileResponse cierra y borra el temporal al terminar).
+    """
+    wb = Workbook(write_only=True)
+    for titulo, encabezado, filas in hojas:
+        ws = wb.create_sheet(title=titulo[:31])
+        if encabezado:
+            ws.append(encabezado)
+        for fila in filas:
+            ws.append(list(fila))
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=nombre, content_type=XLSX)
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre, encabezado, filas):
+    writer = csv.writer(_Eco(), delimiter=";")
+
+    def _lineas():
+        yield "\ufeff"  # BOM: Excel abre el CSV en UTF-8
+        yield writer.writerow(encabezado)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    resp = StreamingHttpResponse(_lineas(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return resp
@@ -0,0 +1,73 @@
+# applications/core/exports/graficos.py
+"""
+Gráficos de los PDF KPI dibujados en el servidor (matplotlib, sin pyplot).
+
+Cada gráfico se describe con un dict {tipo, titulo, etiquetas, series, ...}
+y el PNG resultante se guarda en la caché de Django bajo el hash de esa
+descripción: los mismos datos no se vuelven a dibujar.
+"""
+import base64
+import hashlib
+import io
+import json
+
+from django.core.cache import cache
+from matplotlib.figure import Figure
+
+TTL_PNG = 60 * 60 * 24 * 7
+COLORES = ["#0e7c86", "#ef4444", "#f59e0b", "#3b82f6", "#a855f7"]
+
+
+def _clave(spec):
+    crudo = json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str)
+    return "kpi:png:" + hashlib.sha256(crudo.encode()).hexdigest()
+
+
+def _dibujar(spec):
+    fig = Figure(figsize=spec.get("tamano", (7, 3)), dpi=150)
+    ax = fig.subplots()
+    etiquetas, series = spec["etiquetas"], spec["series"]
+    tipo = spec["tipo"]
+
+    if tipo == "torta":
+        ax.pie(series, labels=etiquetas, colors=COLORES, autopct="%1.0f%%",
+               wedgeprops={"width": 0.45}, textprops={"fontsize": 8})
+        ax.set_aspect("equal")
+    elif tipo == "barras_h":
+        pos = range(len(etiquetas))
+        ax.barh(pos, series, color=COLORES[0])
+        ax.set_yticks(list(pos), etiquetas, fontsize=7)
+        ax.invert_yaxis()
+        if spec.get("max"):
+            ax.set_xlim(0, spec["max"])
+    else:
+        pos = range(len(etiquetas))
+        if tipo == "linea":
+            ax.plot(pos, series, color=COLORES[0], marker="o", markersize=3)
+            ax.fill_between(pos, series, color=COLORES[0], alpha=0.12)
+        else:
+            ax.bar(pos, series, color=COLORES[0])
+        paso = max(1, len(etiquetas) // 12)
+        ax.set_xticks(list(pos)[::paso], etiquetas[::paso], rotation=45, ha="right", fontsize=7)
+        ax.set_ylim(0, spec.get("max") or None)
+    if tipo != "torta":
+        ax.tick_params(axis="y", labelsize=7)
+        ax.grid(axis="x" if tipo == "barras_h" else "y", alpha=0.3)
+        for lado in ("top", "right"):
+            ax.spines[lado].set_visible(False)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def png_base64(spec):
+    """PNG del gráfico en base64 (para <img src="data:...">), o "" si no hay datos."""
+    if not spec["etiquetas"] or not any(spec["series"]):
+        return ""
+    clave = _clave(spec)
+    png = cache.get(clave)
+    if png is None:
+        png = base64.b64encode(_dibujar(spec)).decode("ascii")
+        cache.set(clave, png, TTL_PNG)
+    return png
@@ -0,0 +1,184 @@
+# applications/core/exports/pdf_export.py
+"""
+Caché en disco de los PDF de los tableros KPI.
+
+Cada PDF se guarda en MEDIA_ROOT/kpi_pdf/ con el nombre del sha256 de lo
+que determina su contenido (filtros, periodo y firma de los contadores de
+kpi_cache) más la versión de las plantillas: si nada de eso cambió, el
+archivo ya generado es idéntico y se sirve sin calcular los paneles ni
+pasar por WeasyPrint.
+
+El tamaño total se limita con KPI_PDF_CACHE_MAX_BYTES; al pasarse se borran
+los archivos usados hace más tiempo (cada lectura actualiza el mtime).
+Los contadores de aciertos/fallos viven en la caché de Django, compartida
+entre procesos.
+
+renderizar() arma el PDF con las plantillas de impresión (pdf_kpi_*.html)
+y los gráficos ya rasterizados, sin pasar por el HTML interactivo.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+from weasyprint import HTML
+
+log = logging.getLogger(__name__)
+
+VERSION = 1  # subir si cambia la forma de generar el PDF (no solo las plantillas)
+MAX_BYTES = 200 * 1024 * 1024
+LOGO = "img/logo/mi_logo.png"
+CONTADORES = ("aciertos", "fallos", "desalojos")
+
+
+def directorio():
+    return Path(getattr(settings, "KPI_PDF_CACHE_DIR", None) or Path(settings.MEDIA_ROOT) / "kpi_pdf")
+
+
+def _max_bytes():
+    return getattr(settings, "KPI_PDF_CACHE_MAX_BYTES", MAX_BYTES)
+
+
+@lru_cache(maxsize=None)
+def version_plantillas(*nombres):
+    """Hash del fuente de las plantillas (se lee una vez por proceso)."""
+    h = hashlib.sha256(str(VERSION).encode())
+    for nombre in nombres:
+        origen = get_template(nombre).origin.name
+        with open(origen, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def huella(contenido, plantillas=()):
+    crudo = json.dumps(contenido, sort_keys=True, ensure_ascii=False, default=str)
+    h = hashlib.sha256(version_plantillas(*plantillas).encode())
+    h.update(crudo.encode())
+    return h.hexdigest()
+
+
+def _ruta(clave):
+    return directorio() / f"{clave}.pdf"
+
+
+def _contar(nombre):
+    clave = f"kpi:pdf:{nombre}"
+    cache.add(clave, 0, None)
+    try:
+        cache.incr(clave)
+    except ValueError:  # expiró entre add e incr
+        cache.set(clave, 1, None)
+
+
+def leer(clave):
+    """Bytes del PDF en caché, o None."""
+    ruta = _ruta(clave)
+    try:
+        with open(ruta, "rb") as f:
+            pdf = f.read()
+    except FileNotFoundError:
+        _contar("fallos")
+        return None
+    try:
+        os.utime(ruta)  # marca de uso para el LRU
+    except FileNotFoundError:  # desalojado recién; ya tenemos los bytes
+        pass
+    _contar("aciertos")
+    return pdf
+
+
+def guardar(clave, pdf):
+    """Escribe el PDF (rename atómico) y aplica el límite de tamaño."""
+    carpeta = directorio()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, _ruta(clave))
+    except OSError:
+        log.exception("No se pudo guardar el PDF %s en caché", clave)
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        return
+    desalojar()
+
+
+def _archivos():
+    try:
+        entradas = list(os.scandir(directorio()))
+    except FileNotFoundError:
+        return []
+    archivos = []
+    for e in entradas:
+        if not e.name.endswith(".pdf"):
+            continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:  # otro proceso lo acaba de borrar
+            continue
+        archivos.append((st.st_mtime, st.st_size, e.path))
+    return archivos
+
+
+def desalojar(max_bytes=None):
+    """Borra los PDF menos usados hasta quedar bajo el límite. Devuelve cuántos borró."""
+    limite = _max_bytes() if max_bytes is None else max_bytes
+    archivos = _archivos()
+    total = sum(tam for _, tam, _ in archivos)
+    borrados = 0
+    for _, tam, ruta in sorted(archivos):
+        if total <= limite:
+            break
+        try:
+            os.unlink(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tam
+        borrados += 1
+        _contar("desalojos")
+    return borrados
+
+
+def estadisticas():
+    archivos = _archivos()
+    datos = {n: cache.get(f"kpi:pdf:{n}", 0) for n in CONTADORES}
+    datos.update(archivos=len(archivos), bytes=sum(tam for _, tam, _ in archivos), max_bytes=_max_bytes())
+    consultas = datos["aciertos"] + datos["fallos"]
+    datos["tasa_aciertos"] = round(datos["aciertos"] / consultas * 100, 1) if consultas else 0.0
+    return datos
+
+
+def vaciar():
+    """Borra todos los PDF y reinicia los contadores."""
+    n = desalojar(max_bytes=-1)
+    cache.delete_many([f"kpi:pdf:{c}" for c in CONTADORES])
+    return n
+
+
+def _logo_url():
+    ruta = finders.find(LOGO)
+    return Path(ruta).as_uri() if ruta else ""
+
+
+def renderizar(plantilla, contexto):
+    """PDF desde una plantilla de impresión; `contexto["graficos"]` trae specs de graficos.py."""
+    # matplotlib solo se carga en el proceso que genera PDF
+    from applications.core.exports import graficos
+
+    ctx = dict(
+        contexto,
+        graficos=[dict(g, png=graficos.png_base64(g)) for g in contexto.get("graficos", ())],
+        ahora=timezone.localtime(),
+        logo_url=_logo_url(),
+    )
+    html = render_to_string(plantilla, ctx)
+    return HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf()
@@ -0,0 +1,193 @@
+# applications/core/kpi_agregados.py
+"""
+Agregados KPI en la BD sobre las tablas de hechos (KpiAsistenciaDiaria y
+KpiAsistenciaMensual): es la ruta de los tableros y las exportaciones Excel.
+
+Cada función recibe el queryset ya filtrado (kpi_diario_qs / kpi_mensual_qs)
+y deja que la BD haga el GROUP BY; a Python solo llegan las filas agregadas
+(cursos, profesores, meses o días), nunca el tramo completo de hechos.
+benchmark_kpi la compara con un backend columnar de referencia (pandas).
+"""
+from datetime import timedelta
+
+import pandas as pd
+from django.db.models import F, FloatField, Q, Sum
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear, TruncMonth
+
+from applications.core.models import KpiAsistenciaMensual
+
+SUMAS = ("sesiones", "sesiones_cerradas", "presentes", "ausentes", "justificados", "total")
+
+
+def _tasa(parte, total):
+    # total == 0 -> 0.0 (igual que kpi_engine._pct)
+    return round(parte / total * 100, 1) if total else 0.0
+
+
+def _fecha(qs):
+    return "mes" if qs.model is KpiAsistenciaMensual else "fecha"
+
+
+def _mes(qs):
+    campo = _fecha(qs)
+    return F(campo) if campo == "mes" else TruncMonth(campo)
+
+
+def _razon(parte, total):
+    return Cast(parte, FloatField()) / F(total)
+
+
+def top_inasistencia(qs, limite):
+    """Cursos con mayor % de ausentes + justificados sobre el total de registros."""
+    filas = (qs.order_by().values("curso_id", "curso__nombre")
+             .annotate(total=Sum("total"), ina=Sum(F("ausentes") + F("justificados")))
+             .filter(total__gt=0)
+             .annotate(razon=_razon("ina", "total"))
+             .order_by("-razon", "curso__nombre")[:limite])
+    return [{"curso_id": r["curso_id"], "curso": r["curso__nombre"], "pct": _tasa(r["ina"], r["total"]),
+             "total": r["total"]} for r in filas]
+
+
+def top_prof_bajo_cumpl(qs, limite):
+    """Profesores con menor % de sesiones cerradas."""
+    filas = (qs.order_by().values("profesor__first_name", "profesor__last_name")
+             .annotate(sesiones=Sum("sesiones"), cerradas=Sum("sesiones_cerradas"))
+             .filter(sesiones__gt=0)
+             .annotate(razon=_razon("cerradas", "sesiones"))
+             .order_by("razon", "profesor__last_name", "profesor__first_name")[:limite])
+    salida = []
+    for r in filas:
+        prof = f'{r["profesor__first_name"] or ""} {r["profesor__last_name"] or ""}'.strip() or "—"
+        salida.append({"prof": prof, "pct": _tasa(r["cerradas"], r["sesiones"]), "total": r["sesiones"]})
+    return salida
+
+
+def serie_mensual(qs, meses=None, campo="sesiones"):
+    """
+    Suma de `campo` por mes. Con `meses` (primer día de cada mes) se alinea
+    a esa lista; sin `meses`, {mes: suma} de los meses con registros.
+    """
+    filas = qs.order_by().annotate(m=_mes(qs)).values("m").annotate(v=Sum(campo)).order_by("m")
+    por_mes = {r["m"]: r["v"] or 0 for r in filas}
+    if meses is None:
+        return por_mes
+    return [por_mes.get(m, 0) for m in meses]
+
+
+def serie_diaria(qs, dias=None, campo="sesiones"):
+    """Como serie_mensual, por día (sobre los hechos diarios)."""
+    filas = qs.order_by().values("fecha").annotate(v=Sum(campo)).order_by("fecha")
+    por_dia = {r["fecha"]: r["v"] or 0 for r in filas}
+    if dias is None:
+        return por_dia
+    return [por_dia.get(d, 0) for d in dias]
+
+
+def tasa_asistencia_movil(qs, dias, ventana=7):
+    """% de asistencia en una ventana móvil de `ventana` días, para cada día de `dias`."""
+    desde = dias[0] - timedelta(days=ventana - 1)
+    por_dia = {r["fecha"]: (r["p"] or 0, r["t"] or 0) for r in (
+        qs.filter(fecha__range=(desde, dias[-1])).order_by()
+        .values("fecha").annotate(p=Sum("presentes"), t=Sum("total")))}
+    salida = []
+    for d in dias:
+        p = t = 0
+        for i in range(ventana):
+            dp, dt = por_dia.get(d - timedelta(days=i), (0, 0))
+            p, t = p + dp, t + dt
+        salida.append(_tasa(p, t))
+    return salida
+
+
+def totales(qs):
+    """Suma de cada contador sobre el queryset."""
+    fila = qs.order_by().aggregate(**{c: Sum(c) for c in SUMAS})
+    return {c: fila[c] or 0 for c in SUMAS}
+
+
+def ventanas_moviles(qs, fin, tamanos):
+    """
+    Para cada tamaño N: totales de los últimos N días hasta `fin` y de los N
+    días anteriores (para la variación). Una sola consulta con sumas
+    condicionales sobre los hechos diarios de los últimos 2*max(tamanos) días.
+    """
+    tramos = {}
+    for n in tamanos:
+        tramos[("actual", n)] = (fin - timedelta(days=n - 1), fin)
+        tramos[("previo", n)] = (fin - timedelta(days=2 * n - 1), fin - timedelta(days=n))
+    campos = ("sesiones", "presentes", "ausentes", "justificados", "total")
+    fila = qs.filter(fecha__range=(fin - timedelta(days=2 * max(tamanos) - 1), fin)).order_by().aggregate(**{
+        f"{t}_{n}_{c}": Sum(c, filter=Q(fecha__range=rango)) for (t, n), rango in tramos.items() for c in campos
+    })
+
+    salida = []
+    for n in tamanos:
+        actual, previo = ({c: fila[f"{t}_{n}_{c}"] or 0 for c in campos} for t in ("actual", "previo"))
+        tasa = _tasa(actual["presentes"], actual["total"])
+        tasa_previa = _tasa(previo["presentes"], previo["total"])
+        salida.append({
+            "dias": n,
+            "desde": tramos[("actual", n)][0],
+            "sesiones": actual["sesiones"],
+            "total": actual["total"],
+            "tasa_asist": tasa,
+            "tasa_inasist": _tasa(actual["ausentes"] + actual["justificados"], actual["total"]),
+            "delta_sesiones": (round((actual["sesiones"] - previo["sesiones"]) / previo["sesiones"] * 100, 1)
+                               if previo["sesiones"] else None),
+            "delta_tasa_asist": round(tasa - tasa_previa, 1) if actual["total"] and previo["total"] else None,
+        })
+    return salida
+
+
+def resumen_interanual(qs, anios):
+    """
+    Totales por año (alineados a `anios`) con la variación respecto al año
+    anterior: % en clases y registros, puntos porcentuales en la tasa de
+    asistencia. El primer año (o uno sin base) queda con delta None.
+    """
+    filas = (qs.order_by().annotate(anio=ExtractYear(_fecha(qs))).values("anio")
+             .annotate(**{c: Sum(c) for c in SUMAS}))
+    por_anio = {r["anio"]: r for r in filas}
+
+    def variacion(actual, previo):
+        return round((actual - previo) / previo * 100, 1) if previo else None
+
+    salida, previo = [], None
+    for a in anios:
+        r = {c: por_anio.get(a, {}).get(c) or 0 for c in SUMAS}
+        fila = {
+            "anio": a, "sesiones": r["sesiones"], "total": r["total"],
+            "tasa_asist": _tasa(r["presentes"], r["total"]),
+            "tasa_inasist": _tasa(r["ausentes"] + r["justificados"], r["total"]),
+            "delta_sesiones": None, "delta_total": None, "delta_tasa_asist": None,
+        }
+        if previo is not None:
+            fila["delta_sesiones"] = variacion(fila["sesiones"], previo["sesiones"])
+            fila["delta_total"] = variacion(fila["total"], previo["total"])
+            if fila["total"] and previo["total"]:
+                fila["delta_tasa_asist"] = round(fila["tasa_asist"] - previo["tasa_asist"], 1)
+        salida.append(fila)
+        previo = fila
+    return salida
+
+
+def serie_por_anio(qs, anios, campo="sesiones"):
+    """{año: [12 valores por mes]} para comparar los mismos meses entre años."""
+    campo_fecha = _fecha(qs)
+    series = {a: [0] * 12 for a in anios}
+    for r in (qs.order_by().annotate(a=ExtractYear(campo_fecha), m=ExtractMonth(campo_fecha))
+              .values("a", "m").annotate(v=Sum(campo))):
+        if r["a"] in series:
+            series[r["a"]][r["m"] - 1] = r["v"] or 0
+    return {str(a): v for a, v in series.items()}
+
+
+def pivote_curso_mes(qs, campo="sesiones"):
+    """Tabla curso x mes (AAAA-MM) con la suma de `campo`."""
+    filas = list(qs.order_by().annotate(m=_mes(qs)).values("curso__nombre", "m").annotate(v=Sum(campo)))
+    if not filas:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(filas)
+    df["m"] = pd.to_datetime(df["m"]).dt.strftime("%Y-%m")
+    tabla = df.pivot_table(index="curso__nombre", columns="m", values="v", aggfunc="sum", fill_value=0)
+    return tabla.rename_axis(index="curso", columns=None).sort_index(axis=1)
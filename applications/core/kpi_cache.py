@@ -0,0 +1,161 @@
+# applications/core/kpi_cache.py
+"""
+Caché de resultados de los tableros KPI.
+
+Cada resultado se guarda bajo (modo, programa, sede, disciplina, periodo)
+junto con la "firma" de los contadores de generación que lo afectan. Las
+escrituras (señales) actualizan esos contadores por sede y año; cuando la
+firma ya no coincide, un solo worker recalcula (lock con cache.add) y el
+resto sigue sirviendo el último resultado bueno mientras tanto (y lo
+anota en obsoletos_servidos, para no publicarlo con la firma nueva).
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = "kpi"
+TTL_RESULTADO = 60 * 60 * 24 * 7   # último resultado bueno
+TTL_LOCK = 120                     # igual al timeout de gunicorn
+
+TODO = "todo"        # cambios que afectan todos los años (p.ej. editar un curso)
+GENERAL = "general"  # tablero general (sin periodo)
+GLOBAL = "global"
+
+_local = threading.local()
+
+
+def _clave_gen(sede, anio):
+    return f"{PREFIJO}:gen:{sede if sede is not None else '*'}:{anio}"
+
+
+def _claves_escritura(sede_id, anio):
+    sedes = ["*"] if sede_id is None else [sede_id, "*"]
+    claves = []
+    for s in sedes:
+        claves.append(_clave_gen(s, anio if anio is not None else TODO))
+        claves.append(_clave_gen(s, GENERAL))
+    return claves
+
+
+def _sede(sede_id):
+    # Un id inválido no filtra (ver kpi_engine.q_dimensiones): se lee como "todas"
+    try:
+        return int(sede_id)
+    except (TypeError, ValueError):
+        return "*"
+
+
+def _claves_lectura(sede_id, inicio=None, fin=None):
+    s = _sede(sede_id)
+    claves = [f"{PREFIJO}:gen:{GLOBAL}"]
+    if inicio is None or fin is None:
+        claves.append(_clave_gen(s, GENERAL))
+    else:
+        claves.append(_clave_gen(s, TODO))
+        claves += [_clave_gen(s, y) for y in range(inicio.year, fin.year + 1)]
+    return claves
+
+
+def _aplicar_invalidaciones():
+    alcances = getattr(_local, "alcances", None) or set()
+    _local.alcances = None
+    ahora = time.time()
+    claves = {}
+    for sede_id, anio in alcances:
+        if sede_id == GLOBAL:
+            claves[f"{PREFIJO}:gen:{GLOBAL}"] = ahora
+            continue
+        for k in _claves_escritura(sede_id, anio):
+            claves[k] = ahora
+    if claves:
+        cache.set_many(claves, timeout=None)
+
+
+def invalidar(sede_id=None, anio=None):
+    """
+    Marca como obsoletos los resultados de `sede_id` (None = sin sede) para
+    el año `anio` (None = todos los años). Se aplica al confirmar la
+    transacción en curso; el primer callback escribe todos los alcances
+    pendientes en un solo set_many y los demás no hacen nada.
+    """
+    alcances = getattr(_local, "alcances", None)
+    if alcances is None:
+        alcances = _local.alcances = set()
+    alcances.add((sede_id, anio))
+    transaction.on_commit(_aplicar_invalidaciones)
+
+
+def invalidar_todo():
+    invalidar(GLOBAL)
+
+
+def _generaciones(claves):
+    """
+    Valores de los contadores. Uno que falta (nunca escrito, o descartado
+    por el cull de la caché) se siembra con la hora actual: la firma cambia
+    en vez de volver a la de un contador en 0, con la que quedaron guardados
+    resultados y PDF viejos.
+    """
+    valores = cache.get_many(claves)
+    faltan = [k for k in claves if k not in valores]
+    if faltan:
+        ahora = time.time()
+        for k in faltan:
+            cache.add(k, ahora, timeout=None)
+        valores.update(cache.get_many(faltan))
+    return valores
+
+
+def _firma(claves, valores):
+    marcas = [valores.get(k, 0) for k in claves]
+    return hashlib.sha1(repr(marcas).encode()).hexdigest()[:16], max(marcas)
+
+
+def firma_kpi(sede_id="", inicio=None, fin=None):
+    """(firma, última modificación) de los contadores que afectan a una vista."""
+    claves = _claves_lectura(sede_id, inicio, fin)
+    return _firma(claves, _generaciones(claves))
+
+
+def obsoletos_servidos():
+    """Cuántos resultados obsoletos devolvió kpi_cacheado en este hilo (solo crece)."""
+    return getattr(_local, "obsoletos", 0)
+
+
+def _clave_resultado(modo, programa, sede_id, dep_id, periodo):
+    crudo = "|".join([modo, programa or "", str(_sede(sede_id)), str(dep_id or ""), periodo or ""])
+    return f"{PREFIJO}:res:{hashlib.sha1(crudo.encode()).hexdigest()}"
+
+
+def kpi_cacheado(modo, programa, sede_id, dep_id, periodo, calcular, inicio=None, fin=None):
+    """
+    Devuelve calcular() desde la caché. Si el resultado guardado quedó
+    obsoleto y otro worker ya lo está recalculando, se devuelve el anterior.
+
+    Un resultado con alerta_filtros (respaldo "sin filtros") depende de
+    todas las sedes, así que se valida contra los contadores globales.
+    """
+    clave = _clave_resultado(modo, programa, sede_id, dep_id, periodo)
+    claves = {"sede": _claves_lectura(sede_id, inicio, fin), "*": _claves_lectura("", inicio, fin)}
+    valores = _generaciones(list(dict.fromkeys(claves["sede"] + claves["*"])))
+    firmas = {alcance: _firma(ks, valores)[0] for alcance, ks in claves.items()}
+
+    entrada = cache.get(clave)
+    if entrada and entrada["firma"] == firmas[entrada["alcance"]]:
+        return entrada["datos"]
+
+    lock = f"{clave}:lock"
+    if entrada and not cache.add(lock, 1, timeout=TTL_LOCK):
+        _local.obsoletos = obsoletos_servidos() + 1
+        return entrada["datos"]
+    try:
+        datos = calcular()
+        alcance = "*" if datos.get("alerta_filtros") else "sede"
+        cache.set(clave, {"firma": firmas[alcance], "alcance": alcance, "datos": datos}, timeout=TTL_RESULTADO)
+    finally:
+        if entrada:
+            cache.delete(lock)
+    return datos
@@ -0,0 +1,141 @@
+# applications/core/kpi_cubo.py
+"""
+Cubo de asistencia para el drill-down sede → disciplina → curso → estudiante.
+
+El cubo es el resumen mensual (KpiAsistenciaMensual): trae los contadores
+ya sumados por curso y mes junto a sus dimensiones (programa, sede,
+disciplina, profesor), así que cualquier corte es un GROUP BY sobre unas
+pocas filas por curso. Solo el último nivel (estudiantes de un curso) baja
+a AsistenciaCursoDetalle, acotado a ese curso y periodo.
+"""
+from django.db.models import Count, Q, Sum
+
+from applications.core.kpi_diario import CONTADORES, _mes, _mes_siguiente
+from applications.core.models import AsistenciaCursoDetalle, Curso, Deporte, KpiAsistenciaMensual, Sede
+from applications.usuarios.models import Usuario
+
+# nivel -> (campo id en el cubo, campos del nombre)
+DIMENSIONES = {
+    "programa": ("programa", ()),
+    "sede": ("sede_id", ("sede__nombre",)),
+    "disciplina": ("disciplina_id", ("disciplina__nombre",)),
+    "curso": ("curso_id", ("curso__nombre",)),
+    "profesor": ("profesor_id", ("profesor__first_name", "profesor__last_name")),
+}
+NIVELES = (*DIMENSIONES, "estudiante")
+SIGUIENTE = {
+    "programa": "sede",
+    "sede": "disciplina",
+    "disciplina": "curso",
+    "profesor": "curso",
+    "curso": "estudiante",
+    "estudiante": None,
+}
+PROGRAMAS = dict(Curso.Programa.choices)
+
+
+def _a_entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def limpiar_filtros(datos):
+    """Filtros válidos del querystring: programa (código) y los ids de las demás dimensiones."""
+    filtros = {}
+    if datos.get("programa") in PROGRAMAS:
+        filtros["programa"] = datos["programa"]
+    for dim in ("sede", "disciplina", "curso", "profesor"):
+        valor = _a_entero(datos.get(dim))
+        if valor is not None:
+            filtros[dim] = valor
+    return filtros
+
+
+def _fila(pk, nombre, c):
+    total, sesiones = c.get("total") or 0, c.get("sesiones") or 0
+    presentes = c.get("presentes") or 0
+    inasist = (c.get("ausentes") or 0) + (c.get("justificados") or 0)
+    return {
+        "id": pk,
+        "nombre": nombre or "—",
+        "sesiones": sesiones,
+        "total": total,
+        "presentes": presentes,
+        "ausentes": c.get("ausentes") or 0,
+        "justificados": c.get("justificados") or 0,
+        "tasa_asist": round(presentes / total * 100, 1) if total else 0.0,
+        "tasa_inasist": round(inasist / total * 100, 1) if total else 0.0,
+        # % de sesiones cerradas; no aplica a la fila de un estudiante
+        "cumpl": round((c["sesiones_cerradas"] or 0) / sesiones * 100, 1) if sesiones and "sesiones_cerradas" in c else None,
+    }
+
+
+def _cubo(filtros, desde, hasta):
+    qs = KpiAsistenciaMensual.objects.filter(**{DIMENSIONES[d][0]: v for d, v in filtros.items()})
+    if desde:
+        qs = qs.filter(mes__gte=_mes(desde))
+    if hasta:
+        qs = qs.filter(mes__lte=hasta)
+    return qs.order_by()
+
+
+def _estudiantes(filtros, desde, hasta):
+    # hoja del drill-down: solo con un curso elegido
+    if "curso" not in filtros:
+        return []
+    qs = AsistenciaCursoDetalle.objects.tomados().filter(curso_id=filtros["curso"])
+    if desde:
+        qs = qs.filter(fecha__gte=_mes(desde))
+    if hasta:
+        qs = qs.filter(fecha__lt=_mes_siguiente(_mes(hasta)))
+    filas = (qs.order_by().values("estudiante_id", "estudiante__nombres", "estudiante__apellidos")
+               .annotate(total=Count("id"),
+                         presentes=Count("id", filter=Q(estado="P")),
+                         ausentes=Count("id", filter=Q(estado="A")),
+                         justificados=Count("id", filter=Q(estado="J"))))
+    return [
+        _fila(f["estudiante_id"], f"{f['estudiante__nombres']} {f['estudiante__apellidos']}".strip(),
+              dict(f, sesiones=f["total"]))
+        for f in filas
+    ]
+
+
+def cortar(nivel, filtros, desde=None, hasta=None):
+    """
+    Filas del nivel pedido (una por valor de la dimensión) dentro del corte
+    `filtros`, ordenadas por % de inasistencia, más el total del corte.
+    """
+    totales = _cubo(filtros, desde, hasta).aggregate(**{c: Sum(c) for c in CONTADORES})
+    if nivel == "estudiante":
+        filas = _estudiantes(filtros, desde, hasta)
+    else:
+        campo_id, campos_nombre = DIMENSIONES[nivel]
+        filas = []
+        agrupado = (_cubo(filtros, desde, hasta).values(campo_id, *campos_nombre)
+                    .annotate(**{c: Sum(c) for c in CONTADORES}))
+        for g in agrupado:
+            if nivel == "programa":
+                nombre = PROGRAMAS.get(g[campo_id], g[campo_id])
+            else:
+                nombre = " ".join(g[c] or "" for c in campos_nombre).strip()
+            filas.append(_fila(g[campo_id], nombre, g))
+    filas.sort(key=lambda f: (-f["tasa_inasist"], f["nombre"]))
+    return {"filas": filas, "total": _fila(None, "Total", totales)}
+
+
+def migas(filtros):
+    """Nombre de cada filtro aplicado, en el orden del drill-down."""
+    modelos = {"sede": Sede, "disciplina": Deporte, "curso": Curso, "profesor": Usuario}
+    salida = []
+    for dim in ("programa", "sede", "disciplina", "profesor", "curso"):
+        if dim not in filtros:
+            continue
+        if dim == "programa":
+            nombre = PROGRAMAS[filtros[dim]]
+        else:
+            obj = modelos[dim].objects.filter(pk=filtros[dim]).first()
+            nombre = (obj.get_full_name() if dim == "profesor" else str(getattr(obj, "nombre", ""))) if obj else "—"
+        salida.append({"nivel": dim, "id": filtros[dim], "nombre": nombre or "—", "siguiente": SIGUIENTE[dim]})
+    return salida
@@ -0,0 +1,244 @@
+# applications/core/kpi_diario.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from applications.core import kpi_cache
+from applications.core.sesiones import TOMADOS
+from applications.core.models import (
+    AsistenciaCurso, AsistenciaCursoDetalle, Curso, KpiAsistenciaDiaria, KpiAsistenciaMensual,
+)
+
+CONTADORES = ("presentes", "ausentes", "justificados", "total", "sesiones", "sesiones_cerradas")
+
+
+def _dimensiones(curso):
+    return {
+        "sede_id": curso.sede_id,
+        "disciplina_id": curso.disciplina_id,
+        "programa": curso.programa,
+        "profesor_id": curso.profesor_id,
+    }
+
+
+def refrescar_kpi_diario(curso_id, fecha):
+    """
+    Recalcula la fila (curso, fecha) de la tabla de hechos a partir de la
+    sesión de ese día. Si la sesión ya no existe o aún no se toma (nómina
+    pregenerada, día futuro), elimina la fila.
+    """
+    with transaction.atomic():
+        asistencia = (
+            AsistenciaCurso.objects
+            .select_related("curso")
+            .filter(curso_id=curso_id, fecha=fecha)
+            .first()
+        )
+        agg = {"total": 0}
+        if asistencia:
+            agg = AsistenciaCursoDetalle.objects.tomados().filter(asistencia=asistencia).aggregate(
+                total=Count("id"),
+                presentes=Count("id", filter=Q(estado="P")),
+                ausentes=Count("id", filter=Q(estado="A")),
+                justificados=Count("id", filter=Q(estado="J")),
+            )
+        if not agg["total"]:
+            KpiAsistenciaDiaria.objects.filter(curso_id=curso_id, fecha=fecha).delete()
+            refrescar_kpi_mensual(curso_id, fecha)
+            return None
+
+        fila, _ = KpiAsistenciaDiaria.objects.update_or_create(
+            curso_id=curso_id,
+            fecha=fecha,
+            defaults={
+                **_dimensiones(asistencia.curso),
+                **agg,
+                "sesiones": 1,
+                "sesiones_cerradas": 1 if asistencia.estado == AsistenciaCurso.Estado.CERR else 0,
+            },
+        )
+        refrescar_kpi_mensual(curso_id, fecha)
+        return fila
+
+
+def _mes(fecha):
+    return fecha.replace(day=1)
+
+
+def _mes_siguiente(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def refrescar_kpi_mensual(curso_id, fecha):
+    """
+    Recalcula la fila (curso, mes) del resumen mensual sumando las filas
+    diarias de ese mes (a lo más 31). Sin filas diarias, la elimina.
+    """
+    mes = _mes(fecha)
+    with transaction.atomic():
+        agg = KpiAsistenciaDiaria.objects.filter(
+            curso_id=curso_id, fecha__gte=mes, fecha__lt=_mes_siguiente(mes)
+        ).aggregate(n=Count("id"), **{c: Sum(c) for c in CONTADORES})
+        curso = Curso.objects.filter(pk=curso_id).first()
+        if not agg.pop("n") or curso is None:
+            KpiAsistenciaMensual.objects.filter(curso_id=curso_id, mes=mes).delete()
+            return None
+        fila, _ = KpiAsistenciaMensual.objects.update_or_create(
+            curso_id=curso_id, mes=mes, defaults={**_dimensiones(curso), **agg},
+        )
+        return fila
+
+
+def actualizar_dimensiones_curso(curso):
+    """Propaga sede/disciplina/programa/profesor del curso a sus filas de hechos."""
+    n = 0
+    for modelo in (KpiAsistenciaDiaria, KpiAsistenciaMensual):
+        n += modelo.objects.filter(curso_id=curso.pk).exclude(
+            sede_id=curso.sede_id,
+            disciplina_id=curso.disciplina_id,
+            programa=curso.programa,
+            profesor_id=curso.profesor_id,
+        ).update(**_dimensiones(curso))
+    return n
+
+
+def compactar_kpi_mensual(desde=None, hasta=None, batch_size=1000):
+    """
+    Reconstruye el resumen mensual desde la tabla diaria (todo el historial o
+    los meses que tocan [desde, hasta]). Devuelve las filas creadas.
+    """
+    diarios = KpiAsistenciaDiaria.objects.all()
+    mensuales = KpiAsistenciaMensual.objects.all()
+    if desde:
+        diarios = diarios.filter(fecha__gte=_mes(desde))
+        mensuales = mensuales.filter(mes__gte=_mes(desde))
+    if hasta:
+        diarios = diarios.filter(fecha__lt=_mes_siguiente(_mes(hasta)))
+        mensuales = mensuales.filter(mes__lte=_mes(hasta))
+
+    filas = (
+        diarios
+        .annotate(m=TruncMonth("fecha"))
+        .values("curso_id", "m", "curso__sede_id", "curso__disciplina_id", "curso__programa", "curso__profesor_id")
+        .annotate(**{f"n_{c}": Sum(c) for c in CONTADORES})
+        .order_by()
+    )
+
+    creadas = 0
+    with transaction.atomic():
+        mensuales.delete()
+        lote = []
+        for f in filas.iterator(chunk_size=batch_size):
+            lote.append(KpiAsistenciaMensual(
+                curso_id=f["curso_id"],
+                mes=f["m"],
+                sede_id=f["curso__sede_id"],
+                disciplina_id=f["curso__disciplina_id"],
+                programa=f["curso__programa"],
+                profesor_id=f["curso__profesor_id"],
+                **{c: f[f"n_{c}"] or 0 for c in CONTADORES},
+            ))
+            if len(lote) >= batch_size:
+                KpiAsistenciaMensual.objects.bulk_create(lote)
+                creadas += len(lote)
+                lote = []
+        if lote:
+            KpiAsistenciaMensual.objects.bulk_create(lote)
+            creadas += len(lote)
+        kpi_cache.invalidar_todo()
+    return creadas
+
+
+def reconstruir_kpi_diario(desde=None, hasta=None, batch_size=1000):
+    """
+    Reconstruye la tabla de hechos desde AsistenciaCurso/AsistenciaCursoDetalle
+    (todo el historial o el rango [desde, hasta]; solo sesiones ya tomadas
+    hasta hoy). Devuelve las filas creadas.
+    """
+    sesiones = AsistenciaCurso.objects.filter(fecha__lte=timezone.localdate())
+    hechos = KpiAsistenciaDiaria.objects.all()
+    if desde:
+        sesiones = sesiones.filter(fecha__gte=desde)
+        hechos = hechos.filter(fecha__gte=desde)
+    if hasta:
+        sesiones = sesiones.filter(fecha__lte=hasta)
+        hechos = hechos.filter(fecha__lte=hasta)
+
+    sesiones = (
+        sesiones
+        .values(
+            "curso_id", "fecha", "estado",
+            "curso__sede_id", "curso__disciplina_id", "curso__programa", "curso__profesor_id",
+        )
+        .annotate(
+            n_total=Count("detalles", filter=Q(detalles__estado__in=TOMADOS)),
+            n_p=Count("detalles", filter=Q(detalles__estado="P")),
+            n_a=Count("detalles", filter=Q(detalles__estado="A")),
+            n_j=Count("detalles", filter=Q(detalles__estado="J")),
+        )
+        .order_by()
+    )
+
+    creadas = 0
+    with transaction.atomic():
+        hechos.delete()
+        lote = []
+        for s in sesiones.iterator(chunk_size=batch_size):
+            if not s["n_total"]:
+                continue
+            lote.append(KpiAsistenciaDiaria(
+                curso_id=s["curso_id"],
+                fecha=s["fecha"],
+                sede_id=s["curso__sede_id"],
+                disciplina_id=s["curso__disciplina_id"],
+                programa=s["curso__programa"],
+                profesor_id=s["curso__profesor_id"],
+                presentes=s["n_p"],
+                ausentes=s["n_a"],
+                justificados=s["n_j"],
+                total=s["n_total"],
+                sesiones=1,
+                sesiones_cerradas=1 if s["estado"] == AsistenciaCurso.Estado.CERR else 0,
+            ))
+            if len(lote) >= batch_size:
+                KpiAsistenciaDiaria.objects.bulk_create(lote)
+                creadas += len(lote)
+                lote = []
+        if lote:
+            KpiAsistenciaDiaria.objects.bulk_create(lote)
+            creadas += len(lote)
+        compactar_kpi_mensual(desde, hasta, batch_size)
+        kpi_cache.invalidar_todo()
+    return creadas
+
+
+def kpi_diario_qs(programa="", sede_id="", dep_id="", inicio=None, fin=None, modelo=KpiAsistenciaDiaria):
+    """Queryset de hechos diarios con los filtros estándar de los tableros
+    (un filtro con valor inválido se ignora, igual que _sf en las vistas)."""
+    qs = modelo.objects.all()
+    campo = "mes" if modelo is KpiAsistenciaMensual else "fecha"
+    filtros = {}
+    if programa:
+        filtros["programa__icontains"] = programa
+    if sede_id:
+        filtros["sede_id"] = sede_id
+    if dep_id:
+        filtros["disciplina_id"] = dep_id
+    if inicio:
+        filtros[f"{campo}__gte"] = _mes(inicio) if campo == "mes" else inicio
+    if fin:
+        filtros[f"{campo}__lte"] = fin
+    for k, v in filtros.items():
+        try:
+            qs = qs.filter(**{k: v})
+        except (TypeError, ValueError):
+            pass
+    return qs
+
+
+def kpi_mensual_qs(programa="", sede_id="", dep_id="", inicio=None, fin=None):
+    """Como kpi_diario_qs, sobre el resumen mensual (el periodo se redondea a meses completos)."""
+    return kpi_diario_qs(programa, sede_id, dep_id, inicio, fin, modelo=KpiAsistenciaMensual)
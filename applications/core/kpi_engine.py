@@ -0,0 +1,205 @@
+# applications/core/kpi_engine.py
+"""
+Motor de KPIs de los tableros de reportes.
+
+Cada tarjeta se declara una sola vez en METRICAS (modelo base + agregado
+condicional) y calcular_kpis() resuelve un conjunto de tarjetas con UNA
+consulta por modelo base. El respaldo "sin filtros" del tablero general se
+calcula en esa misma consulta (agregados filtrados y sin filtrar).
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from django.db.models import Count, Q, Sum
+
+from applications.core.models import (
+    AsistenciaCursoDetalle, Curso, Estudiante, KpiAsistenciaDiaria, OcupacionSede, Planificacion,
+)
+from applications.core.ocupacion import VENTANA_SEMANAS
+from applications.usuarios.models import Usuario
+
+
+@dataclass(frozen=True)
+class Base:
+    modelo: type
+    prefijo: Optional[str]          # ruta hasta programa/sede/disciplina; None = no se filtra
+    periodo: Optional[str] = None   # campo fecha que acota el periodo del tablero
+    condicion: Q = field(default_factory=Q)
+    dimensiones: tuple = ("programa", "sede", "disciplina")   # filtros que aplican al modelo
+    curso: Optional[str] = None     # FK a Curso con la sede copiada: lo demás se filtra sin join
+
+
+@dataclass(frozen=True)
+class Metrica:
+    base: str
+    funcion: type = Count
+    campo: str = "id"
+    condicion: Q = field(default_factory=Q)
+    periodo: Optional[str] = None   # reemplaza el campo de periodo de la base
+
+
+@dataclass(frozen=True)
+class Derivada:
+    requiere: tuple
+    calculo: Callable
+
+
+def _pct(parte, total):
+    return round((parte/total)*100, 1) if total else 0.0
+
+
+BASES = {
+    "estudiantes":     Base(Estudiante, prefijo="curso__"),
+    "cursos":          Base(Curso, prefijo=""),
+    "planificaciones": Base(Planificacion, prefijo="curso__", periodo="semana"),
+    "asistencia":      Base(KpiAsistenciaDiaria, prefijo="", periodo="fecha"),
+    "profesores":      Base(Usuario, prefijo=None, condicion=Q(tipo_usuario=Usuario.Tipo.PROF)),
+    # sin métricas: solo filtra el detalle crudo de las exportaciones
+    "detalles":        Base(AsistenciaCursoDetalle, prefijo="", periodo="fecha", curso="curso"),
+    # grilla por sede y ventana móvil: sin programa/disciplina ni periodo
+    "ocupacion":       Base(OcupacionSede, prefijo="", dimensiones=("sede",),
+                            condicion=Q(sede__capacidad__gt=0)),
+}
+
+METRICAS = {
+    "total_estudiantes": Metrica("estudiantes"),
+    "activos":           Metrica("estudiantes", condicion=Q(activo=True)),
+    "nuevos":            Metrica("estudiantes", periodo="creado"),
+    "total_cursos":      Metrica("cursos"),
+    "plan_total":        Metrica("planificaciones"),
+    "plan_publicas":     Metrica("planificaciones", condicion=Q(publica=True)),
+    "clases_total":      Metrica("asistencia", Sum, "sesiones"),
+    "clases_cerradas":   Metrica("asistencia", Sum, "sesiones_cerradas"),
+    "detalles_total":    Metrica("asistencia", Sum, "total"),
+    "presentes":         Metrica("asistencia", Sum, "presentes"),
+    "ausentes":          Metrica("asistencia", Sum, "ausentes"),
+    "justificadas":      Metrica("asistencia", Sum, "justificados"),
+    "total_profesores":  Metrica("profesores"),
+    # personas por bloque (suma de la ventana) vs. capacidad de los bloques con uso
+    "ocupacion_real":    Metrica("ocupacion", Sum, "asistentes_real"),
+    "ocupacion_cap":     Metrica("ocupacion", Sum, "sede__capacidad"),
+}
+
+DERIVADAS = {
+    "cumpl_plan":   Derivada(("plan_publicas", "plan_total"),
+                             lambda v: _pct(v["plan_publicas"], v["plan_total"])),
+    "uso_recintos": Derivada(("ocupacion_real", "ocupacion_cap"),
+                             lambda v: _pct(v["ocupacion_real"] / VENTANA_SEMANAS, v["ocupacion_cap"])),
+    "tasa_asist":   Derivada(("presentes", "detalles_total"),
+                             lambda v: _pct(v["presentes"], v["detalles_total"])),
+    "tasa_inasist": Derivada(("ausentes", "justificadas", "detalles_total"),
+                             lambda v: _pct(v["ausentes"] + v["justificadas"], v["detalles_total"])),
+    "ratio_ep":     Derivada(("total_estudiantes", "total_profesores"),
+                             lambda v: round(v["total_estudiantes"]/v["total_profesores"], 1)
+                             if v["total_profesores"] else 0.0),
+}
+
+# Si todas estas vienen en cero con filtros, el tablero general cae a "sin filtros"
+RESPALDO_SI_VACIO = ("total_estudiantes", "clases_total", "detalles_total")
+RESPALDO_TOTALES  = ("total_estudiantes", "total_cursos", "clases_total", "detalles_total")
+
+# Conjuntos de tarjetas por tablero
+TARJETAS_GENERAL = (
+    "total_estudiantes", "activos", "total_cursos", "cumpl_plan", "uso_recintos",
+    "tasa_asist", "tasa_inasist", "ratio_ep",
+    "clases_total", "detalles_total", "presentes", "ausentes", "justificadas", "plan_total",
+)
+TARJETAS_PERIODO = (
+    "nuevos", "clases_total", "cumpl_plan", "uso_recintos", "plan_total",
+    "detalles_total", "presentes", "ausentes", "justificadas",
+)
+
+
+def _a_entero(v):
+    # Un id inválido se ignora (igual que _sf en las vistas)
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def q_dimensiones(base, programa="", sede_id="", dep_id=""):
+    """Q con los filtros programa/sede/disciplina para el modelo de `base`."""
+    b = BASES[base]
+    if b.prefijo is None:
+        return Q()
+    sede_id, dep_id = _a_entero(sede_id), _a_entero(dep_id)
+    filtros = {}
+    if programa and "programa" in b.dimensiones:
+        filtros["programa__icontains"] = programa
+    if sede_id is not None and "sede" in b.dimensiones:
+        filtros["sede_id"] = sede_id
+    if dep_id is not None and "disciplina" in b.dimensiones:
+        filtros["disciplina_id"] = dep_id
+    if b.curso is None:
+        return Q(**{f"{b.prefijo}{k}": v for k, v in filtros.items()})
+    # sede directo; programa/disciplina con curso_id IN (subconsulta), no con un join a Curso
+    q = Q(sede_id=filtros.pop("sede_id")) if "sede_id" in filtros else Q()
+    if filtros:
+        q &= Q(**{f"{b.curso}__in": Curso.objects.filter(**filtros).values("pk")})
+    return q
+
+
+def _q_periodo(campo, inicio, fin):
+    q = Q()
+    if campo and inicio:
+        q &= Q(**{f"{campo}__gte": inicio})
+    if campo and fin:
+        q &= Q(**{f"{campo}__lte": fin})
+    return q
+
+
+def _resolver(claves):
+    base_claves, pendientes = [], list(claves)
+    while pendientes:
+        c = pendientes.pop(0)
+        if c in DERIVADAS:
+            pendientes.extend(DERIVADAS[c].requiere)
+        elif c in METRICAS:
+            if c not in base_claves:
+                base_claves.append(c)
+        else:
+            raise KeyError(f"Métrica KPI desconocida: {c}")
+    return base_claves
+
+
+def calcular_kpis(claves, programa="", sede_id="", dep_id="", inicio=None, fin=None, respaldo=False):
+    """
+    Calcula las métricas `claves` (de METRICAS o DERIVADAS) para un juego de
+    filtros. Devuelve (valores, alerta_filtros); alerta_filtros es True cuando
+    `respaldo` está activo y los filtros dejaron todo en cero, en cuyo caso
+    los valores corresponden a "sin filtros".
+    """
+    claves = list(claves)
+    base_claves = _resolver(claves + (list(RESPALDO_TOTALES) if respaldo else []))
+
+    por_base = {}
+    for c in base_claves:
+        por_base.setdefault(METRICAS[c].base, []).append(c)
+
+    filtrado, todo = {}, {}
+    for nombre, cs in por_base.items():
+        base = BASES[nombre]
+        q_dim = q_dimensiones(nombre, programa, sede_id, dep_id)
+        agregados = {}
+        for c in cs:
+            m = METRICAS[c]
+            q = m.condicion & _q_periodo(m.periodo or base.periodo, inicio, fin)
+            # alias con prefijo: un alias igual al nombre del campo choca en aggregate()
+            agregados[f"f_{c}"] = m.funcion(m.campo, filter=q & q_dim)
+            if respaldo and q_dim:
+                agregados[f"t_{c}"] = m.funcion(m.campo, filter=q)
+        fila = base.modelo.objects.filter(base.condicion).aggregate(**agregados)
+        for c in cs:
+            filtrado[c] = fila[f"f_{c}"] or 0
+            todo[c] = fila.get(f"t_{c}", fila[f"f_{c}"]) or 0
+
+    alerta_filtros = False
+    valores = filtrado
+    if respaldo and not any(filtrado[c] for c in RESPALDO_SI_VACIO) and any(todo[c] for c in RESPALDO_TOTALES):
+        valores, alerta_filtros = todo, True
+
+    salida = {}
+    for c in claves:
+        salida[c] = DERIVADAS[c].calculo(valores) if c in DERIVADAS else valores[c]
+    return salida, alerta_filtros
@@ -0,0 +1,137 @@
+# applications/core/management/commands/benchmark_kpi.py
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from applications.core import kpi_agregados
+from applications.core.management import kpi_columnar
+from applications.core.models import Curso, KpiAsistenciaDiaria
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _ruta_orm(qs, meses):
+    """Ruta de los tableros: GROUP BY en la BD (kpi_agregados)."""
+    return (kpi_agregados.top_inasistencia(qs, 5),
+            kpi_agregados.top_prof_bajo_cumpl(qs, 10),
+            kpi_agregados.serie_mensual(qs, meses))
+
+
+def _ruta_columnar(qs, meses, df=None):
+    if df is None:
+        df = kpi_columnar.desde_queryset(qs)
+    return (kpi_columnar.top_inasistencia(df, 5),
+            kpi_columnar.top_prof_bajo_cumpl(df, 10),
+            kpi_columnar.serie_mensual(df, meses))
+
+
+class Command(BaseCommand):
+    help = ("Compara el cálculo KPI por ORM (GROUP BY en la BD, la ruta de los tableros) con el backend "
+            "columnar (pandas). "
+            "Genera datos sintéticos equivalentes a --detalles registros de asistencia dentro de "
+            "una transacción que se revierte al terminar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--detalles", type=int, default=1_000_000,
+                            help="Registros de asistencia (AsistenciaCursoDetalle) a simular.")
+        parser.add_argument("--por-sesion", type=int, default=20, help="Alumnos promedio por sesión.")
+        parser.add_argument("--cursos", type=int, default=200)
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--usar-datos", action="store_true",
+                            help="Medir sobre los datos existentes sin generar datos sintéticos.")
+
+    def handle(self, *args, **opts):
+        if opts["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser al menos 1.")
+        try:
+            with transaction.atomic():
+                if not opts["usar_datos"]:
+                    self._sembrar(opts["detalles"], opts["por_sesion"], opts["cursos"])
+                self._medir(opts["repeticiones"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _sembrar(self, detalles, por_sesion, n_cursos):
+        base = Curso.objects.first()
+        if base is None:
+            raise CommandError("Se necesita al menos un curso (se usa como plantilla de sede/disciplina/profesor).")
+        if por_sesion < 1 or n_cursos < 1:
+            raise CommandError("--por-sesion y --cursos deben ser mayores que 0.")
+
+        cursos = Curso.objects.bulk_create([
+            Curso(nombre=f"Benchmark {i}", programa=random.choice(["FORM", "ALTO"]),
+                  disciplina_id=base.disciplina_id, profesor_id=base.profesor_id, sede_id=base.sede_id)
+            for i in range(n_cursos)
+        ])
+        sesiones = max(1, detalles // por_sesion)
+        por_curso = -(-sesiones // n_cursos)
+        hoy = timezone.localdate()
+        rnd = random.Random(42)
+
+        lote, creadas = [], 0
+        for c in cursos:
+            for d in range(por_curso):
+                if creadas + len(lote) >= sesiones:
+                    break
+                total = rnd.randint(max(1, por_sesion // 2), por_sesion * 3 // 2)
+                a = rnd.randint(0, total // 3)
+                j = rnd.randint(0, (total - a) // 4)
+                lote.append(KpiAsistenciaDiaria(
+                    curso_id=c.pk, fecha=hoy - timedelta(days=d), sede_id=base.sede_id,
+                    disciplina_id=base.disciplina_id, programa=c.programa, profesor_id=base.profesor_id,
+                    presentes=total - a - j, ausentes=a, justificados=j, total=total,
+                    sesiones=1, sesiones_cerradas=rnd.random() < 0.8,
+                ))
+                if len(lote) >= 5000:
+                    KpiAsistenciaDiaria.objects.bulk_create(lote)
+                    creadas += len(lote)
+                    lote = []
+        KpiAsistenciaDiaria.objects.bulk_create(lote)
+        creadas += len(lote)
+        self.stdout.write(f"Datos sintéticos: {creadas} fila(s) diarias (~{creadas * por_sesion} detalles), "
+                          f"{n_cursos} curso(s).")
+
+    def _medir(self, repeticiones):
+        qs = KpiAsistenciaDiaria.objects.all()
+        fechas = qs.order_by().values_list("fecha", flat=True)
+        primera, ultima = fechas.order_by("fecha").first(), fechas.order_by("-fecha").first()
+        if primera is None:
+            raise CommandError("No hay filas en KpiAsistenciaDiaria para medir.")
+        meses, m = [], primera.replace(day=1)
+        while m <= ultima:
+            meses.append(m)
+            m = (m + timedelta(days=32)).replace(day=1)
+
+        resultados = {}
+        for nombre, ruta in (("ORM", _ruta_orm), ("Columnar", _ruta_columnar)):
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                salida = ruta(qs, meses)
+                tiempos.append(time.perf_counter() - t0)
+            resultados[nombre] = salida
+            self.stdout.write(f"{nombre:<9} mejor {min(tiempos)*1000:9.1f} ms | "
+                              f"media {sum(tiempos)/len(tiempos)*1000:9.1f} ms")
+
+        # Desglose: la carga (una sola consulta) se comparte entre todos los paneles
+        t0 = time.perf_counter()
+        df = kpi_columnar.desde_queryset(qs)
+        t1 = time.perf_counter()
+        _ruta_columnar(qs, meses, df)
+        t2 = time.perf_counter()
+        self.stdout.write(f"          carga {(t1 - t0)*1000:.1f} ms ({len(df)} filas) + cálculo {(t2 - t1)*1000:.1f} ms")
+
+        top_orm, prof_orm, serie_orm = resultados["ORM"]
+        top_col, prof_col, serie_col = resultados["Columnar"]
+        iguales = ([r["pct"] for r in top_orm] == [r["pct"] for r in top_col]
+                   and [r["pct"] for r in prof_orm] == [r["pct"] for r in prof_col]
+                   and serie_orm == serie_col)
+        estilo = self.style.SUCCESS if iguales else self.style.WARNING
+        self.stdout.write(estilo("Resultados equivalentes." if iguales else "Los resultados difieren."))
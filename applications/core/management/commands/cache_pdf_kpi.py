@@ -0,0 +1,24 @@
+# applications/core/management/commands/cache_pdf_kpi.py
+from django.core.management.base import BaseCommand
+
+from applications.core.exports import pdf_export
+
+
+class Command(BaseCommand):
+    help = "Muestra el uso de la caché de PDF de los tableros KPI (aciertos, fallos, tamaño)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vaciar", action="store_true",
+                            help="Borrar todos los PDF guardados y reiniciar los contadores.")
+
+    def handle(self, *args, **opts):
+        if opts["vaciar"]:
+            n = pdf_export.vaciar()
+            self.stdout.write(self.style.SUCCESS(f"Caché vaciada: {n} archivo(s) eliminado(s)."))
+            return
+        e = pdf_export.estadisticas()
+        self.stdout.write(f"Directorio: {pdf_export.directorio()}")
+        self.stdout.write(f"Archivos:   {e['archivos']} ({e['bytes'] / 1024 / 1024:.1f} de "
+                          f"{e['max_bytes'] / 1024 / 1024:.0f} MB)")
+        self.stdout.write(f"Aciertos:   {e['aciertos']} | Fallos: {e['fallos']} | "
+                          f"Tasa: {e['tasa_aciertos']}% | Desalojos: {e['desalojos']}")
@@ -0,0 +1,34 @@
+# applications/core/management/commands/compactar_kpi_mensual.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.core.kpi_diario import compactar_kpi_mensual
+
+
+def _fecha(valor, nombre):
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"--{nombre} debe tener formato AAAA-MM-DD (recibido: {valor!r}).")
+
+
+class Command(BaseCommand):
+    help = ("Reconstruye el resumen mensual (KpiAsistenciaMensual) a partir de la tabla diaria. "
+            "Se ejecuta una vez tras migrar; después se mantiene solo al registrar asistencia.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Fecha inicial (AAAA-MM-DD); se toma el mes completo. Por defecto, todo el historial.")
+        parser.add_argument("--hasta", help="Fecha final (AAAA-MM-DD); se toma el mes completo.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        desde = _fecha(opts.get("desde"), "desde")
+        hasta = _fecha(opts.get("hasta"), "hasta")
+        if desde and hasta and desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+
+        n = compactar_kpi_mensual(desde=desde, hasta=hasta, batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"KPI mensual compactado: {n} fila(s)."))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.core.anomalias import detectar
+
+
+class Command(BaseCommand):
+    help = ("Busca caídas de asistencia por curso (z-score sobre la media móvil) y estudiantes regulares con "
+            "ausencias seguidas en las sesiones registradas desde la última corrida, y guarda las alertas que "
+            "ve el coordinador. Pensado para correr periódicamente (cron), p. ej. cada hora.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Reevaluar todas las sesiones desde esta fecha (AAAA-MM-DD) "
+                                            "en vez de solo las nuevas. No mueve la marca de agua.")
+
+    def handle(self, *args, **opts):
+        desde = None
+        if opts.get("desde"):
+            try:
+                desde = date.fromisoformat(opts["desde"])
+            except ValueError:
+                raise CommandError(f"--desde debe tener formato AAAA-MM-DD (recibido: {opts['desde']!r}).")
+        sesiones, alertas = detectar(desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"{sesiones} sesión(es) evaluada(s), {alertas} alerta(s) nueva(s)."))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.core.services.asistencia import pregenerar_sesiones
+
+
+class Command(BaseCommand):
+    help = ("Crea por adelantado las sesiones de asistencia (AsistenciaCurso) de los próximos días según los "
+            "horarios de cada curso, con la nómina completa sin tomar, para que abrir la toma de asistencia solo "
+            "lea. Nada cuenta en KPIs, rachas o cohortes hasta que el profesor guarda. Pensado para correr "
+            "una vez al día (cron) antes de la primera clase.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=7, help="Días a generar desde --desde (por defecto 7).")
+        parser.add_argument("--desde", help="Primer día (AAAA-MM-DD); por defecto hoy.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        desde = None
+        if opts.get("desde"):
+            try:
+                desde = date.fromisoformat(opts["desde"])
+            except ValueError:
+                raise CommandError(f"--desde debe tener formato AAAA-MM-DD (recibido: {opts['desde']!r}).")
+        if opts["dias"] < 1:
+            raise CommandError("--dias debe ser al menos 1.")
+        r = pregenerar_sesiones(desde=desde, dias=opts["dias"], batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sesiones creadas: {r['sesiones']}, detalles creados: {r['detalles']}."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from applications.core.asistencia_unificada import reconstruir_asistencia_unificada
+
+
+class Command(BaseCommand):
+    help = ("Recalcula la asistencia unificada (AsistenciaUnificada) desde los tres esquemas de asistencia. "
+            "Necesario una vez para el historial; después se mantiene sola con cada registro.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        n = reconstruir_asistencia_unificada(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Asistencia unificada reconstruida: {n} registro(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from applications.core.cohortes import reconstruir_cohortes
+
+
+class Command(BaseCommand):
+    help = ("Recalcula las cohortes de ingreso (CohorteEstudiante) y su actividad mensual desde la asistencia "
+            "registrada. Necesario una vez para el historial; después se mantienen solas con cada registro.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        n = reconstruir_cohortes(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Cohortes reconstruidas: {n} estudiante(s)."))
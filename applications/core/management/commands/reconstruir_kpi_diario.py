@@ -0,0 +1,34 @@
+# applications/core/management/commands/reconstruir_kpi_diario.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.core.kpi_diario import reconstruir_kpi_diario
+
+
+def _fecha(valor, nombre):
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"--{nombre} debe tener formato AAAA-MM-DD (recibido: {valor!r}).")
+
+
+class Command(BaseCommand):
+    help = ("Reconstruye la tabla de hechos diaria de asistencia (KpiAsistenciaDiaria) usada por los tableros KPI "
+            "y vuelve a compactar el resumen mensual de los meses afectados.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Fecha inicial (AAAA-MM-DD). Por defecto, todo el historial.")
+        parser.add_argument("--hasta", help="Fecha final (AAAA-MM-DD).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        desde = _fecha(opts.get("desde"), "desde")
+        hasta = _fecha(opts.get("hasta"), "hasta")
+        if desde and hasta and desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+
+        n = reconstruir_kpi_diario(desde=desde, hasta=hasta, batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"KPI diario reconstruido: {n} fila(s)."))
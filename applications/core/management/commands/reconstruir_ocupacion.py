@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from applications.core.ocupacion import VENTANA_SEMANAS, reconstruir_ocupacion
+
+
+class Command(BaseCommand):
+    help = ("Recalcula la grilla de ocupación de las sedes (OcupacionSede) desde los horarios y las "
+            f"sesiones de las últimas {VENTANA_SEMANAS} semanas. Programarlo una vez al día para correr la "
+            "ventana; los cambios de horarios y sesiones se aplican solos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        n = reconstruir_ocupacion(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Ocupación reconstruida: {n} bloque(s) con uso."))
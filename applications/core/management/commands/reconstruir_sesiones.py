@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from applications.core.sesiones import reconstruir_sesiones
+
+
+class Command(BaseCommand):
+    help = ("Recalcula los contadores P/A/J de cada AsistenciaCurso y la última sesión de cada curso. "
+            "Se mantienen solos con cada registro; sirve para reparar datos cargados por fuera.")
+
+    def handle(self, *args, **opts):
+        sesiones, cursos = reconstruir_sesiones()
+        self.stdout.write(self.style.SUCCESS(
+            f"Contadores recalculados: {sesiones} sesión(es), {cursos} curso(s)."
+        ))
@@ -0,0 +1,56 @@
+# applications/core/management/commands/run_report_worker.py
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from applications.core import reportes_jobs
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de reportes (PDF/Excel de los tableros KPI) guardada en TrabajoReporte."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=float, default=2.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Procesar lo que haya en la cola y terminar.")
+        parser.add_argument("--retencion-dias", type=int, default=7,
+                            help="Días que se conservan los reportes terminados.")
+
+    def handle(self, *args, **opts):
+        self._seguir = True
+        signal.signal(signal.SIGTERM, self._detener)
+        signal.signal(signal.SIGINT, self._detener)
+
+        self.stdout.write("Worker de reportes iniciado.")
+        ultimo_mantenimiento = 0.0
+        while self._seguir:
+            close_old_connections()
+            if time.monotonic() - ultimo_mantenimiento > 60:
+                perdidos = reportes_jobs.recuperar_perdidos()
+                purgados = reportes_jobs.purgar(opts["retencion_dias"])
+                if perdidos or purgados:
+                    self.stdout.write(f"Mantenimiento: {perdidos} reencolado(s), {purgados} eliminado(s).")
+                ultimo_mantenimiento = time.monotonic()
+
+            trabajo = reportes_jobs.tomar_siguiente()
+            if trabajo is None:
+                if opts["una_vez"]:
+                    break
+                time.sleep(opts["intervalo"])
+                continue
+
+            inicio = time.monotonic()
+            ok = reportes_jobs.procesar(trabajo)
+            estilo = self.style.SUCCESS if ok else self.style.WARNING
+            self.stdout.write(estilo(
+                f"{trabajo.tipo} #{trabajo.pk}: {'listo' if ok else 'falló'} "
+                f"(intento {trabajo.intentos}, {time.monotonic() - inicio:.1f} s)"
+            ))
+        self.stdout.write("Worker de reportes detenido.")
+
+    def _detener(self, signum, frame):
+        # termina el trabajo en curso y sale
+        self._seguir = False
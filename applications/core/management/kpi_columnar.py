@@ -0,0 +1,72 @@
+# applications/core/management/kpi_columnar.py
+"""
+Backend columnar (pandas) de referencia para benchmark_kpi: trae el tramo
+de la tabla de hechos con UN values_list y calcula top-N y series sobre el
+DataFrame. Los tableros y las exportaciones no lo usan (agregan en la BD con
+kpi_agregados, que según el benchmark es más rápido).
+"""
+import pandas as pd
+
+COLUMNAS = {
+    "curso_id": "curso_id",
+    "curso__nombre": "curso",
+    "profesor__first_name": "prof_nombre",
+    "profesor__last_name": "prof_apellido",
+    "fecha": "fecha",
+    "sesiones": "sesiones",
+    "sesiones_cerradas": "sesiones_cerradas",
+    "presentes": "presentes",
+    "ausentes": "ausentes",
+    "justificados": "justificados",
+    "total": "total",
+}
+NUMERICAS = ("sesiones", "sesiones_cerradas", "presentes", "ausentes", "justificados", "total")
+
+
+def desde_queryset(qs, campo_fecha="fecha"):
+    """DataFrame con COLUMNAS a partir de un queryset de KpiAsistenciaDiaria/Mensual."""
+    campos = [campo_fecha if c == "fecha" else c for c in COLUMNAS]
+    df = pd.DataFrame.from_records(
+        qs.order_by().values_list(*campos).iterator(chunk_size=20000),
+        columns=list(COLUMNAS.values()),
+    )
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    df[list(NUMERICAS)] = df[list(NUMERICAS)].fillna(0).astype("int64")
+    return df
+
+
+def _pct(parte, total):
+    # total == 0 -> 0.0 (igual que kpi_engine._pct)
+    return (parte / total.where(total > 0) * 100).round(1).fillna(0.0)
+
+
+def _registros(df):
+    return df.to_dict("records")
+
+
+def top_inasistencia(df, limite):
+    """Cursos con mayor % de ausentes + justificados sobre el total de registros."""
+    g = (df.groupby(["curso_id", "curso"], as_index=False, sort=False)
+           [["total", "ausentes", "justificados"]].sum())
+    g = g[g["total"] > 0]
+    g["pct"] = _pct(g["ausentes"] + g["justificados"], g["total"])
+    g = g.sort_values("pct", ascending=False, kind="stable").head(limite)
+    return _registros(g[["curso_id", "curso", "pct", "total"]])
+
+
+def top_prof_bajo_cumpl(df, limite):
+    """Profesores con menor % de sesiones cerradas."""
+    g = (df.groupby(["prof_nombre", "prof_apellido"], as_index=False, sort=False, dropna=False)
+           [["sesiones", "sesiones_cerradas"]].sum())
+    g = g[g["sesiones"] > 0]
+    g["pct"] = _pct(g["sesiones_cerradas"], g["sesiones"])
+    g["prof"] = (g["prof_nombre"].fillna("") + " " + g["prof_apellido"].fillna("")).str.strip().replace("", "—")
+    g = g.sort_values("pct", kind="stable").head(limite)
+    return _registros(g[["prof", "pct"]].assign(total=g["sesiones"]))
+
+
+def serie_mensual(df, meses, campo="sesiones"):
+    """Suma de `campo` por mes, alineada a `meses` (primer día de cada mes)."""
+    s = df.groupby(df["fecha"].dt.to_period("M"))[campo].sum()
+    idx = pd.PeriodIndex([pd.Period(m, "M") for m in meses], freq="M")
+    return s.reindex(idx, fill_value=0).astype(int).tolist()
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def poblar_kpi_diario(apps, schema_editor):
+    AsistenciaCurso = apps.get_model('core', 'AsistenciaCurso')
+    KpiAsistenciaDiaria = apps.get_model('core', 'KpiAsistenciaDiaria')
+
+    sesiones = (
+        AsistenciaCurso.objects
+        .values('curso_id', 'fecha', 'estado', 'curso__sede_id', 'curso__disciplina_id',
+                'curso__programa', 'curso__profesor_id')
+        .annotate(
+            n_total=Count('detalles'),
+            n_p=Count('detalles', filter=Q(detalles__estado='P')),
+            n_a=Count('detalles', filter=Q(detalles__estado='A')),
+            n_j=Count('detalles', filter=Q(detalles__estado='J')),
+        )
+        .order_by()
+    )
+    lote = []
+    for s in sesiones.iterator(chunk_size=1000):
+        lote.append(KpiAsistenciaDiaria(
+            curso_id=s['curso_id'], fecha=s['fecha'],
+            sede_id=s['curso__sede_id'], disciplina_id=s['curso__disciplina_id'],
+            programa=s['curso__programa'], profesor_id=s['curso__profesor_id'],
+            presentes=s['n_p'], ausentes=s['n_a'], justificados=s['n_j'], total=s['n_total'],
+            sesiones=1, sesiones_cerradas=1 if s['estado'] == 'CERR' else 0,
+        ))
+        if len(lote) >= 1000:
+            KpiAsistenciaDiaria.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        KpiAsistenciaDiaria.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_estudiante_genero'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KpiAsistenciaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('programa', models.CharField(choices=[('FORM', 'Formativo'), ('ALTO', 'Alto rendimiento')], max_length=5)),
+                ('fecha', models.DateField()),
+                ('presentes', models.PositiveIntegerField(default=0)),
+                ('ausentes', models.PositiveIntegerField(default=0)),
+                ('justificados', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sesiones', models.PositiveSmallIntegerField(default=0)),
+                ('sesiones_cerradas', models.PositiveSmallIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-fecha', 'curso_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciadiaria',
+            name='curso',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kpi_diario', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciadiaria',
+            name='disciplina',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.deporte'),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciadiaria',
+            name='profesor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciadiaria',
+            name='sede',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.sede'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciadiaria',
+            index=models.Index(fields=['fecha'], name='core_kpiasi_fecha_ac4f6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciadiaria',
+            index=models.Index(fields=['sede', 'fecha'], name='core_kpiasi_sede_id_b894c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciadiaria',
+            index=models.Index(fields=['disciplina', 'fecha'], name='core_kpiasi_discipl_7d2507_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciadiaria',
+            index=models.Index(fields=['programa', 'fecha'], name='core_kpiasi_program_14cd67_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='kpiasistenciadiaria',
+            constraint=models.UniqueConstraint(fields=('curso', 'fecha'), name='uniq_kpi_diario_curso_fecha'),
+        ),
+        migrations.RunPython(poblar_kpi_diario, migrations.RunPython.noop),
+    ]
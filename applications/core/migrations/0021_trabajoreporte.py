@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_kpiasistenciadiaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=40)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('clave', models.CharField(db_index=True, max_length=40)),
+                ('estado', models.CharField(choices=[('PEND', 'Pendiente'), ('PROC', 'Procesando'), ('OK', 'Listo'), ('ERR', 'Error')], default='PEND', max_length=4)),
+                ('host', models.CharField(blank=True, max_length=255)),
+                ('seguro', models.BooleanField(default=False)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3)),
+                ('error', models.TextField(blank=True)),
+                ('nombre_archivo', models.CharField(blank=True, max_length=120)),
+                ('content_type', models.CharField(blank=True, max_length=120)),
+                ('contenido', models.BinaryField(blank=True, null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-creado'],
+            },
+        ),
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='solicitado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='trabajoreporte',
+            index=models.Index(fields=['estado', 'disponible_desde'], name='core_trabaj_estado_7da48a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trabajoreporte',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['PEND', 'PROC'])), fields=('clave',), name='uniq_trabajo_reporte_en_curso'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_trabajoreporte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KpiAsistenciaMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('programa', models.CharField(choices=[('FORM', 'Formativo'), ('ALTO', 'Alto rendimiento')], max_length=5)),
+                ('mes', models.DateField()),
+                ('presentes', models.PositiveIntegerField(default=0)),
+                ('ausentes', models.PositiveIntegerField(default=0)),
+                ('justificados', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sesiones', models.PositiveIntegerField(default=0)),
+                ('sesiones_cerradas', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-mes', 'curso_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciamensual',
+            name='curso',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kpi_mensual', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciamensual',
+            name='disciplina',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.deporte'),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciamensual',
+            name='profesor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='kpiasistenciamensual',
+            name='sede',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.sede'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciamensual',
+            index=models.Index(fields=['mes'], name='core_kpiasi_mes_bbc8b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciamensual',
+            index=models.Index(fields=['sede', 'mes'], name='core_kpiasi_sede_id_cc0888_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciamensual',
+            index=models.Index(fields=['disciplina', 'mes'], name='core_kpiasi_discipl_7faaac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kpiasistenciamensual',
+            index=models.Index(fields=['programa', 'mes'], name='core_kpiasi_program_eb52bb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='kpiasistenciamensual',
+            constraint=models.UniqueConstraint(fields=('curso', 'mes'), name='uniq_kpi_mensual_curso_mes'),
+        ),
+    ]
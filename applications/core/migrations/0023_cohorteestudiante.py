@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_kpiasistenciamensual'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohorteEstudiante',
+            fields=[
+                ('estudiante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cohorte', serialize=False, to='core.estudiante')),
+                ('cohorte', models.DateField()),
+                ('programa', models.CharField(blank=True, choices=[('FORM', 'Formativo'), ('ALTO', 'Alto rendimiento')], default='', max_length=5)),
+                ('actividad', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-cohorte'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cohorteestudiante',
+            name='sede',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.sede'),
+        ),
+        migrations.AddIndex(
+            model_name='cohorteestudiante',
+            index=models.Index(fields=['cohorte'], name='core_cohort_cohorte_fe1d9e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cohorteestudiante',
+            index=models.Index(fields=['sede', 'cohorte'], name='core_cohort_sede_id_2da2b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cohorteestudiante',
+            index=models.Index(fields=['programa', 'cohorte'], name='core_cohort_program_d75105_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_cohorteestudiante'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CAI', 'Caída de asistencia del curso'), ('AUS', 'Ausencias seguidas')], max_length=3)),
+                ('fecha', models.DateField()),
+                ('tasa', models.FloatField(help_text='% de asistencia de la sesión (curso) o previo a las ausencias (estudiante)')),
+                ('referencia', models.FloatField(blank=True, help_text='Media móvil de las sesiones anteriores', null=True)),
+                ('z', models.FloatField(blank=True, null=True)),
+                ('detalle', models.CharField(blank=True, default='', max_length=255)),
+                ('revisada', models.BooleanField(db_index=True, default=False)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-fecha', '-creado'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MarcaProceso',
+            fields=[
+                ('nombre', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('marca', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alertaasistencia',
+            name='curso',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_asistencia', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='alertaasistencia',
+            name='estudiante',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alertas_asistencia', to='core.estudiante'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertaasistencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('estudiante__isnull', True)), fields=('tipo', 'curso', 'fecha'), name='uniq_alerta_curso_fecha'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertaasistencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('estudiante__isnull', False)), fields=('tipo', 'curso', 'estudiante', 'fecha'), name='uniq_alerta_estudiante_fecha'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_alertaasistencia_marcaproceso'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MutacionAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('resultado', models.CharField(choices=[('APL', 'Aplicada'), ('OBS', 'Obsoleta')], max_length=3)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='asistenciacurso',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='modificado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutacionasistencia',
+            name='asistencia',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.asistenciacurso'),
+        ),
+        migrations.AddField(
+            model_name='mutacionasistencia',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='mutacionasistencia',
+            constraint=models.UniqueConstraint(fields=('usuario', 'clave'), name='uniq_mutacion_usuario_clave'),
+        ),
+    ]
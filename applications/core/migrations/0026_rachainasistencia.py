@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_asistencia_version_mutacionasistencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RachaInasistencia',
+            fields=[
+                ('estudiante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='racha', serialize=False, to='core.estudiante')),
+                ('actual', models.PositiveIntegerField(default=0)),
+                ('maxima', models.PositiveIntegerField(default=0)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-maxima', '-actual', 'estudiante'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rachainasistencia',
+            index=models.Index(fields=['-maxima', '-actual', 'estudiante'], name='core_racha_semaforo_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('atleta', '0006_alter_asistenciaatleta_options_and_more'),
+        ('core', '0026_rachainasistencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciaUnificada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origen', models.CharField(choices=[('CUR', 'Asistencia de curso'), ('ATL', 'Asistencia de atleta'), ('CLA', 'Asistencia de clase')], max_length=3)),
+                ('origen_id', models.PositiveBigIntegerField()),
+                ('fecha', models.DateField()),
+                ('inicio', models.TimeField(blank=True, null=True)),
+                ('fin', models.TimeField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('P', 'Presente'), ('A', 'Ausente'), ('J', 'Justificado')], max_length=1)),
+            ],
+            options={
+                'ordering': ['-fecha', 'inicio'],
+            },
+        ),
+        migrations.AddField(
+            model_name='asistenciaunificada',
+            name='atleta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asistencia_unificada', to='atleta.atleta'),
+        ),
+        migrations.AddField(
+            model_name='asistenciaunificada',
+            name='curso',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='asistenciaunificada',
+            name='estudiante',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asistencia_unificada', to='core.estudiante'),
+        ),
+        migrations.AddField(
+            model_name='asistenciaunificada',
+            name='profesor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='asistenciaunificada',
+            name='sede',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.sede'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciaunificada',
+            index=models.Index(fields=['estudiante', 'fecha'], name='core_asiste_estudia_68ef07_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciaunificada',
+            index=models.Index(fields=['atleta', 'fecha'], name='core_asiste_atleta__1bed95_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciaunificada',
+            index=models.Index(fields=['curso', 'fecha'], name='core_asiste_curso_i_c97269_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciaunificada',
+            index=models.Index(fields=['sede', 'fecha'], name='core_asiste_sede_id_7d7679_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='asistenciaunificada',
+            constraint=models.UniqueConstraint(fields=('origen', 'origen_id'), name='uniq_asistencia_unificada_origen'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_sesion(apps, schema_editor):
+    # copia fecha/curso/sede de la sesión en una sola actualización
+    AsistenciaCurso = apps.get_model('core', 'AsistenciaCurso')
+    AsistenciaCursoDetalle = apps.get_model('core', 'AsistenciaCursoDetalle')
+    sesion = AsistenciaCurso.objects.filter(pk=OuterRef('asistencia_id'))
+    AsistenciaCursoDetalle.objects.update(
+        fecha=Subquery(sesion.values('fecha')[:1]),
+        curso_id=Subquery(sesion.values('curso_id')[:1]),
+        sede_id=Subquery(sesion.values('curso__sede_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_asistenciaunificada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='fecha',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='curso',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='sede',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.sede'),
+        ),
+        migrations.RunPython(backfill_sesion, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='asistenciacursodetalle',
+            name='fecha',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='asistenciacursodetalle',
+            name='curso',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.curso'),
+        ),
+        migrations.AlterField(
+            model_name='asistenciacursodetalle',
+            name='sede',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.sede'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciacursodetalle',
+            index=models.Index(fields=['estudiante', 'fecha'], name='core_detalle_est_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciacursodetalle',
+            index=models.Index(fields=['curso', 'fecha', 'estado'], name='core_detalle_curso_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asistenciacursodetalle',
+            index=models.Index(fields=['sede', 'fecha'], name='core_detalle_sede_fecha_idx'),
+        ),
+    ]
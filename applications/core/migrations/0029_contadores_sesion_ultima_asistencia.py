@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_contadores(apps, schema_editor):
+    AsistenciaCurso = apps.get_model('core', 'AsistenciaCurso')
+    AsistenciaCursoDetalle = apps.get_model('core', 'AsistenciaCursoDetalle')
+    Curso = apps.get_model('core', 'Curso')
+
+    def conteo(q=Q()):
+        qs = (AsistenciaCursoDetalle.objects.filter(q, asistencia_id=OuterRef('pk'))
+              .order_by().values('asistencia_id').annotate(n=Count('id')).values('n'))
+        return Coalesce(Subquery(qs, output_field=IntegerField()), Value(0))
+
+    AsistenciaCurso.objects.update(
+        presentes=conteo(Q(estado='P')),
+        ausentes=conteo(Q(estado='A')),
+        justificados=conteo(Q(estado='J')),
+        total=conteo(),
+    )
+    ultima = AsistenciaCurso.objects.filter(curso_id=OuterRef('pk')).order_by('-fecha', '-id').values('pk')[:1]
+    Curso.objects.update(ultima_asistencia=Subquery(ultima))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_asistenciacursodetalle_fecha_curso_sede'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asistenciacurso',
+            name='ausentes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='asistenciacurso',
+            name='justificados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='asistenciacurso',
+            name='presentes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='asistenciacurso',
+            name='total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='ultima_asistencia',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.asistenciacurso'),
+        ),
+        migrations.RunPython(backfill_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_contadores_sesion_ultima_asistencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('INI', 'Clase iniciada'), ('CIE', 'Clase cerrada'), ('REG', 'Asistencia registrada')], max_length=3)),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PEND', 'Pendiente'), ('ENCU', 'En curso'), ('CERR', 'Cerrada')], max_length=4)),
+                ('presentes', models.PositiveIntegerField(default=0)),
+                ('ausentes', models.PositiveIntegerField(default=0)),
+                ('justificados', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventoasistencia',
+            name='asistencia',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.asistenciacurso'),
+        ),
+        migrations.AddField(
+            model_name='eventoasistencia',
+            name='curso',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.curso'),
+        ),
+        migrations.AddField(
+            model_name='eventoasistencia',
+            name='sede',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.sede'),
+        ),
+        migrations.AddField(
+            model_name='eventoasistencia',
+            name='usuario',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='eventoasistencia',
+            index=models.Index(fields=['sede', 'id'], name='core_evento_sede_idx'),
+        ),
+    ]
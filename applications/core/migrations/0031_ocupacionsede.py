@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_eventoasistencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionSede',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.IntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('bloque', models.PositiveSmallIntegerField(help_text='Bloque de 15 minutos desde las 00:00 (0-95)')),
+                ('cursos_plan', models.PositiveSmallIntegerField(default=0)),
+                ('cupos_plan', models.PositiveIntegerField(default=0)),
+                ('sesiones_real', models.PositiveIntegerField(default=0)),
+                ('asistentes_real', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['sede_id', 'dia', 'bloque'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ocupacionsede',
+            name='sede',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion', to='core.sede'),
+        ),
+        migrations.AddConstraint(
+            model_name='ocupacionsede',
+            constraint=models.UniqueConstraint(fields=('sede', 'dia', 'bloque'), name='uniq_ocupacion_sede_dia_bloque'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:50
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def nominas_futuras_sin_tomar(apps, schema_editor):
+    # las sesiones pregeneradas para días que no llegan aún no tienen asistencia
+    hoy = timezone.localdate()
+    apps.get_model("core", "AsistenciaCursoDetalle").objects.filter(fecha__gt=hoy).update(estado="")
+    apps.get_model("core", "AsistenciaCurso").objects.filter(fecha__gt=hoy).update(
+        presentes=0, ausentes=0, justificados=0, total=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_ocupacionsede'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asistenciacursodetalle',
+            name='estado',
+            field=models.CharField(blank=True, choices=[('P', 'Presente'), ('A', 'Ausente'), ('J', 'Justificado')], default='P', max_length=1),
+        ),
+        migrations.RunPython(nominas_futuras_sin_tomar, migrations.RunPython.noop),
+    ]
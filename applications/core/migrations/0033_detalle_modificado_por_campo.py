@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 09:10
+
+from django.db import migrations, models
+
+
+def copiar_modificado(apps, schema_editor):
+    # hasta ahora la marca era de toda la fila: vale para ambos campos
+    apps.get_model("core", "AsistenciaCursoDetalle").objects.filter(modificado__isnull=False).update(
+        estado_modificado=models.F("modificado"), obs_modificado=models.F("modificado"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_detalle_estado_sin_tomar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='estado_modificado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='asistenciacursodetalle',
+            name='obs_modificado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copiar_modificado, migrations.RunPython.noop),
+    ]
@@ -246,6 +246,11 @@ class Curso(models.Model):
     lista_espera = models.BooleanField(default=True)
     creado = models.DateTimeField(auto_now_add=True)
     modificado = models.DateTimeField(auto_now=True)
+    # sesión de asistencia más reciente (la mantiene core.sesiones)
+    ultima_asistencia = models.ForeignKey(
+        "core.AsistenciaCurso", null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name="+",
+    )
 
     class Meta:
         ordering = ["-creado"]
@@ -501,6 +506,13 @@ class AsistenciaCurso(models.Model):
     inicio_real = models.TimeField(null=True, blank=True)
     fin_real = models.TimeField(null=True, blank=True)
     creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    # sube con cada cambio de sus detalles; los dispositivos la usan para pedir solo lo que cambió
+    version = models.PositiveIntegerField(default=0)
+    # conteo de sus detalles por estado (lo mantiene core.sesiones)
+    presentes = models.PositiveIntegerField(default=0, editable=False)
+    ausentes = models.PositiveIntegerField(default=0, editable=False)
+    justificados = models.PositiveIntegerField(default=0, editable=False)
+    total = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = (("curso", "fecha"),)
@@ -511,24 +523,457 @@ class AsistenciaCurso(models.Model):
 
     @property
     def resumen(self):
-        agg = {"P": 0, "A": 0, "J": 0, "total": 0}
-        for d in self.detalles.all():
-            agg["total"] += 1
-            agg[d.estado] = agg.get(d.estado, 0) + 1
-        return agg
+        return {"P": self.presentes, "A": self.ausentes, "J": self.justificados, "total": self.total}
+
+    def save(self, *args, **kwargs):
+        # contadores y versión los llevan sus detalles: una instancia vieja no los pisa
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ("version", "presentes", "ausentes", "justificados", "total")
+            ]
+        return super().save(*args, **kwargs)
+class AsistenciaCursoDetalleQuerySet(models.QuerySet):
+    def tomados(self):
+        """Asistencia ya tomada hasta hoy: sin nóminas pregeneradas que el profesor aún no guarda."""
+        return self.filter(fecha__lte=timezone.localdate()).exclude(estado=AsistenciaCursoDetalle.SIN_TOMAR)
+
+
 class AsistenciaCursoDetalle(models.Model):
     ESTADOS = (
         ("P", "Presente"),
         ("A", "Ausente"),
         ("J", "Justificado"),
     )
+    # nómina creada de antemano (pregenerar_asistencia / al abrir la toma): aún no es asistencia
+    SIN_TOMAR = ""
     asistencia = models.ForeignKey(AsistenciaCurso, on_delete=models.CASCADE, related_name="detalles")
     estudiante = models.ForeignKey("core.Estudiante", on_delete=models.CASCADE, related_name="asistencias_curso")
-    estado = models.CharField(max_length=1, choices=ESTADOS, default="P")
+    estado = models.CharField(max_length=1, choices=ESTADOS, default="P", blank=True)
     observaciones = models.CharField(max_length=255, blank=True, default="")
+    # momento del último cambio (según el dispositivo en la sincronización), en total y por campo:
+    # en un conflicto gana, campo a campo, el cambio más reciente
+    modificado = models.DateTimeField(null=True, blank=True)
+    estado_modificado = models.DateTimeField(null=True, blank=True)
+    obs_modificado = models.DateTimeField(null=True, blank=True)
+    # copia de la sesión y su curso: historial y KPIs filtran sin unir AsistenciaCurso/Curso
+    fecha = models.DateField(editable=False)
+    curso = models.ForeignKey("core.Curso", on_delete=models.CASCADE, editable=False, related_name="+")
+    sede = models.ForeignKey("core.Sede", on_delete=models.PROTECT, editable=False, related_name="+")
+
+    objects = AsistenciaCursoDetalleQuerySet.as_manager()
 
     class Meta:
         unique_together = (("asistencia", "estudiante"),)
+        indexes = [
+            models.Index(fields=["estudiante", "fecha"], name="core_detalle_est_fecha_idx"),
+            models.Index(fields=["curso", "fecha", "estado"], name="core_detalle_curso_fecha_idx"),
+            models.Index(fields=["sede", "fecha"], name="core_detalle_sede_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.estudiante} - {self.fecha} ({self.estado})"
+
+    def copiar_sesion(self):
+        a = self.asistencia
+        self.fecha, self.curso_id, self.sede_id = a.fecha, a.curso_id, a.curso.sede_id
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        ahora = timezone.now()
+        self.modificado = ahora
+        marcas = {"modificado"}
+        for campo, marca in (("estado", "estado_modificado"), ("observaciones", "obs_modificado")):
+            if update_fields is None or campo in update_fields:
+                setattr(self, marca, ahora)
+                marcas.add(marca)
+        if update_fields is None:
+            self.copiar_sesion()
+        else:
+            kwargs["update_fields"] = {*update_fields, *marcas}
+        return super().save(*args, **kwargs)
+
+
+class MutacionAsistencia(models.Model):
+    """
+    Cambio de asistencia ya procesado por la sincronización de dispositivos.
+    La clave la genera el dispositivo; si reenvía el mismo lote (reintento
+    sin conexión estable) se responde el resultado guardado sin reaplicar.
+    """
+    class Resultado(models.TextChoices):
+        APLICADA = "APL", "Aplicada"
+        OBSOLETA = "OBS", "Obsoleta"
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    clave = models.CharField(max_length=64)
+    asistencia = models.ForeignKey(AsistenciaCurso, null=True, on_delete=models.SET_NULL, related_name="+")
+    resultado = models.CharField(max_length=3, choices=Resultado.choices)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["usuario", "clave"], name="uniq_mutacion_usuario_clave"),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.get_resultado_display()})"
+
+
+# ===================== KPI: HECHOS DIARIOS DE ASISTENCIA =====================
+class KpiAsistenciaDiaria(models.Model):
+    """
+    Tabla de hechos diaria para los tableros KPI: una fila por curso y fecha
+    con los conteos P/A/J y las sesiones (cerradas) de ese día.
+    Se mantiene al escribir AsistenciaCurso / AsistenciaCursoDetalle
+    (ver core.kpi_diario) y se reconstruye con `manage.py reconstruir_kpi_diario`.
+    """
+    curso = models.ForeignKey("core.Curso", on_delete=models.CASCADE, related_name="kpi_diario")
+    sede = models.ForeignKey("core.Sede", on_delete=models.CASCADE, related_name="+")
+    disciplina = models.ForeignKey("core.Deporte", on_delete=models.CASCADE, related_name="+")
+    programa = models.CharField(max_length=5, choices=Curso.Programa.choices)
+    profesor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    fecha = models.DateField()
+
+    presentes = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    justificados = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    sesiones = models.PositiveSmallIntegerField(default=0)
+    sesiones_cerradas = models.PositiveSmallIntegerField(default=0)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-fecha", "curso_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["curso", "fecha"], name="uniq_kpi_diario_curso_fecha"),
+        ]
+        indexes = [
+            models.Index(fields=["fecha"]),
+            models.Index(fields=["sede", "fecha"]),
+            models.Index(fields=["disciplina", "fecha"]),
+            models.Index(fields=["programa", "fecha"]),
+        ]
+
+    def __str__(self):
+        return f"KPI {self.curso_id} {self.fecha:%Y-%m-%d} ({self.presentes}/{self.total})"
+
+
+class KpiAsistenciaMensual(models.Model):
+    """
+    Resumen mensual de KpiAsistenciaDiaria: una fila por curso y mes (día 1).
+    Se recalcula desde las filas diarias del mes cada vez que cambia una de
+    ellas y se compacta en bloque con `manage.py compactar_kpi_mensual`.
+    Los tableros que cubren meses completos (general, mensual, anual e
+    interanual) leen de aquí.
+    """
+    curso = models.ForeignKey("core.Curso", on_delete=models.CASCADE, related_name="kpi_mensual")
+    sede = models.ForeignKey("core.Sede", on_delete=models.CASCADE, related_name="+")
+    disciplina = models.ForeignKey("core.Deporte", on_delete=models.CASCADE, related_name="+")
+    programa = models.CharField(max_length=5, choices=Curso.Programa.choices)
+    profesor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    mes = models.DateField()
+
+    presentes = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    justificados = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    sesiones = models.PositiveIntegerField(default=0)
+    sesiones_cerradas = models.PositiveIntegerField(default=0)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-mes", "curso_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["curso", "mes"], name="uniq_kpi_mensual_curso_mes"),
+        ]
+        indexes = [
+            models.Index(fields=["mes"]),
+            models.Index(fields=["sede", "mes"]),
+            models.Index(fields=["disciplina", "mes"]),
+            models.Index(fields=["programa", "mes"]),
+        ]
+
+    def __str__(self):
+        return f"KPI {self.curso_id} {self.mes:%Y-%m} ({self.presentes}/{self.total})"
+
+
+# ===================== KPI: COHORTES DE INGRESO =====================
+class CohorteEstudiante(models.Model):
+    """
+    Cohorte de un estudiante (mes de `Estudiante.creado`) y su actividad por
+    mes en un mapa de bits: el bit k indica que tuvo al menos un "Presente"
+    k meses después de ingresar (bit 0 = mes de ingreso, hasta 62 meses).
+    Las señales de asistencia prenden/apagan un solo bit; el historial se
+    reconstruye con `manage.py reconstruir_cohortes`.
+    """
+    MAX_MESES = 63  # bits de un BigIntegerField con signo
+
+    estudiante = models.OneToOneField(
+        "core.Estudiante", on_delete=models.CASCADE, primary_key=True, related_name="cohorte"
+    )
+    cohorte = models.DateField()
+    sede = models.ForeignKey("core.Sede", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    programa = models.CharField(max_length=5, choices=Curso.Programa.choices, blank=True, default="")
+    actividad = models.BigIntegerField(default=0)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-cohorte"]
+        indexes = [
+            models.Index(fields=["cohorte"]),
+            models.Index(fields=["sede", "cohorte"]),
+            models.Index(fields=["programa", "cohorte"]),
+        ]
+
+    def __str__(self):
+        return f"Cohorte {self.cohorte:%Y-%m} - {self.estudiante_id}"
+
+
+# ===================== KPI: ALERTAS DE ASISTENCIA =====================
+class AlertaAsistencia(models.Model):
+    """
+    Anomalía detectada por `manage.py detectar_anomalias_asistencia`: un
+    curso cuya asistencia de la sesión cayó muy por debajo de su media móvil
+    (z-score) o un estudiante regular que acumula ausencias seguidas.
+    """
+    class Tipo(models.TextChoices):
+        CAIDA_CURSO = "CAI", "Caída de asistencia del curso"
+        AUSENCIAS = "AUS", "Ausencias seguidas"
+
+    tipo = models.CharField(max_length=3, choices=Tipo.choices)
+    curso = models.ForeignKey("core.Curso", on_delete=models.CASCADE, related_name="alertas_asistencia")
+    estudiante = models.ForeignKey(
+        "core.Estudiante", on_delete=models.CASCADE, null=True, blank=True, related_name="alertas_asistencia"
+    )
+    fecha = models.DateField()
+    tasa = models.FloatField(help_text="% de asistencia de la sesión (curso) o previo a las ausencias (estudiante)")
+    referencia = models.FloatField(null=True, blank=True, help_text="Media móvil de las sesiones anteriores")
+    z = models.FloatField(null=True, blank=True)
+    detalle = models.CharField(max_length=255, blank=True, default="")
+    revisada = models.BooleanField(default=False, db_index=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-fecha", "-creado"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tipo", "curso", "fecha"], condition=models.Q(estudiante__isnull=True),
+                name="uniq_alerta_curso_fecha",
+            ),
+            models.UniqueConstraint(
+                fields=["tipo", "curso", "estudiante", "fecha"], condition=models.Q(estudiante__isnull=False),
+                name="uniq_alerta_estudiante_fecha",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.curso} {self.fecha:%Y-%m-%d}"
+
+
+class MarcaProceso(models.Model):
+    """Marca de agua de un proceso incremental: hasta dónde ya se procesó."""
+    nombre = models.CharField(max_length=60, primary_key=True)
+    marca = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.nombre}: {self.marca:%Y-%m-%d %H:%M}"
+
+
+class RachaInasistencia(models.Model):
+    """
+    Ausencias ("A") consecutivas de un estudiante en su historial de sesiones:
+    la racha en curso y la más larga. Se actualiza con cada registro de
+    asistencia (ver core.rachas) y se reconstruye con
+    `manage.py reconstruir_rachas`. La lee el semáforo de asistencia.
+    """
+    estudiante = models.OneToOneField(
+        "core.Estudiante", on_delete=models.CASCADE, primary_key=True, related_name="racha"
+    )
+    actual = models.PositiveIntegerField(default=0)
+    maxima = models.PositiveIntegerField(default=0)
+    ultima_fecha = models.DateField(null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-maxima", "-actual", "estudiante"]
+        indexes = [models.Index(fields=["-maxima", "-actual", "estudiante"], name="core_racha_semaforo_idx")]
+
+    def __str__(self):
+        return f"{self.estudiante_id}: {self.actual} (máx. {self.maxima})"
+
+
+class EventoAsistencia(models.Model):
+    """
+    Bitácora de solo inserción con los cambios de asistencia (inicio y cierre
+    de clase, registros guardados) y el estado de la sesión en ese momento.
+    El id es el cursor con que el tablero en vivo pide solo lo nuevo.
+    """
+    class Tipo(models.TextChoices):
+        INICIO = "INI", "Clase iniciada"
+        CIERRE = "CIE", "Clase cerrada"
+        REGISTRO = "REG", "Asistencia registrada"
+
+    tipo = models.CharField(max_length=3, choices=Tipo.choices)
+    asistencia = models.ForeignKey(AsistenciaCurso, null=True, on_delete=models.SET_NULL, related_name="+")
+    curso = models.ForeignKey("core.Curso", null=True, on_delete=models.SET_NULL, related_name="+")
+    sede = models.ForeignKey("core.Sede", null=True, on_delete=models.SET_NULL, related_name="+")
+    fecha = models.DateField()
+    estado = models.CharField(max_length=4, choices=AsistenciaCurso.Estado.choices)
+    presentes = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    justificados = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name="+")
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["sede", "id"], name="core_evento_sede_idx")]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} · sesión {self.asistencia_id} ({self.creado:%H:%M})"
+
+
+class AsistenciaUnificada(models.Model):
+    """
+    Proyección de solo lectura con una fila por registro de asistencia de
+    cualquiera de los tres esquemas (AsistenciaCursoDetalle, AsistenciaAtleta
+    y AsistenciaAlumno), ya con curso, sede, profesor y fecha. La mantienen
+    las señales de esos modelos (ver core.asistencia_unificada) y se
+    reconstruye con `manage.py reconstruir_asistencia_unificada`.
+    """
+    class Origen(models.TextChoices):
+        CURSO = "CUR", "Asistencia de curso"
+        ATLETA = "ATL", "Asistencia de atleta"
+        CLASE = "CLA", "Asistencia de clase"
+
+    origen = models.CharField(max_length=3, choices=Origen.choices)
+    origen_id = models.PositiveBigIntegerField()
+
+    # estudiante: directo en CUR/CLA; en ATL, el Estudiante con el mismo RUT del atleta
+    estudiante = models.ForeignKey(
+        "core.Estudiante", on_delete=models.SET_NULL, null=True, blank=True, related_name="asistencia_unificada"
+    )
+    atleta = models.ForeignKey(
+        "atleta.Atleta", on_delete=models.SET_NULL, null=True, blank=True, related_name="asistencia_unificada"
+    )
+    curso = models.ForeignKey("core.Curso", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    sede = models.ForeignKey("core.Sede", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    profesor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    fecha = models.DateField()
+    inicio = models.TimeField(null=True, blank=True)
+    fin = models.TimeField(null=True, blank=True)
+    estado = models.CharField(max_length=1, choices=AsistenciaCursoDetalle.ESTADOS)
+
+    class Meta:
+        ordering = ["-fecha", "inicio"]
+        constraints = [
+            models.UniqueConstraint(fields=["origen", "origen_id"], name="uniq_asistencia_unificada_origen"),
+        ]
+        indexes = [
+            models.Index(fields=["estudiante", "fecha"]),
+            models.Index(fields=["atleta", "fecha"]),
+            models.Index(fields=["curso", "fecha"]),
+            models.Index(fields=["sede", "fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_origen_display()} {self.origen_id}: {self.fecha:%Y-%m-%d} ({self.estado})"
+
+
+# ===================== KPI: OCUPACIÓN DE SEDES =====================
+class OcupacionSede(models.Model):
+    """
+    Grilla de ocupación de una sede: una fila por día de la semana y bloque
+    de 15 minutos con algún uso. Lo planificado sale de los horarios de los
+    cursos vigentes (cursos y sus cupos); lo real, de las sesiones iniciadas
+    en las últimas semanas (sesiones y presentes, sumados). La capacidad se
+    lee de Sede. La mantiene core.ocupacion y se reconstruye con
+    `manage.py reconstruir_ocupacion`.
+    """
+    sede = models.ForeignKey("core.Sede", on_delete=models.CASCADE, related_name="ocupacion")
+    dia = models.IntegerField(choices=CursoHorario.Dia.choices)
+    bloque = models.PositiveSmallIntegerField(help_text="Bloque de 15 minutos desde las 00:00 (0-95)")
+
+    cursos_plan = models.PositiveSmallIntegerField(default=0)
+    cupos_plan = models.PositiveIntegerField(default=0)
+    sesiones_real = models.PositiveIntegerField(default=0)
+    asistentes_real = models.PositiveIntegerField(default=0)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["sede_id", "dia", "bloque"]
+        constraints = [
+            models.UniqueConstraint(fields=["sede", "dia", "bloque"], name="uniq_ocupacion_sede_dia_bloque"),
+        ]
+
+    def __str__(self):
+        return f"Ocupación {self.sede_id} {self.get_dia_display()} bloque {self.bloque}"
+
+
+# ===================== COLA DE REPORTES (PDF / Excel) =====================
+class TrabajoReporte(models.Model):
+    """
+    Exportación pendiente de generar. La vista solo encola; el proceso
+    `manage.py run_report_worker` la toma, genera el archivo y lo guarda
+    aquí mismo (la web y el worker no comparten disco). Ver core.reportes_jobs.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = "PEND", "Pendiente"
+        PROCESANDO = "PROC", "Procesando"
+        LISTO = "OK", "Listo"
+        ERROR = "ERR", "Error"
+
+    tipo = models.CharField(max_length=40)
+    parametros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(max_length=40, db_index=True)  # sha1(tipo + parámetros)
+    estado = models.CharField(max_length=4, choices=Estado.choices, default=Estado.PENDIENTE)
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    host = models.CharField(max_length=255, blank=True)  # para URLs absolutas (WeasyPrint)
+    seguro = models.BooleanField(default=False)
+
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    error = models.TextField(blank=True)
+
+    nombre_archivo = models.CharField(max_length=120, blank=True)
+    content_type = models.CharField(max_length=120, blank=True)
+    contenido = models.BinaryField(null=True, blank=True, editable=False)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # reintentos con espera
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado"]
+        constraints = [
+            # Un mismo reporte no puede estar dos veces en curso (deduplicación)
+            models.UniqueConstraint(
+                fields=["clave"],
+                condition=models.Q(estado__in=["PEND", "PROC"]),
+                name="uniq_trabajo_reporte_en_curso",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["estado", "disponible_desde"]),
+        ]
 
     def __str__(self):
-        return f"{self.estudiante} - {self.asistencia.fecha} ({self.estado})"
+        return f"{self.tipo} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def en_curso(self):
+        return self.estado in (self.Estado.PENDIENTE, self.Estado.PROCESANDO)
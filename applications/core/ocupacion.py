@@ -0,0 +1,196 @@
+# applications/core/ocupacion.py
+"""
+Grilla de ocupación de las sedes (OcupacionSede): sede × día de la semana
+× bloque de 15 minutos.
+
+- Planificado: horarios (CursoHorario) de los cursos vigentes de la sede;
+  por bloque, cuántos cursos lo usan y la suma de sus cupos.
+- Real: sesiones (AsistenciaCurso) iniciadas en las últimas VENTANA_SEMANAS
+  semanas, entre inicio_real y fin_real (sin fin_real, lo que dura su
+  horario ese día); por bloque, cuántas sesiones y la suma de sus presentes.
+  La ventana termina hoy y tiene exactamente VENTANA_SEMANAS de cada día,
+  así que el promedio semanal es la suma dividida por VENTANA_SEMANAS.
+
+Un cambio de horario, curso o sesión recalcula solo las celdas (sede, día)
+que toca, al confirmar la transacción (a lo más 96 filas por día). La
+ventana se corre con `manage.py reconstruir_ocupacion` una vez al día.
+"""
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from applications.core import kpi_cache
+from applications.core.models import AsistenciaCurso, Curso, CursoHorario, OcupacionSede, Sede
+
+BLOQUE_MIN = 15
+VENTANA_SEMANAS = 4
+DURACION_DEFECTO = 60   # minutos: sesión iniciada sin fin_real ni horario ese día
+DIAS = tuple(CursoHorario.Dia.values)
+
+_local = threading.local()
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def hora_bloque(bloque):
+    m = bloque * BLOQUE_MIN
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+
+def _bloques(inicio, fin=None, duracion=DURACION_DEFECTO):
+    """Bloques que toca el tramo [inicio, fin); sin fin válido dura `duracion` minutos."""
+    ini = _minutos(inicio)
+    fin = _minutos(fin) if fin else 0
+    if fin <= ini:
+        fin = min(ini + duracion, 24 * 60)
+    return range(ini // BLOQUE_MIN, -(-fin // BLOQUE_MIN))
+
+
+def ventana(hoy=None):
+    hoy = hoy or timezone.localdate()
+    return hoy - timedelta(days=7 * VENTANA_SEMANAS - 1), hoy
+
+
+def _vigente(hoy):
+    q = ((Q(curso__fecha_inicio__isnull=True) | Q(curso__fecha_inicio__lte=hoy))
+         & (Q(curso__fecha_termino__isnull=True) | Q(curso__fecha_termino__gte=hoy)))
+    return ExpressionWrapper(q, output_field=BooleanField())
+
+
+def _calcular(sede_ids, dias, hoy=None):
+    """Filas OcupacionSede (sin guardar) de las sedes y días indicados."""
+    hoy = hoy or timezone.localdate()
+    desde, hasta = ventana(hoy)
+    celdas = {}
+
+    def celda(sede_id, dia, b):
+        clave = (sede_id, dia, b)
+        if clave not in celdas:
+            celdas[clave] = OcupacionSede(sede_id=sede_id, dia=dia, bloque=b)
+        return celdas[clave]
+
+    horarios = (CursoHorario.objects.filter(curso__sede_id__in=sede_ids, dia__in=dias)
+                .exclude(curso__estado=Curso.Estado.ARCHIVADO)
+                .values_list("curso_id", "curso__sede_id", "dia", "hora_inicio", "hora_fin", "curso__cupos",
+                             _vigente(hoy)))
+    duracion = {}
+    cursos_bloque = set()
+    for curso_id, sede_id, dia, inicio, fin, cupos, vigente in horarios:
+        minutos = _minutos(fin) - _minutos(inicio)
+        if minutos > duracion.get((curso_id, dia), 0):
+            duracion[(curso_id, dia)] = minutos
+        if not vigente:
+            continue
+        for b in _bloques(inicio, fin):
+            # un curso con dos horarios que se topan cuenta una vez
+            if (curso_id, dia, b) in cursos_bloque:
+                continue
+            cursos_bloque.add((curso_id, dia, b))
+            c = celda(sede_id, dia, b)
+            c.cursos_plan += 1
+            c.cupos_plan += cupos
+
+    sesiones = (AsistenciaCurso.objects
+                .filter(curso__sede_id__in=sede_ids, fecha__range=(desde, hasta), inicio_real__isnull=False,
+                        fecha__iso_week_day__in=[d + 1 for d in dias])
+                .values_list("curso_id", "curso__sede_id", "fecha", "inicio_real", "fin_real", "presentes"))
+    for curso_id, sede_id, fecha, inicio, fin, presentes in sesiones:
+        dia = fecha.weekday()
+        for b in _bloques(inicio, fin, duracion.get((curso_id, dia), DURACION_DEFECTO)):
+            c = celda(sede_id, dia, b)
+            c.sesiones_real += 1
+            c.asistentes_real += presentes
+    return list(celdas.values())
+
+
+def refrescar(sede_id, dias=DIAS):
+    """Recalcula las celdas (sede, día) de la grilla. Devuelve las filas con uso."""
+    dias = list(dias)
+    filas = _calcular([sede_id], dias)
+    with transaction.atomic():
+        OcupacionSede.objects.filter(sede_id=sede_id, dia__in=dias).delete()
+        OcupacionSede.objects.bulk_create(filas)
+    kpi_cache.invalidar(sede_id, None)
+    return len(filas)
+
+
+def _aplicar_pendientes():
+    pendientes = getattr(_local, "celdas", None) or set()
+    _local.celdas = None
+    por_sede = {}
+    for sede_id, dia in pendientes:
+        por_sede.setdefault(sede_id, set()).add(dia)
+    for sede_id, dias in por_sede.items():
+        refrescar(sede_id, sorted(dias))
+
+
+def refrescar_despues(sede_id, dias=DIAS):
+    """
+    Como refrescar, al confirmar la transacción en curso. Las celdas
+    pendientes se juntan: el primer callback las recalcula todas (una vez
+    por sede) y los demás no hacen nada.
+    """
+    if sede_id is None:
+        return
+    pendientes = getattr(_local, "celdas", None)
+    if pendientes is None:
+        pendientes = _local.celdas = set()
+    pendientes.update((sede_id, d) for d in dias)
+    transaction.on_commit(_aplicar_pendientes)
+
+
+def refrescar_sesion(asistencia, sede_id=None):
+    """Marca la celda de una sesión iniciada dentro de la ventana (las demás no cuentan)."""
+    desde, hasta = ventana()
+    if asistencia.inicio_real is None or not (desde <= asistencia.fecha <= hasta):
+        return
+    if sede_id is None:
+        sede_id = Curso.objects.filter(pk=asistencia.curso_id).values_list("sede_id", flat=True).first()
+    refrescar_despues(sede_id, [asistencia.fecha.weekday()])
+
+
+def reconstruir_ocupacion(batch_size=1000):
+    """Recalcula la grilla de todas las sedes (backfill y corrimiento diario de la ventana)."""
+    sede_ids = list(Sede.objects.values_list("pk", flat=True))
+    filas = _calcular(sede_ids, DIAS)
+    with transaction.atomic():
+        OcupacionSede.objects.all().delete()
+        OcupacionSede.objects.bulk_create(filas, batch_size=batch_size)
+        kpi_cache.invalidar_todo()
+    return len(filas)
+
+
+def grilla(sede):
+    """
+    Grilla de una sede para el mapa de calor: bloques desde el primero hasta
+    el último con uso, y por cada uno los siete días con lo planificado, el
+    promedio real por semana y el % de la capacidad (None sin capacidad).
+    """
+    filas = {(o.dia, o.bloque): o for o in OcupacionSede.objects.filter(sede=sede)}
+    capacidad = sede.capacidad or None
+    if not filas:
+        return []
+    bloques = [b for _, b in filas]
+    salida = []
+    for b in range(min(bloques), max(bloques) + 1):
+        celdas = []
+        for dia in DIAS:
+            o = filas.get((dia, b))
+            cupos = o.cupos_plan if o else 0
+            real = round(o.asistentes_real / VENTANA_SEMANAS, 1) if o else 0
+            celdas.append({
+                "dia": dia,
+                "cursos_plan": o.cursos_plan if o else 0,
+                "cupos_plan": cupos,
+                "sesiones_real": o.sesiones_real if o else 0,
+                "asistentes_real": real,
+                "pct_plan": round(cupos / capacidad * 100, 1) if capacidad else None,
+                "pct_real": round(real / capacidad * 100, 1) if capacidad else None,
+            })
+        salida.append({"bloque": b, "hora": hora_bloque(b), "celdas": celdas})
+    return salida
@@ -0,0 +1,124 @@
+# applications/core/rachas.py
+"""
+Rachas de inasistencia por estudiante (semáforo de asistencia).
+
+RachaInasistencia guarda, por estudiante, la racha de ausencias en curso,
+la más larga y la fecha de su última sesión. Una sesión nueva posterior a
+esa fecha solo suma o corta la racha en curso; corregir o borrar una
+sesión anterior recalcula a ese estudiante con la misma consulta que usa
+el backfill: islas de "A" consecutivas (gaps-and-islands) con funciones
+de ventana, sin recorrer el historial en Python.
+
+guardar_asistencia y sincronizar la actualizan en la misma transacción
+que los detalles. Los save()/delete() sueltos (admin, shell, otras apps)
+llegan por las señales y se aplican en services.asistencia._aplicar_lote,
+en una transacción propia al confirmar la escritura (una pasada por
+sesión, no una por fila): entre los dos commits el semáforo puede mostrar
+la racha anterior, y si ese segundo paso falla la repara reconstruir_rachas.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from applications.core.models import AsistenciaCursoDetalle, RachaInasistencia
+
+# rn - rn_estado es constante dentro de cada tramo de estados iguales seguidos
+_SQL_RACHAS = """
+WITH ordenado AS (
+    SELECT d.estudiante_id, d.estado, d.fecha,
+           ROW_NUMBER() OVER (PARTITION BY d.estudiante_id ORDER BY d.fecha, d.asistencia_id) AS rn,
+           ROW_NUMBER() OVER (PARTITION BY d.estudiante_id, d.estado ORDER BY d.fecha, d.asistencia_id) AS rn_estado
+    FROM {detalle} d
+    WHERE d.estado <> %s AND d.fecha <= %s {filtro}
+),
+islas AS (
+    SELECT estudiante_id, COUNT(*) AS largo, MAX(rn) AS fin
+    FROM ordenado
+    WHERE estado = 'A'
+    GROUP BY estudiante_id, rn - rn_estado
+),
+ultimas AS (
+    SELECT estudiante_id, MAX(rn) AS n, MAX(fecha) AS ultima_fecha
+    FROM ordenado
+    GROUP BY estudiante_id
+)
+SELECT u.estudiante_id,
+       COALESCE(MAX(CASE WHEN i.fin = u.n THEN i.largo END), 0) AS actual,
+       COALESCE(MAX(i.largo), 0) AS maxima,
+       u.ultima_fecha
+FROM ultimas u
+LEFT JOIN islas i ON i.estudiante_id = u.estudiante_id
+GROUP BY u.estudiante_id, u.ultima_fecha
+"""
+
+
+def _calcular(estudiante_ids=None):
+    """Filas RachaInasistencia (sin guardar) calculadas en la base desde el historial tomado hasta hoy."""
+    filtro, params = "", [AsistenciaCursoDetalle.SIN_TOMAR, timezone.localdate()]
+    if estudiante_ids is not None:
+        estudiante_ids = list(estudiante_ids)
+        if not estudiante_ids:
+            return []
+        filtro = f"AND d.estudiante_id IN ({', '.join(['%s'] * len(estudiante_ids))})"
+        params += estudiante_ids
+    sql = _SQL_RACHAS.format(detalle=AsistenciaCursoDetalle._meta.db_table, filtro=filtro)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            RachaInasistencia(estudiante_id=pk, actual=actual, maxima=maxima, ultima_fecha=ultima)
+            for pk, actual, maxima, ultima in cursor.fetchall()
+        ]
+
+
+def recalcular_rachas(estudiante_ids):
+    """Recalcula desde el historial; quien ya no tiene sesiones pierde su fila."""
+    estudiante_ids = set(estudiante_ids)
+    filas = _calcular(estudiante_ids)
+    RachaInasistencia.objects.bulk_create(
+        filas, update_conflicts=True, unique_fields=["estudiante"],
+        update_fields=["actual", "maxima", "ultima_fecha", "actualizado"],
+    )
+    RachaInasistencia.objects.filter(
+        estudiante_id__in=estudiante_ids - {f.estudiante_id for f in filas}
+    ).delete()
+
+
+def actualizar_rachas(estudiante_ids, fecha):
+    """
+    Tras guardar la asistencia de `fecha` para estos estudiantes. Si `fecha`
+    es posterior a su última sesión registrada basta con extender o cortar
+    la racha en curso; si no (corrección, o más de una sesión ese día) se
+    recalcula.
+    """
+    estudiante_ids = set(estudiante_ids)
+    del_dia = list(AsistenciaCursoDetalle.objects.tomados()
+                   .filter(estudiante_id__in=estudiante_ids, fecha=fecha)
+                   .values_list("estudiante_id", "estado"))
+    estados, por_dia = dict(del_dia), Counter(pk for pk, _ in del_dia)
+    rachas = RachaInasistencia.objects.in_bulk(estudiante_ids)
+    ahora = timezone.now()
+
+    extendidas, recalcular = [], set()
+    for pk in estudiante_ids:
+        r = rachas.get(pk)
+        if r is None or pk not in estados or por_dia[pk] > 1 or r.ultima_fecha is None or r.ultima_fecha >= fecha:
+            recalcular.add(pk)
+            continue
+        r.actual = r.actual + 1 if estados[pk] == "A" else 0
+        r.maxima = max(r.maxima, r.actual)
+        r.ultima_fecha, r.actualizado = fecha, ahora
+        extendidas.append(r)
+    if extendidas:
+        RachaInasistencia.objects.bulk_update(extendidas, ["actual", "maxima", "ultima_fecha", "actualizado"])
+    if recalcular:
+        recalcular_rachas(recalcular)
+
+
+def reconstruir_rachas(batch_size=1000):
+    """Recalcula todas las rachas (backfill). Devuelve las filas creadas."""
+    filas = _calcular()
+    with transaction.atomic():
+        RachaInasistencia.objects.all().delete()
+        RachaInasistencia.objects.bulk_create(filas, batch_size=batch_size)
+    return len(filas)
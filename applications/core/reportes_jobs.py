@@ -0,0 +1,208 @@
+# applications/core/reportes_jobs.py
+"""
+Cola de reportes en la BD (PDF / Excel de los tableros KPI).
+
+Las vistas de exportación llaman a encolar(); `manage.py run_report_worker`
+toma los trabajos con tomar_siguiente() y los ejecuta con procesar(), que
+vuelve a llamar al generador original con una request armada a partir de
+los parámetros guardados. Un mismo reporte (tipo + parámetros) no se encola
+dos veces mientras está en curso, y los fallos se reintentan con espera.
+Con `version` (firma de los datos que lee), un reporte ya LISTO con la
+misma clave se reutiliza en vez de generarlo y guardarlo otra vez.
+
+El archivo terminado se guarda en la BD (la web y el worker no comparten
+disco), así que por aquí pasan solo reportes acotados: PDF y resúmenes
+Excel. El detalle crudo (?detalle=1) lo sirve la vista directamente.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from applications.core.models import TrabajoReporte
+
+log = logging.getLogger(__name__)
+
+ESPERA_REINTENTO = 30            # segundos; se duplica en cada intento
+TIMEOUT_PROCESO = 60 * 10        # un trabajo "PROC" más viejo que esto se da por perdido
+
+
+def _clave(tipo, parametros, version=""):
+    crudo = tipo + "|" + json.dumps(parametros, sort_keys=True, ensure_ascii=False)
+    if version:
+        crudo += "|" + version
+    return hashlib.sha1(crudo.encode()).hexdigest()
+
+
+def parametros_de(request):
+    """GET como dict serializable (listas solo si el parámetro viene repetido)."""
+    return {k: (v if len(v) > 1 else v[0]) for k, v in request.GET.lists() if k != "__dbg"}
+
+
+def encolar(tipo, request, version=""):
+    """
+    Encola el reporte o devuelve el que ya está en curso con los mismos
+    parámetros (o, con `version`, el último ya listo para esa versión).
+    """
+    parametros = parametros_de(request)
+    clave = _clave(tipo, parametros, version)
+    if version:
+        listo = (TrabajoReporte.objects.defer("contenido")
+                 .filter(clave=clave, estado=TrabajoReporte.Estado.LISTO).order_by("-terminado").first())
+        if listo:
+            return listo
+    en_curso = TrabajoReporte.objects.filter(
+        clave=clave, estado__in=[TrabajoReporte.Estado.PENDIENTE, TrabajoReporte.Estado.PROCESANDO]
+    )
+    trabajo = en_curso.first()
+    if trabajo:
+        return trabajo
+    try:
+        with transaction.atomic():
+            return TrabajoReporte.objects.create(
+                tipo=tipo,
+                parametros=parametros,
+                clave=clave,
+                solicitado_por=request.user if request.user.is_authenticated else None,
+                host=request.get_host(),
+                seguro=request.is_secure(),
+            )
+    except IntegrityError:
+        # otra request lo encoló entre el filtro y el create
+        return en_curso.first()
+
+
+def tomar_siguiente():
+    """Marca como PROCESANDO el siguiente trabajo disponible y lo devuelve (o None)."""
+    ahora = timezone.now()
+    while True:
+        with transaction.atomic():
+            trabajo = (
+                TrabajoReporte.objects
+                .select_for_update(skip_locked=True)
+                .filter(estado=TrabajoReporte.Estado.PENDIENTE, disponible_desde__lte=ahora)
+                .order_by("disponible_desde", "id")
+                .first()
+            )
+            if trabajo is None:
+                return None
+            # update condicional: en BDs sin SKIP LOCKED (sqlite) solo un worker gana
+            tomado = TrabajoReporte.objects.filter(
+                pk=trabajo.pk, estado=TrabajoReporte.Estado.PENDIENTE
+            ).update(estado=TrabajoReporte.Estado.PROCESANDO, iniciado=ahora, intentos=trabajo.intentos + 1)
+        if tomado:
+            trabajo.refresh_from_db()
+            return trabajo
+
+
+def recuperar_perdidos():
+    """Devuelve a la cola los trabajos cuyo worker murió a mitad de camino."""
+    limite = timezone.now() - timedelta(seconds=TIMEOUT_PROCESO)
+    perdidos = TrabajoReporte.objects.filter(estado=TrabajoReporte.Estado.PROCESANDO, iniciado__lt=limite)
+    n = 0
+    for t in perdidos:
+        n += _fallar(t, "El worker no terminó el trabajo a tiempo.")
+    return n
+
+
+class _RequestReporte(HttpRequest):
+    """Request armada por el worker; el host ya se validó al encolar (ALLOWED_HOSTS del web)."""
+
+    def __init__(self, host, seguro):
+        super().__init__()
+        self._host, self._seguro = host or "localhost", seguro
+
+    def get_host(self):
+        return self._host
+
+    def _get_scheme(self):
+        return "https" if self._seguro else "http"
+
+
+def _request_para(trabajo):
+    request = _RequestReporte(trabajo.host, trabajo.seguro)
+    request.method = "GET"
+    request.path = "/"
+    request.GET = QueryDict(mutable=True)
+    for k, v in (trabajo.parametros or {}).items():
+        request.GET.setlist(k, v if isinstance(v, list) else [v])
+    request.META["QUERY_STRING"] = request.GET.urlencode()
+    request.user = trabajo.solicitado_por or AnonymousUser()
+    return request
+
+
+def _contenido(respuesta):
+    if respuesta.streaming:
+        try:
+            return b"".join(respuesta.streaming_content)
+        finally:
+            # no respuesta.close(): dispararía request_finished y cerraría la conexión a la BD
+            archivo = getattr(respuesta, "file_to_stream", None)
+            if archivo is not None:
+                archivo.close()
+    return respuesta.content
+
+
+def _nombre_archivo(respuesta, tipo):
+    disp = respuesta.get("Content-Disposition", "")
+    if 'filename="' in disp:
+        return disp.split('filename="', 1)[1].split('"', 1)[0]
+    return tipo
+
+
+def _fallar(trabajo, error, reintentar=True):
+    """Registra el fallo; reintenta con espera exponencial hasta max_intentos."""
+    campos = {"error": error[:4000], "terminado": timezone.now()}
+    if reintentar and trabajo.intentos < trabajo.max_intentos:
+        espera = ESPERA_REINTENTO * 2 ** max(trabajo.intentos - 1, 0)
+        campos.update(estado=TrabajoReporte.Estado.PENDIENTE,
+                      disponible_desde=timezone.now() + timedelta(seconds=espera))
+    else:
+        campos.update(estado=TrabajoReporte.Estado.ERROR)
+    return TrabajoReporte.objects.filter(pk=trabajo.pk, estado=TrabajoReporte.Estado.PROCESANDO).update(**campos)
+
+
+def procesar(trabajo):
+    """Genera el archivo de un trabajo ya tomado. Devuelve True si quedó listo."""
+    # import diferido: las vistas importan este módulo para encolar
+    from applications.core.views import GENERADORES_REPORTE
+
+    generador = GENERADORES_REPORTE.get(trabajo.tipo)
+    if generador is None:
+        _fallar(trabajo, f"Tipo de reporte desconocido: {trabajo.tipo}", reintentar=False)
+        return False
+    try:
+        respuesta = generador(_request_para(trabajo))
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"El generador respondió {respuesta.status_code}")
+        contenido = _contenido(respuesta)
+    except Exception as e:  # cualquier fallo se registra y se reintenta
+        log.exception("Falló el reporte %s #%s", trabajo.tipo, trabajo.pk)
+        _fallar(trabajo, f"{type(e).__name__}: {e}")
+        return False
+
+    # si se dio por perdido mientras tanto (recuperar_perdidos), ya no es de este worker
+    listo = TrabajoReporte.objects.filter(pk=trabajo.pk, estado=TrabajoReporte.Estado.PROCESANDO).update(
+        estado=TrabajoReporte.Estado.LISTO,
+        contenido=contenido,
+        nombre_archivo=_nombre_archivo(respuesta, trabajo.tipo),
+        content_type=respuesta.get("Content-Type", "application/octet-stream"),
+        error="",
+        terminado=timezone.now(),
+    )
+    if not listo:
+        log.warning("El reporte %s #%s ya no estaba en proceso; se descarta el resultado", trabajo.tipo, trabajo.pk)
+    return bool(listo)
+
+
+def purgar(dias=7):
+    """Elimina los trabajos terminados hace más de `dias` días (los archivos viven en la BD)."""
+    limite = timezone.now() - timedelta(days=dias)
+    return TrabajoReporte.objects.filter(
+        estado__in=[TrabajoReporte.Estado.LISTO, TrabajoReporte.Estado.ERROR], terminado__lt=limite
+    ).delete()[0]
@@ -1,4 +1,4 @@
-# applications/core/services.py
+# applications/core/services/__init__.py
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
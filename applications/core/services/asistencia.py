@@ -0,0 +1,515 @@
+# applications/core/services/asistencia.py
+"""
+Escritura de la asistencia de una sesión (toma de asistencia del profesor
+y sincronización de dispositivos sin conexión).
+
+Todo pasa por aquí para que guardar una clase cueste un número fijo de
+consultas, sin importar cuántos estudiantes tenga: una lectura de los
+detalles, un bulk_create para los que faltan y un bulk_update solo con
+los que cambiaron. Como las operaciones masivas no disparan señales, al
+final se refrescan a mano los KPI del día, los bits de cohorte, las
+rachas de inasistencia, la asistencia unificada, la ocupación de la sede,
+la caché de tableros, la versión y los contadores de la sesión, y se deja
+el evento para el tablero en vivo.
+
+Los save()/delete() sueltos (admin, shell, otras apps) llegan por las
+señales a propagar_despues: se juntan por sesión y se aplican una vez al
+confirmar la transacción, con la misma _propagar.
+"""
+import threading
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from applications.core import (
+    asistencia_unificada, cohortes, eventos, kpi_cache, kpi_diario, ocupacion, rachas, sesiones,
+)
+from applications.core.models import (
+    AsistenciaCurso, AsistenciaCursoDetalle, AsistenciaUnificada, Curso, CursoHorario, Estudiante,
+    EventoAsistencia, MutacionAsistencia,
+)
+
+ESTADOS = {codigo for codigo, _ in AsistenciaCursoDetalle.ESTADOS}
+MAX_MUTACIONES = 500
+
+_local = threading.local()
+
+
+def cambios_desde_post(post):
+    """
+    {detalle_id: (estado, observaciones)} a partir de los campos
+    `estado_<id>` / `obs_<id>` del formulario. Un valor ausente queda en None
+    (no se modifica).
+    """
+    cambios = {}
+    for clave in post:
+        prefijo, _, pk = clave.partition("_")
+        if prefijo not in ("estado", "obs") or not pk.isdigit():
+            continue
+        estado = post.get(f"estado_{pk}")
+        obs = post.get(f"obs_{pk}")
+        cambios[int(pk)] = (estado, obs.strip() if obs is not None else None)
+    return cambios
+
+
+CAMPOS_MARCADOS = (("estado", "estado_modificado"), ("observaciones", "obs_modificado"))
+
+
+def _aplicar(detalle, estado, obs, marca):
+    """
+    Aplica los campos enviados (None = sin cambio) salvo los que cambiaron
+    después de `marca`. Devuelve (algo cambió, algún campo quedó obsoleto).
+    """
+    valores = (estado if estado in ESTADOS else None, None if obs is None else obs[:255])
+    cambio = obsoleto = False
+    for (campo, campo_marca), valor in zip(CAMPOS_MARCADOS, valores):
+        if valor is None or valor == (getattr(detalle, campo) or ""):
+            continue
+        previa = getattr(detalle, campo_marca)
+        if previa and marca < previa:
+            obsoleto = True
+            continue
+        setattr(detalle, campo, valor)
+        setattr(detalle, campo_marca, marca)
+        cambio = True
+    if cambio:
+        detalle.modificado = max(detalle.modificado or marca, marca)
+    return cambio, obsoleto
+
+
+def _propagar(asistencia, estudiante_ids):
+    kpi_diario.refrescar_kpi_diario(asistencia.curso_id, asistencia.fecha)
+    cohortes.marcar_actividad_grupo(estudiante_ids, asistencia.fecha)
+    rachas.actualizar_rachas(estudiante_ids, asistencia.fecha)
+    asistencia_unificada.proyectar(
+        AsistenciaUnificada.Origen.CURSO, asistencia_id=asistencia.pk, estudiante_id__in=list(estudiante_ids),
+    )
+    sede_id = asistencia.curso.sede_id if asistencia.curso_id else None
+    ocupacion.refrescar_sesion(asistencia, sede_id)
+    kpi_cache.invalidar(sede_id, asistencia.fecha.year)
+
+
+def _escribir(nuevos, modificados, por_sesion, usuario=None):
+    """bulk_create/bulk_update y efectos derivados; por_sesion: {asistencia: {estudiante_id}}."""
+    if nuevos:
+        for d in nuevos:
+            d.copiar_sesion()
+        AsistenciaCursoDetalle.objects.bulk_create(nuevos, ignore_conflicts=True)
+    if modificados:
+        AsistenciaCursoDetalle.objects.bulk_update(
+            modificados, ["estado", "observaciones", "modificado", "estado_modificado", "obs_modificado"])
+    if por_sesion:
+        AsistenciaCurso.objects.filter(pk__in=[a.pk for a in por_sesion]).update(version=F("version") + 1)
+        sesiones.recontar([a.pk for a in por_sesion])
+        eventos.registrar(por_sesion, EventoAsistencia.Tipo.REGISTRO, usuario)
+    for asistencia, estudiante_ids in por_sesion.items():
+        _propagar(asistencia, estudiante_ids)
+
+
+# ---------- escrituras sueltas (señales) ----------
+def _lote():
+    lote = getattr(_local, "lote", None)
+    if lote is None:
+        lote = _local.lote = {"sesiones": {}, "versionar": set(), "previas": {}, "borrados": set()}
+    return lote
+
+
+def propagar_despues(asistencia_id, estudiante_ids=None, previa=None, borrados=(), versionar=False):
+    """
+    Encola los efectos de un save()/delete() suelto sobre la sesión
+    `asistencia_id` para estos estudiantes (None = toda su nómina).
+    `previa`: (curso_id, fecha) que la sesión dejó (movida o borrada);
+    `borrados`: (estudiante_id, fecha) de detalles eliminados;
+    `versionar`: cambió algún detalle (sube la versión de la sesión).
+
+    Como kpi_cache.invalidar, el primer callback aplica todo lo pendiente
+    (una vez por sesión) y los demás no hacen nada.
+    """
+    lote = _lote()
+    actuales = lote["sesiones"].get(asistencia_id, set())
+    if estudiante_ids is None or actuales is None:
+        lote["sesiones"][asistencia_id] = None
+    else:
+        lote["sesiones"][asistencia_id] = actuales | set(estudiante_ids)
+    if versionar:
+        lote["versionar"].add(asistencia_id)
+    if previa:
+        lote["previas"].setdefault(asistencia_id, tuple(previa))
+    lote["borrados"].update(borrados)
+    transaction.on_commit(_aplicar_lote)
+
+
+def _aplicar_lote():
+    lote = getattr(_local, "lote", None)
+    _local.lote = None
+    if not lote:
+        return
+    with transaction.atomic():
+        pedidas = lote["sesiones"]
+        vivas = list(AsistenciaCurso.objects.filter(pk__in=list(pedidas)).select_related("curso"))
+        ids = [a.pk for a in vivas]
+        if lote["versionar"]:
+            AsistenciaCurso.objects.filter(pk__in=lote["versionar"]).update(version=F("version") + 1)
+        sesiones.recontar(ids)
+
+        nomina = {}
+        completas = [a.pk for a in vivas if pedidas[a.pk] is None]
+        for asistencia_id, estudiante_id in (AsistenciaCursoDetalle.objects
+                                             .filter(asistencia_id__in=completas)
+                                             .values_list("asistencia_id", "estudiante_id")):
+            nomina.setdefault(asistencia_id, set()).add(estudiante_id)
+
+        claves = {(a.curso_id, a.fecha) for a in vivas}
+        previas = {pk: clave for pk, clave in lote["previas"].items() if clave not in claves}
+        sesiones.actualizar_ultima({c for c, _ in claves | set(previas.values())})
+        for asistencia in vivas:
+            estudiantes = nomina.get(asistencia.pk, set()) if pedidas[asistencia.pk] is None else pedidas[asistencia.pk]
+            _propagar(asistencia, estudiantes)
+
+        # lo que la sesión dejó atrás: su fila de hechos, celda y caché, y
+        # el mes/racha de cada estudiante en la fecha anterior
+        sedes = dict(Curso.objects.filter(pk__in={c for c, _ in previas.values()}).values_list("pk", "sede_id"))
+        desde, hasta = ocupacion.ventana()
+        borrados = set(lote["borrados"])
+        for asistencia_id, (curso_id, fecha) in previas.items():
+            kpi_diario.refrescar_kpi_diario(curso_id, fecha)
+            if desde <= fecha <= hasta:
+                ocupacion.refrescar_despues(sedes.get(curso_id), [fecha.weekday()])
+            kpi_cache.invalidar(sedes.get(curso_id), fecha.year)
+            borrados.update((e, fecha) for e in nomina.get(asistencia_id, ()))
+        por_fecha = {}
+        for estudiante_id, fecha in borrados:
+            por_fecha.setdefault(fecha, set()).add(estudiante_id)
+        for fecha, estudiantes in por_fecha.items():
+            cohortes.marcar_actividad_grupo(estudiantes, fecha)
+        if borrados:
+            rachas.recalcular_rachas({e for e, _ in borrados})
+
+
+def guardar_asistencia(asistencia, estudiante_ids=(), cambios=None, usuario=None):
+    """
+    Deja la sesión con un detalle por cada estudiante de `estudiante_ids`
+    (los faltantes se crean sin tomar) y aplica `cambios`
+    ({detalle_id: (estado, observaciones)}) solo donde difieren de lo
+    guardado. Estados inválidos se ignoran. `usuario` queda en el evento.
+    Solo lo que el profesor guarda llega a KPIs, cohortes, rachas y
+    asistencia unificada.
+
+    Devuelve {"creados", "actualizados", "sin_cambios"}.
+    """
+    cambios = cambios or {}
+    ahora = timezone.now()
+    with transaction.atomic():
+        actuales = list(asistencia.detalles.select_for_update()
+                        .only("id", "asistencia_id", "estudiante_id", "estado", "observaciones", "modificado",
+                              "estado_modificado", "obs_modificado"))
+        con_detalle = {d.estudiante_id for d in actuales}
+        # sin "modificado": un detalle por defecto no le gana a un cambio encolado en un dispositivo
+        nuevos = [
+            AsistenciaCursoDetalle(asistencia=asistencia, estudiante_id=pk, estado=AsistenciaCursoDetalle.SIN_TOMAR)
+            for pk in dict.fromkeys(estudiante_ids) if pk not in con_detalle
+        ]
+        evaluados = [d for d in actuales if d.id in cambios]
+        modificados = [d for d in evaluados if _aplicar(d, *cambios[d.id], ahora)[0]]
+
+        tocados = {d.estudiante_id for d in modificados}
+        _escribir(nuevos, modificados, {asistencia: tocados} if tocados else {}, usuario)
+        if tocados:
+            asistencia.refresh_from_db(fields=sesiones.CONTADORES)
+        elif nuevos:
+            # nómina nueva: los dispositivos la piden por versión
+            AsistenciaCurso.objects.filter(pk=asistencia.pk).update(version=F("version") + 1)
+
+    return {
+        "creados": len(nuevos),
+        "actualizados": len(modificados),
+        "sin_cambios": len(evaluados) - len(modificados),
+    }
+
+
+def sesion_del_dia(curso, estudiante_ids, usuario=None, fecha=None):
+    """
+    Sesión del curso para `fecha` (hoy por defecto). Normalmente ya viene
+    pregenerada con su nómina y esto es solo lectura; si no existe (curso sin
+    horario ese día o pregeneración sin correr) o falta la fila de algún
+    estudiante, se crea o completa aquí (sin tomar).
+    """
+    fecha = fecha or timezone.localdate()
+    asistencia = AsistenciaCurso.objects.filter(curso=curso, fecha=fecha).first()
+    if asistencia is None:
+        asistencia, _ = AsistenciaCurso.objects.get_or_create(
+            curso=curso, fecha=fecha, defaults={"creado_por": usuario})
+        guardar_asistencia(asistencia, estudiante_ids, usuario=usuario)
+    elif (Estudiante.objects.filter(pk__in=estudiante_ids)
+          .exclude(asistencias_curso__asistencia=asistencia).exists()):
+        guardar_asistencia(asistencia, estudiante_ids, usuario=usuario)
+    return asistencia
+
+
+def cambiar_estado(asistencia, estado, usuario=None):
+    """Entrada (ENCU) o salida (CERR) de la clase, con su evento para el tablero en vivo."""
+    campo = "inicio_real" if estado == AsistenciaCurso.Estado.ENCU else "fin_real"
+    tipo = EventoAsistencia.Tipo.INICIO if estado == AsistenciaCurso.Estado.ENCU else EventoAsistencia.Tipo.CIERRE
+    with transaction.atomic():
+        asistencia.estado = estado
+        setattr(asistencia, campo, timezone.localtime().time())
+        asistencia.save(update_fields=["estado", campo])
+        eventos.registrar([asistencia], tipo, usuario)
+
+
+# ---------- pregeneración desde CursoHorario ----------
+def _cursos_con_clase(fechas):
+    """{(curso_id, fecha)} según CursoHorario, dentro de la vigencia de cada curso."""
+    por_dia = {}
+    for f in fechas:
+        por_dia.setdefault(f.weekday(), []).append(f)
+    horarios = (CursoHorario.objects.filter(dia__in=list(por_dia))
+                .exclude(curso__estado=Curso.Estado.ARCHIVADO)
+                .values_list("curso_id", "dia", "curso__fecha_inicio", "curso__fecha_termino")
+                .order_by().distinct())
+    claves = set()
+    for curso_id, dia, inicio, termino in horarios:
+        for f in por_dia[dia]:
+            if (inicio is None or f >= inicio) and (termino is None or f <= termino):
+                claves.add((curso_id, f))
+    return claves
+
+
+def pregenerar_sesiones(desde=None, dias=7, batch_size=1000):
+    """
+    Crea las sesiones de los próximos `dias` según CursoHorario y su nómina
+    (un detalle sin tomar por estudiante del curso), en lotes de `batch_size`.
+    Ya existentes no se tocan salvo para completar alumnos que falten. Nada
+    de esto cuenta como asistencia hasta que el profesor la guarda.
+
+    Devuelve {"sesiones", "detalles"} creados.
+    """
+    desde = desde or timezone.localdate()
+    fechas = [desde + timedelta(days=i) for i in range(dias)]
+    claves = _cursos_con_clase(fechas)
+    curso_ids = {c for c, _ in claves}
+
+    with transaction.atomic():
+        existentes = set(AsistenciaCurso.objects.filter(curso_id__in=curso_ids, fecha__in=fechas)
+                         .values_list("curso_id", "fecha"))
+        AsistenciaCurso.objects.bulk_create(
+            [AsistenciaCurso(curso_id=c, fecha=f) for c, f in claves - existentes],
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        por_clave = {
+            (c, f): (pk, sede_id)
+            for pk, c, f, sede_id in AsistenciaCurso.objects.filter(curso_id__in=curso_ids, fecha__in=fechas)
+            .values_list("pk", "curso_id", "fecha", "curso__sede_id")
+            if (c, f) in claves
+        }
+        alumnos = {}
+        for pk, curso_id in Estudiante.objects.filter(curso_id__in=curso_ids).values_list("pk", "curso_id"):
+            alumnos.setdefault(curso_id, []).append(pk)
+        con_detalle = set(AsistenciaCursoDetalle.objects
+                          .filter(asistencia_id__in=[pk for pk, _ in por_clave.values()])
+                          .values_list("asistencia_id", "estudiante_id"))
+
+        creados, tocadas, lote = 0, set(), []
+        for (curso_id, fecha), (asistencia_id, sede_id) in por_clave.items():
+            for estudiante_id in alumnos.get(curso_id, ()):
+                if (asistencia_id, estudiante_id) in con_detalle:
+                    continue
+                lote.append(AsistenciaCursoDetalle(
+                    asistencia_id=asistencia_id, estudiante_id=estudiante_id, estado=AsistenciaCursoDetalle.SIN_TOMAR,
+                    fecha=fecha, curso_id=curso_id, sede_id=sede_id,
+                ))
+                tocadas.add(asistencia_id)
+                if len(lote) >= batch_size:
+                    AsistenciaCursoDetalle.objects.bulk_create(lote, ignore_conflicts=True)
+                    creados, lote = creados + len(lote), []
+        AsistenciaCursoDetalle.objects.bulk_create(lote, ignore_conflicts=True)
+        creados += len(lote)
+
+        tocadas = list(tocadas)
+        for i in range(0, len(tocadas), batch_size):
+            AsistenciaCurso.objects.filter(pk__in=tocadas[i:i + batch_size]).update(version=F("version") + 1)
+        sesiones.actualizar_ultima()
+
+    return {"sesiones": len(claves - existentes), "detalles": creados}
+
+
+# ---------- sincronización de dispositivos ----------
+def _leer_mutacion(m, ahora):
+    """Valida una mutación del dispositivo; devuelve un dict normalizado o lanza ValueError."""
+    try:
+        curso_id, estudiante_id = int(m["curso"]), int(m["estudiante"])
+        fecha = date.fromisoformat(str(m["fecha"]))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("curso, estudiante y fecha son obligatorios")
+    estado, obs = m.get("estado"), m.get("observaciones")
+    if estado is not None and estado not in ESTADOS:
+        raise ValueError(f"estado inválido: {estado}")
+    if obs is not None and not isinstance(obs, str):
+        raise ValueError("observaciones debe ser texto")
+    marca = parse_datetime(str(m.get("ts") or ""))
+    if marca is None:
+        raise ValueError("ts inválido")
+    if timezone.is_naive(marca):
+        marca = timezone.make_aware(marca)
+    # un reloj adelantado no puede ganarle para siempre a los cambios posteriores
+    marca = min(marca, ahora)
+    return {"curso": curso_id, "fecha": fecha, "estudiante": estudiante_id, "estado": estado,
+            "obs": obs.strip() if obs is not None else None, "ts": marca}
+
+
+def _sesiones(claves):
+    """{(curso_id, fecha): AsistenciaCurso} para las claves pedidas, en una consulta."""
+    if not claves:
+        return {}
+    filtro = Q()
+    for curso_id, fecha in claves:
+        filtro |= Q(curso_id=curso_id, fecha=fecha)
+    return {(a.curso_id, a.fecha): a for a in AsistenciaCurso.objects.select_related("curso").filter(filtro)}
+
+
+def _delta(sesiones):
+    """Estado completo de cada sesión, compacto: detalles como [estudiante, estado, obs]."""
+    filas = {a.pk: [] for a in sesiones}
+    for asistencia_id, est, estado, obs in (AsistenciaCursoDetalle.objects
+                                            .filter(asistencia_id__in=list(filas))
+                                            .order_by("estudiante_id")
+                                            .values_list("asistencia_id", "estudiante_id", "estado", "observaciones")):
+        filas[asistencia_id].append([est, estado, obs])
+    return [
+        {"curso": a.curso_id, "fecha": a.fecha.isoformat(), "version": a.version,
+         "estado": a.estado, "detalles": filas[a.pk]}
+        for a in sesiones
+    ]
+
+
+def _versiones_conocidas(versiones, cursos_permitidos):
+    conocidas = {}
+    for v in versiones:
+        try:
+            clave = (int(v["curso"]), date.fromisoformat(str(v["fecha"])))
+            conocidas[clave] = int(v.get("version") or 0)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    if cursos_permitidos is not None:
+        conocidas = {k: v for k, v in conocidas.items() if k[0] in cursos_permitidos}
+    return conocidas
+
+
+def sincronizar(usuario, mutaciones, versiones=(), cursos_permitidos=None):
+    """
+    Aplica un lote de mutaciones encoladas en un dispositivo. Cada mutación
+    trae `clave` (idempotencia), curso, fecha, estudiante, estado y/u
+    observaciones (un campo omitido no se toca) y `ts`, la hora del cambio
+    en el dispositivo.
+
+    Conflictos: por cada campo del detalle gana la escritura más reciente
+    (ts contra estado_modificado / obs_modificado), así que un estado y una
+    observación cambiados en distintos dispositivos se conservan los dos.
+    Una mutación con algún campo ya cambiado después de su ts queda
+    "obsoleta" (sus demás campos sí se aplican).
+    Una clave ya procesada devuelve su resultado anterior sin reaplicarse;
+    los lotes de un mismo usuario se procesan de a uno (bloqueo de su fila),
+    así dos copias simultáneas del mismo lote no se aplican las dos.
+
+    `versiones` son las sesiones que el dispositivo tiene en caché
+    ([{curso, fecha, version}]); la respuesta trae el estado completo de las
+    sesiones tocadas por el lote y de las que cambiaron desde esa versión.
+    `cursos_permitidos` (None = todos) limita los cursos que se pueden tocar.
+    """
+    ahora = timezone.now()
+    mutaciones = [m for m in mutaciones if isinstance(m, dict)]
+    claves = [str(m.get("clave") or "")[:64] for m in mutaciones]
+    with transaction.atomic():
+        list(get_user_model().objects.select_for_update().filter(pk=usuario.pk).values_list("pk"))
+        previas = dict(MutacionAsistencia.objects.filter(usuario=usuario, clave__in=claves)
+                       .values_list("clave", "resultado"))
+        resultados, tocadas = _sincronizar_lote(usuario, mutaciones, claves, previas, ahora, cursos_permitidos)
+
+    conocidas = _versiones_conocidas(versiones, cursos_permitidos)
+    devolver = {a.pk: a for a in _sesiones(conocidas).values() if a.version != conocidas[(a.curso_id, a.fecha)]}
+    if tocadas:
+        devolver.update({a.pk: a for a in AsistenciaCurso.objects.filter(pk__in=tocadas)})
+    return {
+        "resultados": resultados,
+        "sesiones": _delta(sorted(devolver.values(), key=lambda a: (a.fecha, a.curso_id))),
+        "servidor": ahora.isoformat(),
+    }
+
+
+def _sincronizar_lote(usuario, mutaciones, claves, previas, ahora, cursos_permitidos):
+    """Valida y aplica el lote (dentro de la transacción de sincronizar); devuelve (resultados, sesiones tocadas)."""
+    resultados, leidas, vistas = [], [], set()
+    for clave, m in zip(claves, mutaciones):
+        if not clave:
+            resultados.append({"clave": None, "resultado": "rechazada", "error": "falta la clave"})
+            continue
+        if clave in previas:
+            resultado = MutacionAsistencia.Resultado(previas[clave])
+            resultados.append({"clave": clave, "resultado": resultado.label.lower(), "repetida": True})
+            continue
+        if clave in vistas:
+            resultados.append({"clave": clave, "resultado": "rechazada", "error": "clave repetida en el lote"})
+            continue
+        vistas.add(clave)
+        try:
+            datos = _leer_mutacion(m, ahora)
+        except ValueError as e:
+            resultados.append({"clave": clave, "resultado": "rechazada", "error": str(e)})
+            continue
+        if cursos_permitidos is not None and datos["curso"] not in cursos_permitidos:
+            resultados.append({"clave": clave, "resultado": "rechazada", "error": "curso no permitido"})
+            continue
+        leidas.append((clave, datos))
+
+    # el estudiante debe pertenecer hoy al curso (esto también descarta cursos inexistentes)
+    del_curso = dict(Estudiante.objects.filter(pk__in={d["estudiante"] for _, d in leidas})
+                     .values_list("id", "curso_id"))
+    validas = []
+    for clave, d in leidas:
+        if del_curso.get(d["estudiante"]) != d["curso"]:
+            resultados.append({"clave": clave, "resultado": "rechazada", "error": "el estudiante no es del curso"})
+        else:
+            validas.append((clave, d))
+
+    tocadas = set()
+    pedidas = {(d["curso"], d["fecha"]) for _, d in validas}
+    sesiones = _sesiones(pedidas)
+    for curso_id, fecha in pedidas - set(sesiones):
+        sesiones[(curso_id, fecha)], _ = AsistenciaCurso.objects.select_related("curso").get_or_create(
+            curso_id=curso_id, fecha=fecha, defaults={"creado_por": usuario})
+    detalles = {
+        (d.asistencia_id, d.estudiante_id): d
+        for d in AsistenciaCursoDetalle.objects.select_for_update()
+        .filter(asistencia__in=list(sesiones.values()),
+                estudiante_id__in={d["estudiante"] for _, d in validas})
+        .only("id", "asistencia_id", "estudiante_id", "estado", "observaciones", "modificado",
+              "estado_modificado", "obs_modificado")
+    }
+
+    nuevos, modificados, por_sesion, registro = {}, {}, {}, []
+    # en orden de ts: dentro del lote también gana la última escritura
+    for clave, d in sorted(validas, key=lambda x: x[1]["ts"]):
+        asistencia = sesiones[(d["curso"], d["fecha"])]
+        llave = (asistencia.pk, d["estudiante"])
+        detalle = detalles.get(llave)
+        if detalle is None:
+            # sin tomar y sin marcas: _aplicar pone (y marca) solo los campos enviados
+            detalle = detalles[llave] = nuevos[llave] = AsistenciaCursoDetalle(
+                asistencia=asistencia, estudiante_id=d["estudiante"], estado=AsistenciaCursoDetalle.SIN_TOMAR)
+            por_sesion.setdefault(asistencia, set()).add(d["estudiante"])
+        cambio, obsoleto = _aplicar(detalle, d["estado"], d["obs"], d["ts"])
+        resultado = MutacionAsistencia.Resultado.OBSOLETA if obsoleto else MutacionAsistencia.Resultado.APLICADA
+        if cambio and llave not in nuevos:
+            modificados[llave] = detalle
+            por_sesion.setdefault(asistencia, set()).add(d["estudiante"])
+        tocadas.add(asistencia.pk)
+        registro.append(MutacionAsistencia(usuario=usuario, clave=clave, asistencia=asistencia, resultado=resultado))
+        resultados.append({"clave": clave, "resultado": resultado.label.lower()})
+
+    _escribir(list(nuevos.values()), list(modificados.values()), por_sesion, usuario)
+    MutacionAsistencia.objects.bulk_create(registro)
+    return resultados, tocadas
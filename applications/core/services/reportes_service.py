@@ -1,13 +1,26 @@
 # applications/core/services/reportes_service.py
 from datetime import date, timedelta
-from django.db.models import Count, Q, F
-from django.db.models.functions import TruncMonth, ExtractYear
+from django.db.models import Count, Q, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncMonth, ExtractYear
 from applications.core.models import (
     Estudiante, Curso, Sede, Planificacion,
     AsistenciaCurso, AsistenciaCursoDetalle
 )
 from applications.usuarios.models import Usuario, Profesor
 
+def _contar(modelo, campo, ref="pk"):
+    """
+    COUNT correlacionado: filas de `modelo` cuyo `campo` apunta a la fila
+    externa. Cada conteo es su propia subconsulta, así que dos conteos sobre
+    relaciones distintas no se multiplican entre sí (como pasa con dos
+    Count() sobre joins en la misma consulta).
+    """
+    sub = (modelo.objects.filter(**{campo: OuterRef(ref)})
+           .order_by().values(campo)
+           .annotate(n=Count("*")).values("n"))
+    return Coalesce(Subquery(sub, output_field=IntegerField()), 0)
+
+
 # ================================================================
 # 📊 FUNCIÓN PRINCIPAL DE KPI
 # ================================================================
@@ -21,8 +34,8 @@ def obtener_kpi_generales():
     total_planificaciones = Planificacion.objects.count()
 
     # Asistencias
-    presentes = AsistenciaCursoDetalle.objects.filter(estado="P").count()
-    total_detalles = AsistenciaCursoDetalle.objects.count()
+    presentes = AsistenciaCursoDetalle.objects.tomados().filter(estado="P").count()
+    total_detalles = AsistenciaCursoDetalle.objects.tomados().count()
     asistencia_promedio = round((presentes / total_detalles) * 100, 1) if total_detalles else 0
 
     # Género
@@ -83,9 +96,9 @@ def obtener_kpi_mensuales():
 # ================================================================
 def obtener_kpi_profesores():
     """Devuelve métricas de actividad docente."""
-    profesores = Profesor.objects.all().annotate(
-        total_cursos=Count("usuario__cursos_impartidos"),
-        total_planificaciones=Count("usuario__planificacion"),
+    profesores = Profesor.objects.select_related("usuario").annotate(
+        total_cursos=_contar(Curso, "profesor_id", "usuario_id"),
+        total_planificaciones=_contar(Planificacion, "autor_id", "usuario_id"),
     )
     data = []
     for p in profesores:
@@ -103,8 +116,8 @@ def obtener_kpi_profesores():
 def obtener_kpi_por_sede():
     """Cantidad de cursos y estudiantes por sede."""
     sedes = Sede.objects.annotate(
-        total_cursos=Count("curso"),
-        total_estudiantes=Count("curso__estudiante"),
+        total_cursos=_contar(Curso, "sede_id"),
+        total_estudiantes=_contar(Estudiante, "curso__sede_id"),
     )
     data = []
     for s in sedes:
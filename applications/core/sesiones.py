@@ -0,0 +1,62 @@
+# applications/core/sesiones.py
+"""
+Contadores de cada sesión de asistencia y última sesión de cada curso.
+
+AsistenciaCurso guarda cuántos detalles tiene por estado y Curso apunta a
+su sesión más reciente, para que los listados e historiales se armen con
+columnas propias en vez de contar AsistenciaCursoDetalle o recorrer todas
+las sesiones. Ambos se recalculan con un UPDATE (subconsultas indexadas)
+por lote de sesiones o cursos afectados.
+"""
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from applications.core.models import AsistenciaCurso, AsistenciaCursoDetalle, Curso
+
+CONTADORES = ["presentes", "ausentes", "justificados", "total"]
+TOMADOS = [codigo for codigo, _ in AsistenciaCursoDetalle.ESTADOS]
+
+
+def _conteo(**filtro):
+    qs = (AsistenciaCursoDetalle.objects.filter(asistencia_id=OuterRef("pk"), **filtro)
+          .order_by().values("asistencia_id").annotate(n=Count("id")).values("n"))
+    return Coalesce(Subquery(qs, output_field=IntegerField()), Value(0))
+
+
+def recontar(asistencia_ids):
+    """Recalcula presentes/ausentes/justificados/total (sin los detalles sin tomar) de estas sesiones."""
+    asistencia_ids = list(asistencia_ids)
+    if not asistencia_ids:
+        return 0
+    return AsistenciaCurso.objects.filter(pk__in=asistencia_ids).update(
+        presentes=_conteo(estado="P"),
+        ausentes=_conteo(estado="A"),
+        justificados=_conteo(estado="J"),
+        total=_conteo(estado__in=TOMADOS),
+    )
+
+
+def actualizar_ultima(curso_ids=None):
+    """
+    Apunta cada curso (todos si curso_ids es None) a su sesión más reciente
+    hasta hoy; las pregeneradas para días futuros no cuentan.
+    """
+    ultima = (AsistenciaCurso.objects.filter(curso_id=OuterRef("pk"), fecha__lte=timezone.localdate())
+              .order_by("-fecha", "-id").values("pk")[:1])
+    cursos = Curso.objects.all() if curso_ids is None else Curso.objects.filter(pk__in=list(curso_ids))
+    return cursos.update(ultima_asistencia=Subquery(ultima))
+
+
+def reconstruir_sesiones():
+    """Recalcula los contadores de todas las sesiones y la última sesión de cada curso."""
+    with transaction.atomic():
+        sesiones = AsistenciaCurso.objects.update(
+            presentes=_conteo(estado="P"),
+            ausentes=_conteo(estado="A"),
+            justificados=_conteo(estado="J"),
+            total=_conteo(estado__in=TOMADOS),
+        )
+        cursos = actualizar_ultima()
+    return sesiones, cursos
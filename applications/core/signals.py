@@ -1,10 +1,16 @@
 # applications/core/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
-from .models import Estudiante
+from applications.atleta.models import AsistenciaAtleta, Clase
+from .models import (
+    Estudiante, Curso, CursoHorario, Planificacion, AsistenciaCurso, AsistenciaCursoDetalle, AsistenciaClase,
+    AsistenciaAlumno, AsistenciaUnificada, Sede,
+)
+from . import asistencia_unificada, cohortes, kpi_cache, kpi_diario, ocupacion
+from .services.asistencia import propagar_despues
 
 Usuario = get_user_model()
 
@@ -61,3 +67,203 @@ def sync_estudiante_usuario(sender, instance: Estudiante, created, **kwargs):
 
     if changed:
         u.save()
+
+
+# ---------- Asistencia de cursos: efectos derivados, una vez por sesión ----------
+@receiver(pre_save, sender=AsistenciaCurso)
+def sesion_antes(sender, instance: AsistenciaCurso, update_fields=None, **kwargs):
+    # una sesión movida de fecha o curso deja de contar donde estaba
+    if kwargs.get("raw") or not instance.pk:
+        return
+    if update_fields is not None and not {"curso", "curso_id", "fecha"} & set(update_fields):
+        return
+    instance._clave_previa = (AsistenciaCurso.objects.filter(pk=instance.pk)
+                              .values_list("curso_id", "fecha").first())
+
+
+@receiver(post_save, sender=AsistenciaCurso)
+def sesion_guardada(sender, instance: AsistenciaCurso, **kwargs):
+    if kwargs.get("raw"):
+        return
+    previa = getattr(instance, "_clave_previa", None)
+    instance._clave_previa = None
+    if previa == (instance.curso_id, instance.fecha):
+        previa = None
+    if previa:
+        # copia de fecha/curso/sede en los detalles
+        sede_id = Curso.objects.filter(pk=instance.curso_id).values_list("sede_id", flat=True).first()
+        AsistenciaCursoDetalle.objects.filter(asistencia=instance).update(
+            fecha=instance.fecha, curso_id=instance.curso_id, sede_id=sede_id)
+    propagar_despues(instance.pk, previa=previa)
+
+
+@receiver(post_delete, sender=AsistenciaCurso)
+def sesion_eliminada(sender, instance: AsistenciaCurso, **kwargs):
+    propagar_despues(instance.pk, (), previa=(instance.curso_id, instance.fecha))
+
+
+@receiver(post_save, sender=AsistenciaCursoDetalle)
+def detalle_guardado(sender, instance: AsistenciaCursoDetalle, **kwargs):
+    if kwargs.get("raw"):
+        return
+    propagar_despues(instance.asistencia_id, [instance.estudiante_id], versionar=True)
+
+
+@receiver(post_delete, sender=AsistenciaCursoDetalle)
+def detalle_eliminado(sender, instance: AsistenciaCursoDetalle, **kwargs):
+    propagar_despues(instance.asistencia_id, (), borrados=[(instance.estudiante_id, instance.fecha)],
+                     versionar=True)
+
+
+# ---------- Curso: una lectura previa y un solo receptor para todo lo que copia sus dimensiones ----------
+@receiver(pre_save, sender=Curso)
+def curso_antes(sender, instance: Curso, **kwargs):
+    if kwargs.get("raw") or not instance.pk:
+        return
+    instance._sede_previa = Curso.objects.filter(pk=instance.pk).values_list("sede_id", flat=True).first()
+
+
+@receiver(post_save, sender=Curso)
+def curso_guardado(sender, instance: Curso, created, **kwargs):
+    if kwargs.get("raw"):
+        return
+    kpi_cache.invalidar(instance.sede_id, None)
+    if created:
+        return
+    previa = getattr(instance, "_sede_previa", instance.sede_id)
+    instance._sede_previa = instance.sede_id
+    if previa != instance.sede_id:
+        # la sede copiada en los detalles, y el alcance/celdas que el curso deja
+        AsistenciaCursoDetalle.objects.filter(curso=instance).update(sede_id=instance.sede_id)
+        kpi_cache.invalidar(previa, None)
+        ocupacion.refrescar_despues(previa)
+    kpi_diario.actualizar_dimensiones_curso(instance)
+    cohortes.actualizar_dimensiones_curso(instance)
+    asistencia_unificada.actualizar_curso(instance)
+    # cupos, vigencia, estado o sede: cambian todas las celdas del curso
+    ocupacion.refrescar_despues(instance.sede_id)
+
+
+@receiver(post_delete, sender=Curso)
+def curso_eliminado(sender, instance: Curso, **kwargs):
+    kpi_cache.invalidar(instance.sede_id, None)
+    ocupacion.refrescar_despues(instance.sede_id)
+
+
+# ---------- KPI: cohortes de ingreso (bit de actividad por mes) ----------
+@receiver(post_save, sender=Estudiante)
+def cohorte_estudiante_guardado(sender, instance: Estudiante, **kwargs):
+    if kwargs.get("raw"):
+        return
+    cohortes.asignar_cohorte(instance)
+
+
+# ---------- KPI: invalidación de la caché de tableros ----------
+def _sede_de_curso(curso_id):
+    if not curso_id:
+        return None
+    return Curso.objects.filter(pk=curso_id).values_list("sede_id", flat=True).first()
+
+
+def _alcances(instance):
+    """(sede, año) afectados por un registro; año None = todos los años."""
+    if isinstance(instance, Estudiante):
+        anio = instance.creado.year if instance.creado else None
+        return {(_sede_de_curso(instance.curso_id), anio)}
+    if isinstance(instance, Planificacion):
+        anio = instance.semana.year if instance.semana else None
+        return {(_sede_de_curso(instance.curso_id), anio)}
+    return set()
+
+
+@receiver(pre_save, sender=Estudiante)
+@receiver(pre_save, sender=Planificacion)
+def kpi_cache_antes(sender, instance, **kwargs):
+    # Si el registro cambia de curso/sede, también hay que invalidar el alcance anterior
+    if kwargs.get("raw") or not instance.pk:
+        return
+    anterior = sender.objects.filter(pk=instance.pk).first()
+    instance._kpi_alcances_previos = _alcances(anterior) if anterior else set()
+
+
+@receiver(post_save, sender=Estudiante)
+@receiver(post_save, sender=Planificacion)
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Planificacion)
+def kpi_cache_invalidar(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    alcances = _alcances(instance) | getattr(instance, "_kpi_alcances_previos", set())
+    for sede_id, anio in alcances:
+        kpi_cache.invalidar(sede_id, anio)
+
+
+# ---------- Asistencia unificada: proyección de los tres esquemas ----------
+_ORIGEN = AsistenciaUnificada.Origen
+_REGISTROS = {
+    AsistenciaCursoDetalle: _ORIGEN.CURSO,
+    AsistenciaAtleta: _ORIGEN.ATLETA,
+    AsistenciaAlumno: _ORIGEN.CLASE,
+}
+
+
+@receiver(post_save, sender=AsistenciaAtleta)
+@receiver(post_save, sender=AsistenciaAlumno)
+def unificada_registro_guardado(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    asistencia_unificada.proyectar(_REGISTROS[sender], pk=instance.pk)
+
+
+@receiver(post_delete, sender=AsistenciaCursoDetalle)
+@receiver(post_delete, sender=AsistenciaAtleta)
+@receiver(post_delete, sender=AsistenciaAlumno)
+def unificada_registro_eliminado(sender, instance, **kwargs):
+    asistencia_unificada.quitar(_REGISTROS[sender], instance.pk)
+
+
+@receiver(post_save, sender=Clase)
+def unificada_clase_guardada(sender, instance: Clase, created, **kwargs):
+    if not created and not kwargs.get("raw"):
+        asistencia_unificada.proyectar(_ORIGEN.ATLETA, clase_id=instance.pk)
+
+
+@receiver(post_save, sender=AsistenciaClase)
+def unificada_asistencia_clase_guardada(sender, instance: AsistenciaClase, created, **kwargs):
+    if not created and not kwargs.get("raw"):
+        asistencia_unificada.proyectar(_ORIGEN.CLASE, asistencia_id=instance.pk)
+
+
+@receiver(post_save, sender=Estudiante)
+def unificada_estudiante_guardado(sender, instance: Estudiante, **kwargs):
+    if not kwargs.get("raw"):
+        asistencia_unificada.enlazar_estudiante(instance)
+
+
+# ---------- KPI: grilla de ocupación de las sedes ----------
+@receiver(pre_save, sender=CursoHorario)
+def ocupacion_horario_antes(sender, instance: CursoHorario, **kwargs):
+    if kwargs.get("raw") or not instance.pk:
+        return
+    instance._ocupacion_previa = (CursoHorario.objects.filter(pk=instance.pk)
+                                  .values_list("curso__sede_id", "dia").first())
+
+
+@receiver(post_save, sender=CursoHorario)
+@receiver(post_delete, sender=CursoHorario)
+def ocupacion_horario(sender, instance: CursoHorario, **kwargs):
+    if kwargs.get("raw"):
+        return
+    # al borrar un curso sus horarios se van antes: la sede la refresca curso_eliminado
+    sede_id = _sede_de_curso(instance.curso_id)
+    ocupacion.refrescar_despues(sede_id, [instance.dia])
+    previa = getattr(instance, "_ocupacion_previa", None)
+    if previa and previa != (sede_id, instance.dia):
+        ocupacion.refrescar_despues(previa[0], [previa[1]])
+
+
+@receiver(post_save, sender=Sede)
+def ocupacion_sede_guardada(sender, instance: Sede, created, **kwargs):
+    # la capacidad se lee de Sede al calcular el uso de recintos
+    if not created and not kwargs.get("raw"):
+        kpi_cache.invalidar(instance.pk, None)
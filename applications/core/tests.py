@@ -1,3 +1,396 @@
-from django.test import TestCase
+import re
+from datetime import timedelta
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from applications.core import kpi_cache, rachas
+from applications.core.exports.excel_export import detalle_qs
+from applications.core.kpi_diario import reconstruir_kpi_diario
+from applications.core.kpi_cache import firma_kpi
+from applications.core.kpi_engine import q_dimensiones
+from applications.core.services.asistencia import sincronizar
+from applications.core.models import (
+    AsistenciaCurso, AsistenciaCursoDetalle, Curso, Deporte, Estudiante, MutacionAsistencia, Planificacion,
+    RachaInasistencia, Sede,
+)
+from applications.core.services.reportes_service import obtener_kpi_por_sede, obtener_kpi_profesores
+from applications.core.views import KPI_PANELES, _estudiante_detail_context
+from applications.usuarios.models import Profesor, Usuario
+
+# la caché real es una tabla (DatabaseCache): sus lecturas no son consultas del tablero
+CACHE_LOCAL = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+_ruts = count(1)
+
+
+def _usuario(tipo, **extra):
+    n = next(_ruts)
+    return Usuario.objects.create_user(username=f"u{n}", password="x", rut=f"{n}-0", tipo_usuario=tipo, **extra)
+
+
+def _sembrar(sede, deporte, profesor, n_cursos, alumnos=3, dias=4):
+    """Cursos con alumnos y `dias` sesiones tomadas hasta hoy (el primer alumno, ausente); arma los hechos KPI."""
+    hoy = timezone.localdate()
+    cursos = []
+    for _ in range(n_cursos):
+        curso = Curso.objects.create(nombre=f"Curso {next(_ruts)}", sede=sede, disciplina=deporte, profesor=profesor)
+        estudiantes = [Estudiante.objects.create(rut=f"{next(_ruts)}-1", nombres="N", apellidos="A", curso=curso)
+                       for _ in range(alumnos)]
+        sesiones = AsistenciaCurso.objects.bulk_create(
+            [AsistenciaCurso(curso=curso, fecha=hoy - timedelta(days=d)) for d in range(dias)])
+        AsistenciaCursoDetalle.objects.bulk_create([
+            AsistenciaCursoDetalle(asistencia=s, estudiante=e, estado="A" if i == 0 else "P",
+                                   fecha=s.fecha, curso=curso, sede=sede)
+            for s in sesiones for i, e in enumerate(estudiantes)
+        ])
+        cursos.append(curso)
+    reconstruir_kpi_diario()
+    return cursos
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class PresupuestoConsultasKpiTests(TestCase):
+    """Consultas de cada tablero KPI (esqueleto + todos sus paneles): fijas, no crecen con los datos."""
+
+    VISTAS = {
+        "general": "core:dashboard_kpi",
+        "semanal": "core:dashboard_kpi_semana",
+        "mensual": "core:dashboard_kpi_mes",
+        "anual": "core:dashboard_kpi_anio",
+    }
+    # modo: (esqueleto, paneles); cada request suma sesión + usuario
+    PRESUPUESTO = {
+        "general": (4, 29),
+        "semanal": (4, 23),
+        "mensual": (4, 23),
+        "anual": (4, 24),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.coord = _usuario(Usuario.Tipo.COORD)
+        cls.profesor = _usuario(Usuario.Tipo.PROF, first_name="Ana", last_name="Soto")
+        cls.sede = Sede.objects.create(nombre="Sede Norte")
+        cls.deporte = Deporte.objects.create(nombre="Fútbol")
+        _sembrar(cls.sede, cls.deporte, cls.profesor, 2)
+
+    def setUp(self):
+        self.client.force_login(self.coord)
+
+    def _tablero(self, modo):
+        esqueleto, paneles = self.PRESUPUESTO[modo]
+        cache.clear()
+        with self.assertNumQueries(esqueleto):
+            self.assertEqual(self.client.get(reverse(self.VISTAS[modo])).status_code, 200)
+        with self.assertNumQueries(paneles):
+            for panel in KPI_PANELES:
+                r = self.client.get(reverse("core:kpi_api", args=[panel]), {"modo": modo, "sede": self.sede.pk})
+                self.assertEqual(r.status_code, 200, panel)
+
+    def test_presupuesto_por_tablero(self):
+        for modo in self.VISTAS:
+            with self.subTest(modo=modo):
+                self._tablero(modo)
+
+    def test_presupuesto_no_crece_con_los_datos(self):
+        _sembrar(self.sede, self.deporte, self.profesor, 6, alumnos=5)
+        for modo in self.VISTAS:
+            with self.subTest(modo=modo):
+                self._tablero(modo)
+
+
+class KpiProfesoresSedesTests(TestCase):
+    """Conteos por profesor y por sede: cada conteo es su propia subconsulta, sin joins que multipliquen filas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        deporte = Deporte.objects.create(nombre="Básquetbol")
+        cls.norte, cls.sur, cls.vacia = (Sede.objects.create(nombre=n) for n in ("Norte", "Sur", "Vacía"))
+        cls.ana, cls.luis, cls.sin_cursos = (
+            _usuario(Usuario.Tipo.PROF, first_name=n, last_name="Prof") for n in ("Ana", "Luis", "Eva"))
+        for u in (cls.ana, cls.luis, cls.sin_cursos):
+            Profesor.objects.create(usuario=u)
+
+        # Ana: 2 cursos y 3 planificaciones (un join de ambos daría 6 y 6)
+        c1 = Curso.objects.create(nombre="Norte A", sede=cls.norte, disciplina=deporte, profesor=cls.ana)
+        c2 = Curso.objects.create(nombre="Sur A", sede=cls.sur, disciplina=deporte, profesor=cls.ana)
+        c3 = Curso.objects.create(nombre="Norte L", sede=cls.norte, disciplina=deporte, profesor=cls.luis)
+        for curso in (c1, c1, c2):
+            Planificacion.objects.create(curso=curso, autor=cls.ana)
+        for i, curso in enumerate((c1, c1, c1, c3, c3, c2)):
+            Estudiante.objects.create(rut=f"{next(_ruts)}-2", nombres=f"E{i}", apellidos="A", curso=curso)
+
+    def _sin_multiplicar(self, consultas):
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn("LEFT OUTER JOIN", consultas[0]["sql"])
+
+    def test_kpi_profesores(self):
+        with CaptureQueriesContext(connection) as consultas:
+            datos = obtener_kpi_profesores()
+        self._sin_multiplicar(consultas)
+        por_nombre = {d["nombre"]: (d["cursos"], d["planificaciones"]) for d in datos}
+        self.assertEqual(len(datos), 3)
+        self.assertEqual(por_nombre, {
+            str(self.ana): (2, 3),
+            str(self.luis): (1, 0),
+            str(self.sin_cursos): (0, 0),
+        })
+
+    def test_kpi_por_sede(self):
+        with CaptureQueriesContext(connection) as consultas:
+            datos = obtener_kpi_por_sede()
+        self._sin_multiplicar(consultas)
+        self.assertEqual(len(datos), Sede.objects.count())
+        por_sede = {d["sede"]: (d["cursos"], d["estudiantes"]) for d in datos}
+        self.assertEqual(por_sede, {"Norte": (2, 5), "Sur": (1, 1), "Vacía": (0, 0)})
+
+
+class DetalleSinJoinsTests(TestCase):
+    """Lecturas del detalle de asistencia: fecha, curso y sede copiados, sin join a la sesión ni al curso."""
+
+    JOIN = re.compile(r'JOIN\W+core_(asistenciacurso|curso)\W')
+
+    @classmethod
+    def setUpTestData(cls):
+        profesor = _usuario(Usuario.Tipo.PROF)
+        cls.sede, otra = Sede.objects.create(nombre="Norte"), Sede.objects.create(nombre="Sur")
+        cls.deporte, tenis = Deporte.objects.create(nombre="Fútbol"), Deporte.objects.create(nombre="Tenis")
+        cls.curso = _sembrar(cls.sede, cls.deporte, profesor, 1)[0]
+        _sembrar(cls.sede, tenis, profesor, 1)
+        _sembrar(otra, cls.deporte, profesor, 1)
+
+    def _sin_joins(self, consultas):
+        detalle = [q["sql"] for q in consultas if '"core_asistenciacursodetalle"' in q["sql"]]
+        self.assertTrue(detalle)
+        for sql in detalle:
+            self.assertIsNone(self.JOIN.search(sql), sql)
+
+    def test_ficha_estudiante(self):
+        estudiante = Estudiante.objects.filter(curso=self.curso).order_by("pk").first()
+        with CaptureQueriesContext(connection) as consultas:
+            ctx = _estudiante_detail_context(estudiante.pk)
+            filas = [(d.fecha, str(d.curso), d.asistencia_id) for d in ctx["ult_asistencias"]]
+        self._sin_joins(consultas)
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[0][1], str(self.curso))
+
+    def test_filtros_kpi(self):
+        casos = {
+            (None, self.sede.pk, self.deporte.pk): 12,
+            (None, self.sede.pk, None): 24,
+            (None, None, self.deporte.pk): 24,
+            ("FORM", self.sede.pk, self.deporte.pk): 12,
+            ("ALTO", None, None): 0,
+        }
+        for (programa, sede_id, dep_id), esperado in casos.items():
+            with self.subTest(programa=programa, sede=sede_id, disciplina=dep_id):
+                with CaptureQueriesContext(connection) as consultas:
+                    n = AsistenciaCursoDetalle.objects.filter(
+                        q_dimensiones("detalles", programa, sede_id, dep_id)).count()
+                    list(detalle_qs(programa, sede_id, dep_id))
+                self._sin_joins(consultas)
+                self.assertEqual(n, esperado)
+
+
+class SincronizacionTests(TestCase):
+    """Conflictos de la sincronización sin conexión: por campo gana la escritura más reciente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = _usuario(Usuario.Tipo.PROF)
+        cls.otro = _usuario(Usuario.Tipo.PROF)
+        curso = Curso.objects.create(nombre="Sync", sede=Sede.objects.create(nombre="Centro"),
+                                     disciplina=Deporte.objects.create(nombre="Vóley"), profesor=cls.profesor)
+        cls.curso = curso
+        cls.estudiante = Estudiante.objects.create(rut=f"{next(_ruts)}-3", nombres="N", apellidos="A", curso=curso)
+        cls.fecha = timezone.localdate()
+
+    def _mutacion(self, clave, minutos, **campos):
+        ts = timezone.now() - timedelta(minutes=minutos)
+        return {"clave": clave, "curso": self.curso.pk, "estudiante": self.estudiante.pk,
+                "fecha": self.fecha.isoformat(), "ts": ts.isoformat(), **campos}
+
+    def _detalle(self):
+        return AsistenciaCursoDetalle.objects.get(estudiante=self.estudiante, fecha=self.fecha)
+
+    def _resultados(self, datos):
+        return [r["resultado"] for r in datos["resultados"]]
+
+    def test_gana_la_escritura_mas_reciente_aunque_llegue_antes(self):
+        # el "P" (más nuevo) llega primero y crea la fila; el "A" viejo de otro dispositivo llega después
+        self.assertEqual(self._resultados(sincronizar(self.profesor, [self._mutacion("n1", 5, estado="P")])),
+                         ["aplicada"])
+        self.assertIsNotNone(self._detalle().estado_modificado)
+        self.assertEqual(self._resultados(sincronizar(self.otro, [self._mutacion("v1", 30, estado="A")])),
+                         ["obsoleta"])
+        self.assertEqual(self._detalle().estado, "P")
+
+        # dentro de un mismo lote también se ordena por ts
+        sincronizar(self.profesor, [self._mutacion("n2", 1, estado="J"), self._mutacion("v2", 3, estado="A")])
+        self.assertEqual(self._detalle().estado, "J")
+
+    def test_solo_observaciones_no_toma_asistencia(self):
+        datos = sincronizar(self.profesor, [self._mutacion("o1", 5, observaciones=" llegó tarde ")])
+        self.assertEqual(self._resultados(datos), ["aplicada"])
+        detalle = self._detalle()
+        self.assertEqual(detalle.estado, AsistenciaCursoDetalle.SIN_TOMAR)
+        self.assertEqual(detalle.observaciones, "llegó tarde")
+        self.assertIsNone(detalle.estado_modificado)
+        self.assertFalse(AsistenciaCursoDetalle.objects.tomados().filter(pk=detalle.pk).exists())
+
+        # el estado de otro dispositivo, aunque más antiguo, no pisa la observación más nueva
+        sincronizar(self.otro, [self._mutacion("o2", 10, estado="A", observaciones="otra")])
+        detalle = self._detalle()
+        self.assertEqual((detalle.estado, detalle.observaciones), ("A", "llegó tarde"))
+
+    def test_claves_repetidas(self):
+        primera = sincronizar(self.profesor, [self._mutacion("k1", 5, estado="A"),
+                                              self._mutacion("k1", 4, estado="P")])
+        self.assertCountEqual(self._resultados(primera), ["aplicada", "rechazada"])
+        self.assertEqual(self._detalle().estado, "A")
+
+        # reintento del lote: no se reaplica, responde el resultado guardado
+        reintento = sincronizar(self.profesor, [self._mutacion("k1", 1, estado="J")])
+        self.assertEqual(reintento["resultados"], [{"clave": "k1", "resultado": "aplicada", "repetida": True}])
+        self.assertEqual(self._detalle().estado, "A")
+        self.assertEqual(MutacionAsistencia.objects.filter(usuario=self.profesor, clave="k1").count(), 1)
+
+        # la clave es por usuario: la misma clave de otro usuario sí se aplica
+        self.assertEqual(self._resultados(sincronizar(self.otro, [self._mutacion("k1", 1, estado="J")])),
+                         ["aplicada"])
+        self.assertEqual(self._detalle().estado, "J")
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ValidadoresKpiApiTests(TestCase):
+    """Un panel obsoleto servido mientras otro worker lo recalcula no sale con el ETag de la firma nueva."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.coord = _usuario(Usuario.Tipo.COORD)
+        cls.sede = Sede.objects.create(nombre="Sede Este")
+        _sembrar(cls.sede, Deporte.objects.create(nombre="Judo"), _usuario(Usuario.Tipo.PROF), 1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.coord)
+        self.url = reverse("core:kpi_api", args=["tarjetas"])
+        self.params = {"modo": "semanal", "sede": self.sede.pk}
+
+    def test_obsoleto_sin_validadores(self):
+        r = self.client.get(self.url, self.params)
+        self.assertTrue(r.has_header("ETag"))
+        self.assertEqual(self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=r["ETag"]).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kpi_cache.invalidar(self.sede.pk, timezone.localdate().year)
+        # otro worker tiene el lock: se sirve el resultado anterior
+        with mock.patch.object(kpi_cache.cache, "add", return_value=False):
+            obsoleta = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=r["ETag"])
+        self.assertEqual(obsoleta.status_code, 200)
+        self.assertFalse(obsoleta.has_header("ETag"))
+        self.assertFalse(obsoleta.has_header("Last-Modified"))
+
+        fresca = self.client.get(self.url, self.params)
+        self.assertTrue(fresca.has_header("ETag"))
+        self.assertNotEqual(fresca["ETag"], r["ETag"])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class FirmaKpiTests(TestCase):
+    def test_contador_descartado_no_repite_una_firma_vieja(self):
+        cache.clear()
+        inicio, fin = timezone.localdate().replace(month=1, day=1), timezone.localdate()
+        firmas = [firma_kpi(3, inicio, fin)[0]]
+        with self.captureOnCommitCallbacks(execute=True):
+            kpi_cache.invalidar(3, fin.year)
+        firmas.append(firma_kpi(3, inicio, fin)[0])
+        # el cull de la caché se lleva los contadores
+        cache.delete_many(kpi_cache._claves_lectura(3, inicio, fin))
+        firma = firma_kpi(3, inicio, fin)[0]
+        self.assertNotIn(firma, firmas)
+        self.assertEqual(firma_kpi(3, inicio, fin)[0], firma)
+
+
+class RachasTests(TestCase):
+    """Rachas de "A" seguidas: la consulta gaps-and-islands y la actualización incremental."""
+
+    @classmethod
+    def setUpTestData(cls):
+        sede = Sede.objects.create(nombre="Oeste")
+        deporte = Deporte.objects.create(nombre="Atletismo")
+        profesor = _usuario(Usuario.Tipo.PROF)
+        cls.cursos = [Curso.objects.create(nombre=f"R{i}", sede=sede, disciplina=deporte, profesor=profesor)
+                      for i in range(2)]
+        cls.hoy = timezone.localdate()
+
+    def _estudiante(self):
+        return Estudiante.objects.create(rut=f"{next(_ruts)}-4", nombres="N", apellidos="A", curso=self.cursos[0])
+
+    def _tomar(self, estudiante, estados, desde, curso=0):
+        """Un detalle por día desde `desde` (días atrás), en orden; "" = sin tomar."""
+        curso = self.cursos[curso]
+        for i, estado in enumerate(estados):
+            fecha = self.hoy - timedelta(days=desde - i)
+            sesion, _ = AsistenciaCurso.objects.get_or_create(curso=curso, fecha=fecha)
+            AsistenciaCursoDetalle.objects.bulk_create([AsistenciaCursoDetalle(
+                asistencia=sesion, estudiante=estudiante, estado=estado, fecha=fecha, curso=curso, sede=curso.sede)])
+
+    def _racha(self, estudiante):
+        r = RachaInasistencia.objects.get(estudiante=estudiante)
+        return r.actual, r.maxima, r.ultima_fecha
+
+    def test_islas(self):
+        islas, sin_a, en_curso = self._estudiante(), self._estudiante(), self._estudiante()
+        # sin tomar no corta la racha; J y P sí; lo futuro no cuenta
+        self._tomar(islas, ["A", "A", "P", "A", "", "A", "A", "J", "A"], desde=8)
+        self._tomar(islas, ["A", "A"], desde=-1)
+        self._tomar(sin_a, ["P", "J", "P"], desde=2)
+        self._tomar(en_curso, ["P", "A", "A"], desde=2)
+        sin_sesiones = self._estudiante()
+
+        self.assertEqual(rachas.reconstruir_rachas(), 3)
+        self.assertEqual(self._racha(islas), (1, 3, self.hoy))
+        self.assertEqual(self._racha(sin_a), (0, 0, self.hoy))
+        self.assertEqual(self._racha(en_curso), (2, 2, self.hoy))
+        self.assertFalse(RachaInasistencia.objects.filter(estudiante=sin_sesiones).exists())
+
+    def test_sesion_nueva_extiende_sin_recalcular(self):
+        estudiante = self._estudiante()
+        self._tomar(estudiante, ["A", "A", "P", "A"], desde=5)
+        rachas.recalcular_rachas([estudiante.pk])
+        self.assertEqual(self._racha(estudiante), (1, 2, self.hoy - timedelta(days=2)))
+
+        for dias, estado, esperado in ((1, "A", (2, 2)), (0, "A", (3, 3))):
+            self._tomar(estudiante, [estado], desde=dias)
+            with mock.patch.object(rachas, "recalcular_rachas") as recalcular:
+                rachas.actualizar_rachas([estudiante.pk], self.hoy - timedelta(days=dias))
+            recalcular.assert_not_called()
+            self.assertEqual(self._racha(estudiante)[:2], esperado)
+
+    def test_correccion_y_dos_sesiones_el_mismo_dia_recalculan(self):
+        estudiante = self._estudiante()
+        self._tomar(estudiante, ["A", "A", "A"], desde=3)
+        rachas.recalcular_rachas([estudiante.pk])
+
+        # corrección de una sesión anterior a la última registrada
+        AsistenciaCursoDetalle.objects.filter(estudiante=estudiante, fecha=self.hoy - timedelta(days=2)).update(estado="P")
+        with mock.patch.object(rachas, "recalcular_rachas", wraps=rachas.recalcular_rachas) as recalcular:
+            rachas.actualizar_rachas([estudiante.pk], self.hoy - timedelta(days=2))
+        recalcular.assert_called_once_with({estudiante.pk})
+        self.assertEqual(self._racha(estudiante)[:2], (1, 1))
+
+        # dos cursos el mismo día nuevo: el orden dentro del día lo decide la consulta
+        self._tomar(estudiante, ["A"], desde=0)
+        self._tomar(estudiante, ["A"], desde=0, curso=1)
+        with mock.patch.object(rachas, "recalcular_rachas", wraps=rachas.recalcular_rachas) as recalcular:
+            rachas.actualizar_rachas([estudiante.pk], self.hoy)
+        recalcular.assert_called_once()
+        self.assertEqual(self._racha(estudiante), (3, 3, self.hoy))
@@ -60,7 +60,11 @@ path("estudiantes/<int:pk>/pdf/", views.estudiante_detail_pdf, name="estudiante_
     path("asistencia/<int:curso_id>/tomar/", views.asistencia_tomar, name="asistencia_tomar"),          # canónica
     path("asistencia/profesor/<int:curso_id>/", views.asistencia_tomar, name="asistencia_profesor"),   # alias legacy
     path("asistencia/estudiantes/<int:curso_id>/", views.asistencia_estudiantes, name="asistencia_estudiantes"),
+    path("asistencia/sync/", views.asistencia_sync, name="asistencia_sync"),
     path("asistencias/semaforo/", views.asistencia_semaforo, name="asistencia_semaforo"),
+    path("asistencias/en-vivo/", views.asistencia_en_vivo, name="asistencia_en_vivo"),
+    path("asistencias/eventos/", views.asistencia_eventos, name="asistencia_eventos"),
+    path("asistencias/alertas/<int:alerta_id>/revisada/", views.alerta_asistencia_revisada, name="alerta_asistencia_revisada"),
     path("profesor/mi-asistencia-qr/", views.mi_asistencia_qr, name="mi_asistencia_qr"),
 
     # ===== KPI / Reportes =====
@@ -69,6 +73,13 @@ path("estudiantes/<int:pk>/pdf/", views.estudiante_detail_pdf, name="estudiante_
     path("reportes/kpi/semanal/", views.dashboard_kpi_semana, name="dashboard_kpi_semana"),
     path("reportes/kpi/mensual/", views.dashboard_kpi_mes, name="dashboard_kpi_mes"),
     path("reportes/kpi/anual/", views.dashboard_kpi_anio, name="dashboard_kpi_anio"),
+    path("reportes/kpi/rango/", views.dashboard_kpi_rango, name="dashboard_kpi_rango"),
+    path("reportes/kpi/api/<str:panel>/", views.kpi_api, name="kpi_api"),
+    path("reportes/kpi/cubo/", views.kpi_cubo_vista, name="kpi_cubo"),
+    path("reportes/kpi/cubo/api/", views.kpi_cubo_api, name="kpi_cubo_api"),
+    path("reportes/cohortes/", views.reportes_cohortes, name="reportes_cohortes"),
+    path("reportes/ocupacion/", views.reportes_ocupacion, name="reportes_ocupacion"),
+    path("reportes/ocupacion/api/", views.reportes_ocupacion_api, name="reportes_ocupacion_api"),
 
     # Exportaciones (GENERAL)
     path("reportes/exportar/general/pdf/", views.exportar_kpi_general_pdf, name="exportar_kpi_general_pdf"),
@@ -82,6 +93,15 @@ path("estudiantes/<int:pk>/pdf/", views.estudiante_detail_pdf, name="estudiante_
     # Exportaciones (AÑO)
     path("reportes/exportar/anio/pdf/", views.exportar_kpi_anio_pdf, name="exportar_kpi_anio_pdf"),
     path("reportes/exportar/anio/excel/", views.exportar_kpi_anio_excel, name="exportar_kpi_anio_excel"),
+    path("reportes/exportar/rango/pdf/", views.exportar_kpi_rango_pdf, name="exportar_kpi_rango_pdf"),
+    path("reportes/exportar/rango/excel/", views.exportar_kpi_rango_excel, name="exportar_kpi_rango_excel"),
+
+    # Cola de reportes (estado y descarga)
+    path("reportes/trabajos/<int:pk>/", views.reporte_estado, name="reporte_estado"),
+    path("reportes/trabajos/<int:pk>/descargar/", views.reporte_descargar, name="reporte_descargar"),
+
+    # Detalle crudo de asistencia (CSV en streaming)
+    path("reportes/exportar/detalle/csv/", views.exportar_detalle_csv, name="exportar_detalle_csv"),
 
     # ===== Noticias (solo ADMIN) =====
     path("noticias/", views.noticias_list, name="noticias_list"),
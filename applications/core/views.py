@@ -1,15 +1,15 @@
 # applications/core/views.py
 
 import os
+import json
+import time
 import base64
 from io import BytesIO
 from datetime import date, timedelta
 from math import radians, sin, cos, asin, sqrt
 
-import matplotlib.pyplot as plt
 import pandas as pd
 
-import re
 from weasyprint import HTML
 from django.apps import apps
 from django.contrib import messages
@@ -20,7 +20,8 @@ from django.db import IntegrityError, transaction
 from django.db.models import Q, Count
 from django.db.models.deletion import ProtectedError
 from django.db.models.functions import TruncMonth, TruncDay
-from django.http import HttpResponse, FileResponse, Http404, HttpResponseForbidden
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, FileResponse, Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -37,7 +38,11 @@ from applications.core.models import (
     Curso, Sede, Estudiante,
     Deporte, Planificacion, PlanificacionVersion,
     Noticia, RegistroPeriodo,
-    AsistenciaCurso, AsistenciaCursoDetalle,
+    AsistenciaCurso, AsistenciaCursoDetalle, AlertaAsistencia, RachaInasistencia,
+)
+from applications.core import eventos
+from applications.core.services.asistencia import (
+    MAX_MUTACIONES, cambiar_estado, cambios_desde_post, guardar_asistencia, sesion_del_dia, sincronizar,
 )
 
 from .forms import (
@@ -129,45 +134,114 @@ def es_admin_o_coord(user):
 @login_required
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
 def asistencia_semaforo(request):
-
-    estudiantes = Estudiante.objects.filter(asistencias_curso__isnull=False).distinct()
+    # rachas ya calculadas al registrar asistencia (core.rachas); las peores primero
+    rachas_qs = RachaInasistencia.objects.select_related("estudiante__curso").order_by("-maxima", "-actual", "estudiante")
+    page_obj = Paginator(rachas_qs, 30).get_page(request.GET.get("page") or 1)
 
     data = []
-    for est in estudiantes:
-        registros = (
-            AsistenciaCursoDetalle.objects
-            .filter(estudiante=est)
-            .select_related("asistencia")
-            .order_by("asistencia__fecha")
-        )
-
-        faltas_consec = 0
-        max_faltas = 0
-        for r in registros:
-            if r.estado == "A":
-                faltas_consec += 1
-                max_faltas = max(max_faltas, faltas_consec)
-            else:
-                faltas_consec = 0
-
-        if max_faltas >= 3:
+    for r in page_obj:
+        if r.maxima >= 3:
             color = "rojo"
-        elif max_faltas == 2:
+        elif r.maxima == 2:
             color = "amarillo"
         else:
             color = "verde"
 
         data.append({
-            "estudiante": est,
-            "curso": est.curso,
-            "faltas_consec": max_faltas,
+            "estudiante": r.estudiante,
+            "curso": r.estudiante.curso,
+            "faltas_consec": r.maxima,
+            "racha_actual": r.actual,
             "color": color,
         })
 
-    context = {"data": data}
+    cursos = Curso.objects.filter(asistencias__isnull=False).distinct().order_by("nombre")
+    context = {"data": data, "page_obj": page_obj, "cursos": cursos}
     return render(request, "core/semaforo_asistencia.html", context)
 
 
+def _sede_param(request):
+    try:
+        return int(request.GET.get("sede") or "") or None
+    except ValueError:
+        return None
+
+
+@login_required
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def asistencia_en_vivo(request):
+    """Clases de hoy en todas las sedes; después se actualiza con asistencia_eventos."""
+    sede_id = _sede_param(request)
+    sesiones = (AsistenciaCurso.objects.filter(fecha=timezone.localdate())
+                .select_related("curso", "curso__sede").order_by("curso__sede__nombre", "curso__nombre"))
+    if sede_id:
+        sesiones = sesiones.filter(curso__sede_id=sede_id)
+    # cursor y último evento por sesión antes de la foto: un evento intermedio
+    # llega repetido (y se aplica), nunca se pierde
+    cursor = eventos.ultimo_cursor()
+    ultimos = eventos.ultimos_por_sesion(sesiones.values_list("pk", flat=True))
+    sesiones = list(sesiones)
+    for s in sesiones:
+        s.ultimo_evento = ultimos.get(s.pk, 0)
+    return render(request, "core/asistencia_en_vivo.html", {
+        "sesiones": sesiones,
+        "cursor": cursor,
+        "intervalo": eventos.INTERVALO_SONDEO * 1000,
+        "sede_id": sede_id,
+        "sedes": Sede.objects.order_by("nombre"),
+    })
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def asistencia_eventos(request):
+    """
+    Eventos de asistencia desde el cursor (?desde= o Last-Event-ID), con el
+    solape de eventos.despues_de. Por defecto JSON inmediato: el tablero
+    sondea y no ocupa un worker sync de gunicorn. Con ?formato=sse, como
+    server-sent events (una consulta por tick y corte tras DURACION_SSE);
+    solo tiene sentido con workers async o gthread.
+    """
+    try:
+        cursor = int(request.headers.get("Last-Event-ID") or request.GET.get("desde") or 0)
+    except ValueError:
+        cursor = 0
+    sede_id = _sede_param(request)
+
+    if request.GET.get("formato") != "sse":
+        nuevos = eventos.despues_de(cursor, sede_id)
+        return JsonResponse({"eventos": nuevos, "cursor": max([cursor] + [e["id"] for e in nuevos])})
+
+    def _stream(cursor):
+        yield f"retry: {eventos.INTERVALO_SSE * 1000}\n\n"
+        fin = time.monotonic() + eventos.DURACION_SSE
+        enviados = set()
+        while True:
+            nuevos = [e for e in eventos.despues_de(cursor, sede_id) if e["id"] not in enviados]
+            for e in nuevos:
+                enviados.add(e["id"])
+                cursor = max(cursor, e["id"])
+                yield f"id: {cursor}\ndata: {json.dumps(e, cls=DjangoJSONEncoder)}\n\n"
+            if not nuevos:
+                yield ": ping\n\n"
+            if time.monotonic() >= fin:
+                return
+            time.sleep(eventos.INTERVALO_SSE)
+
+    resp = StreamingHttpResponse(_stream(cursor), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["POST"])
+def alerta_asistencia_revisada(request, alerta_id: int):
+    AlertaAsistencia.objects.filter(pk=alerta_id).update(revisada=True)
+    messages.success(request, "Alerta marcada como revisada.")
+    return redirect("usuarios:panel_coordinador")
+
+
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from .models import Estudiante
@@ -347,11 +421,11 @@ def _estudiante_detail_context(pk: int):
         .get(pk=pk)
     )
 
+    # fecha/curso vienen copiados en el detalle: sin joins a la sesión ni al curso
     acd_qs = (
-        AsistenciaCursoDetalle.objects
-        .select_related("asistencia", "asistencia__curso", "asistencia__curso__sede")
+        AsistenciaCursoDetalle.objects.tomados()
         .filter(estudiante_id=pk)
-        .order_by("-asistencia__fecha", "-id")
+        .order_by("-fecha", "-id")
     )
 
     total_registros   = acd_qs.count()
@@ -359,7 +433,7 @@ def _estudiante_detail_context(pk: int):
     total_inasist     = acd_qs.filter(estado__in=["A", "J"]).count()
     justificadas      = acd_qs.filter(estado="J").count()
     injustificadas    = max(total_inasist - justificadas, 0)
-    ult_asistencias   = list(acd_qs[:20])
+    ult_asistencias   = list(acd_qs.prefetch_related("asistencia", "curso__disciplina")[:20])
 
     proximas_citas = []
     ult_fichas     = []
@@ -1293,9 +1367,9 @@ def mi_asistencia_qr(request):
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD, Usuario.Tipo.PROF)
 @require_http_methods(["GET"])
 def asistencia_estudiantes(request, curso_id: int):
-    from .models import AsistenciaCurso, AsistenciaCursoDetalle  # ajusta import si ya los tienes arriba
+    from .models import AsistenciaCursoDetalle  # ajusta import si ya los tienes arriba
 
-    curso = get_object_or_404(Curso, pk=curso_id)
+    curso = get_object_or_404(Curso.objects.select_related("ultima_asistencia"), pk=curso_id)
 
 
     if _es_prof(request.user) and not (
@@ -1304,25 +1378,16 @@ def asistencia_estudiantes(request, curso_id: int):
         return HttpResponseForbidden("No puedes ver alumnos de este curso.")
 
 
-    ultima = (
-        AsistenciaCurso.objects
-        .filter(curso=curso)
-        .order_by("-fecha")
-        .first()
-    )
+    ultima = curso.ultima_asistencia
 
 
     detalles_map = {}
-    resumen = {"P": 0, "A": 0, "J": 0, "total": 0}
     if ultima:
         qs_det = (AsistenciaCursoDetalle.objects
                   .select_related("estudiante")
                   .filter(asistencia=ultima))
         for d in qs_det:
             detalles_map[d.estudiante_id] = d
-            resumen["total"] += 1
-            if d.estado in ("P", "A", "J"):
-                resumen[d.estado] += 1
 
 
     alumnos = _estudiantes_del_curso(curso)
@@ -1348,7 +1413,7 @@ def asistencia_estudiantes(request, curso_id: int):
         "curso": curso,
         "rows": rows,
         "ultima": ultima,
-        "resumen": resumen if ultima else None,
+        "resumen": ultima.resumen if ultima else None,
     }
     return render(request, "profesor/asistencia_estudiantes.html", ctx)
 
@@ -1356,7 +1421,7 @@ def asistencia_estudiantes(request, curso_id: int):
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD, Usuario.Tipo.PROF)
 @require_http_methods(["GET", "POST"])
 def asistencia_tomar(request, curso_id: int):
-    from .models import AsistenciaCurso, AsistenciaCursoDetalle
+    from .models import AsistenciaCurso
     from applications.core.models import Estudiante
 
     curso = get_object_or_404(Curso, pk=curso_id)
@@ -1367,52 +1432,27 @@ def asistencia_tomar(request, curso_id: int):
     ):
         return HttpResponseForbidden("No puedes tomar asistencia de este curso.")
 
-    hoy = timezone.localdate()
-
-    # Buscar o crear la asistencia de hoy
-    asistencia, creada = AsistenciaCurso.objects.get_or_create(
-        curso=curso, fecha=hoy, defaults={"creado_por": request.user}
-    )
-
-    # Sincronizar alumnos del curso -> crear detalles faltantes
-    alumnos_curso = list(Estudiante.objects.filter(curso=curso))
-    existentes = set(asistencia.detalles.values_list("estudiante_id", flat=True))
-    nuevos = [a for a in alumnos_curso if a.id not in existentes]
-    if nuevos:
-        AsistenciaCursoDetalle.objects.bulk_create([
-            AsistenciaCursoDetalle(asistencia=asistencia, estudiante=a)
-            for a in nuevos
-        ])
+    # Sesión de hoy: viene pregenerada (pregenerar_asistencia) y abrirla solo lee
+    alumnos_curso = Estudiante.objects.filter(curso=curso).values_list("id", flat=True)
+    asistencia = sesion_del_dia(curso, alumnos_curso, request.user)
 
     # POST
     if request.method == "POST":
         accion = (request.POST.get("accion") or "").lower()
 
         if accion == "entrada":
-            asistencia.estado = AsistenciaCurso.Estado.ENCU
-            asistencia.inicio_real = timezone.localtime().time()
-            asistencia.save(update_fields=["estado", "inicio_real"])
+            cambiar_estado(asistencia, AsistenciaCurso.Estado.ENCU, request.user)
             messages.success(request, "Entrada registrada.")
             return redirect("core:asistencia_tomar", curso_id=curso.id)
 
         elif accion == "salida":
-            asistencia.estado = AsistenciaCurso.Estado.CERR
-            asistencia.fin_real = timezone.localtime().time()
-            asistencia.save(update_fields=["estado", "fin_real"])
+            cambiar_estado(asistencia, AsistenciaCurso.Estado.CERR, request.user)
             messages.success(request, "Salida registrada.")
             return redirect("core:asistencia_tomar", curso_id=curso.id)
 
         elif accion == "guardar":
-            actualizados = 0
-            for d in asistencia.detalles.all():
-                estado = request.POST.get(f"estado_{d.id}")
-                obs = (request.POST.get(f"obs_{d.id}") or "").strip()
-                if estado in ("P", "A", "J") and (d.estado != estado or (d.observaciones or "") != obs):
-                    d.estado = estado
-                    d.observaciones = obs
-                    d.save(update_fields=["estado", "observaciones"])
-                    actualizados += 1
-            messages.success(request, f"Asistencia guardada. Registros actualizados: {actualizados}.")
+            resultado = guardar_asistencia(asistencia, alumnos_curso, cambios_desde_post(request.POST), request.user)
+            messages.success(request, f"Asistencia guardada. Registros actualizados: {resultado['actualizados']}.")
             # 👉 Al guardar, volver al listado
             return redirect("profesor:asistencia_profesor")
 
@@ -1433,7 +1473,7 @@ def asistencia_tomar(request, curso_id: int):
             "ins": d,
             "est": est,
             "nombre": nombre,
-            "code": d.estado,
+            "code": d.estado or "P",
             "obs": d.observaciones,
         })
 
@@ -1451,6 +1491,37 @@ def asistencia_profesor(request, curso_id: int):
     return redirect("core:asistencia_tomar", curso_id=curso_id)
 
 
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD, Usuario.Tipo.PROF)
+@require_http_methods(["POST"])
+def asistencia_sync(request):
+    """
+    Sincronización por lotes para dispositivos sin conexión estable.
+    Cuerpo JSON: {"mutaciones": [...], "versiones": [...]} (ver
+    services.asistencia.sincronizar). Responde el resultado de cada
+    mutación y el estado de las sesiones que el dispositivo debe refrescar.
+    """
+    try:
+        datos = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"error": "JSON inválido"}, status=400)
+    if not isinstance(datos, dict):
+        return JsonResponse({"error": "Se esperaba un objeto JSON"}, status=400)
+    mutaciones, versiones = datos.get("mutaciones") or [], datos.get("versiones") or []
+    if not isinstance(mutaciones, list) or not isinstance(versiones, list):
+        return JsonResponse({"error": "mutaciones y versiones deben ser listas"}, status=400)
+    if len(mutaciones) > MAX_MUTACIONES:
+        return JsonResponse({"error": f"Máximo {MAX_MUTACIONES} mutaciones por lote"}, status=413)
+
+    permitidos = None
+    if _es_prof(request.user):
+        permitidos = set(
+            Curso.objects.filter(Q(profesor=request.user) | Q(profesores_apoyo=request.user))
+            .values_list("id", flat=True)
+        )
+    return JsonResponse(sincronizar(request.user, mutaciones, versiones, permitidos),
+                        json_dumps_params={"ensure_ascii": False})
+
+
 
 @role_required(Usuario.Tipo.PROF, Usuario.Tipo.PMUL, Usuario.Tipo.COORD, Usuario.Tipo.ADMIN)
 @require_http_methods(["GET", "POST"])
@@ -1943,27 +2014,13 @@ def asistencia_listado_por_curso(request):
         ).distinct()
 
     cursos = list(
-        cursos_qs.select_related("sede", "disciplina").order_by("nombre")
+        cursos_qs.select_related("sede", "disciplina", "ultima_asistencia").order_by("nombre")
     )
     if not cursos:
         return render(request, "profesor/asistencia_listado.html", {"cursos": []})
 
-    # 2) Última asistencia por curso (una por curso)
-    curso_ids = [c.id for c in cursos]
-    asistencias = (
-        AsistenciaCurso.objects
-        .filter(curso_id__in=curso_ids)
-        .select_related("curso")
-        .order_by("curso_id", "-fecha")
-    )
-
-    ultima_por_curso = {}
-    for a in asistencias:
-        if a.curso_id not in ultima_por_curso:
-            ultima_por_curso[a.curso_id] = a
-
-
-    ultima_ids = [a.id for a in ultima_por_curso.values()]
+    # 2) Última asistencia por curso (puntero guardado en Curso)
+    ultima_ids = [c.ultima_asistencia_id for c in cursos if c.ultima_asistencia_id]
     detalles = (
         AsistenciaCursoDetalle.objects
         .filter(asistencia_id__in=ultima_ids)
@@ -1977,9 +2034,8 @@ def asistencia_listado_por_curso(request):
 
 
     for c in cursos:
-        a = ultima_por_curso.get(c.id)
-        c.ultima = a
-        c.ultima_detalles = det_map.get(a.id, []) if a else []
+        c.ultima = c.ultima_asistencia
+        c.ultima_detalles = det_map.get(c.ultima_asistencia_id, [])
 
     return render(request, "profesor/asistencia_listado.html", {"cursos": cursos})
 
@@ -1987,24 +2043,36 @@ def asistencia_listado_por_curso(request):
 
 from datetime import date, datetime, timedelta
 from calendar import monthrange
-import json
+from functools import wraps
 
 import pandas as pd
-from weasyprint import HTML
 
-from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import BadRequest
 from django.db.models import Q, Count, F
 from django.db.models.functions import TruncMonth, TruncDay
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse, QueryDict
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 
 from applications.usuarios.utils import role_required
 from applications.usuarios.models import Usuario
 from applications.core.models import (
-    Estudiante, Curso, Sede, Deporte, Planificacion,
-    AsistenciaCurso, AsistenciaCursoDetalle
+    Estudiante, Curso, CursoHorario, Sede, Deporte, Planificacion,
+    AsistenciaCurso, AsistenciaCursoDetalle, TrabajoReporte
+)
+from applications.core.kpi_cache import firma_kpi, kpi_cacheado, obsoletos_servidos
+from applications.core.kpi_diario import kpi_diario_qs, kpi_mensual_qs
+from applications.core import cohortes, kpi_agregados, kpi_cubo, ocupacion, reportes_jobs
+from applications.core.exports import pdf_export
+from applications.core.exports.excel_export import (
+    detalle_qs, filas_detalle, hoja_detalle, hoja_df, hoja_dicts, respuesta_csv, respuesta_xlsx,
+    DETALLE_COLUMNAS,
+)
+from applications.core.kpi_engine import (
+    calcular_kpis, q_dimensiones, TARJETAS_GENERAL, TARJETAS_PERIODO,
 )
 
 ASIS_P, ASIS_A, ASIS_J = "P", "A", "J"
@@ -2033,12 +2101,19 @@ def _first_existing_field(model_cls, candidates):
             return c
     return None
 
-def _week_range(semana_str: str):
-
+def _fecha_param(valor: str):
+    """Fecha AAAA-MM-DD del querystring; None si falta o no se entiende. Fuera de ANIOS_VALIDOS es un 400."""
     try:
-        base = date.fromisoformat(semana_str) if semana_str else timezone.localdate()
+        fecha = date.fromisoformat(valor) if valor else None
     except ValueError:
-        base = timezone.localdate()
+        return None
+    if fecha is not None and fecha.year not in ANIOS_VALIDOS:
+        raise BadRequest(f"Fecha inválida: {valor}")
+    return fecha
+
+def _week_range(semana_str: str):
+
+    base = _fecha_param(semana_str) or timezone.localdate()
     lunes = base - timedelta(days=base.weekday())  # 0=lunes
     domingo = lunes + timedelta(days=6)
     return lunes, domingo
@@ -2053,9 +2128,32 @@ def _month_range(mes_str: str):
             y, m = map(int, mes_str.split("-"))
         except Exception:
             y, m = today.year, today.month
+    if not (1 <= m <= 12 and y in ANIOS_VALIDOS):
+        raise BadRequest(f"Mes inválido: {mes_str}")
     last_day = monthrange(y, m)[1]
     return date(y, m, 1), date(y, m, last_day), y, m
 
+def _rango(desde_str: str, hasta_str: str, ventana_str: str = ""):
+    """
+    Rango libre [desde, hasta]. Con `ventana` (7/30/90) son los últimos N días
+    hasta `hasta` (hoy por defecto). Sin nada, los últimos 30 días.
+    """
+    hasta = _fecha_param(hasta_str) or timezone.localdate()
+    try:
+        ventana = int(ventana_str) if ventana_str else None
+    except ValueError:
+        ventana = None
+    if ventana not in VENTANAS_KPI:
+        ventana = None
+    desde = _fecha_param(desde_str) if not ventana else None
+    if desde is None:
+        desde = hasta - timedelta(days=(ventana or 30) - 1)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    # acotado: la serie diaria es O(días)
+    desde = max(desde, hasta - timedelta(days=MAX_DIAS_RANGO - 1))
+    return desde, hasta, ventana
+
 def _year_range(anio_str: str):
 
     today = timezone.localdate()
@@ -2063,6 +2161,8 @@ def _year_range(anio_str: str):
         y = int(anio_str) if anio_str else today.year
     except Exception:
         y = today.year
+    if y not in ANIOS_VALIDOS:
+        raise BadRequest(f"Año inválido: {anio_str}")
     return date(y, 1, 1), date(y, 12, 31), y
 
 def _serie_meses_completos(inicio: date, fin: date):
@@ -2077,535 +2177,698 @@ def _serie_meses_completos(inicio: date, fin: date):
             m, y = 1, y + 1
     return items
 
-def _aplicar_filtros_basicos(est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs,
-                             programa: str, sede_id: str, dep_id: str):
-    if programa:
-        est_qs      = _sf(est_qs,      curso__programa__icontains=programa)
-        curso_qs    = _sf(curso_qs,    programa__icontains=programa)
-        plan_qs     = _sf(plan_qs,     curso__programa__icontains=programa)
-        asis_qs     = _sf(asis_qs,     curso__programa__icontains=programa)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__programa__icontains=programa)
-    if sede_id:
-        est_qs      = _sf(est_qs,      curso__sede_id=sede_id)
-        curso_qs    = _sf(curso_qs,    sede_id=sede_id)
-        plan_qs     = _sf(plan_qs,     curso__sede_id=sede_id)
-        asis_qs     = _sf(asis_qs,     curso__sede_id=sede_id)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__sede_id=sede_id)
-    if dep_id:
-        est_qs      = _sf(est_qs,      curso__disciplina_id=dep_id)
-        curso_qs    = _sf(curso_qs,    disciplina_id=dep_id)
-        plan_qs     = _sf(plan_qs,     curso__disciplina_id=dep_id)
-        asis_qs     = _sf(asis_qs,     curso__disciplina_id=dep_id)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__disciplina_id=dep_id)
-    return est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs
-
-# Serializador JSON seguro para pasar listas/dicts al template
-def _j(x):
-    return json.dumps(x, ensure_ascii=False, cls=DjangoJSONEncoder)
-
+def _estudiantes_filtrados(programa: str, sede_id: str, dep_id: str):
+    return Estudiante.objects.filter(q_dimensiones("estudiantes", programa, sede_id, dep_id))
+
+KPI_MODOS = ("general", "semanal", "mensual", "anual", "rango")
+VENTANAS_KPI = (7, 30, 90)   # ventanas móviles (días) de todos los tableros
+MAX_DIAS_RANGO = 366 * 3
+ANIOS_INTERANUAL = 5      # años que compara el tablero anual (incluye el elegido)
+MAX_ANIOS_INTERANUAL = 10
+ANIOS_VALIDOS = range(1900, 2101)   # mes/año/fechas pedidos; fuera de esto es un 400
+
+
+def _kpi_params(request, modo):
+    """Filtros y periodo de un tablero KPI a partir del querystring."""
+    p = {
+        "modo": modo,
+        "programa": (request.GET.get("programa") or "").strip(),
+        "sede_id": request.GET.get("sede") or "",
+        "dep_id": request.GET.get("disciplina") or "",
+        "inicio": None, "fin": None,
+        "semana": "", "rango_str": "", "mes": "", "anio": "", "desde": "", "hasta": "", "ventana": None,
+        "anio_actual": timezone.now().year,
+        "dbg": request.GET.get("__dbg") == "1",
+    }
+    if modo == "semanal":
+        lunes, domingo = _week_range(request.GET.get("semana") or "")
+        p.update(inicio=lunes, fin=domingo, semana=lunes.isoformat(),
+                 rango_str=f"{lunes:%d-%m-%Y} al {domingo:%d-%m-%Y}")
+    elif modo == "mensual":
+        inicio, fin, y, m = _month_range(request.GET.get("mes") or "")
+        p.update(inicio=inicio, fin=fin, mes=f"{inicio:%Y-%m}", anio_actual=y)
+    elif modo == "anual":
+        inicio, fin, y = _year_range(request.GET.get("anio") or "")
+        try:
+            anios = int(request.GET.get("anios") or ANIOS_INTERANUAL)
+        except ValueError:
+            anios = ANIOS_INTERANUAL
+        anios = min(max(anios, 2), MAX_ANIOS_INTERANUAL)
+        p.update(inicio=inicio, fin=fin, anio=f"{y}", anio_actual=y, anios=anios,
+                 inicio_hist=date(y - anios + 1, 1, 1))
+    elif modo == "rango":
+        desde, hasta, ventana = _rango(request.GET.get("desde") or "", request.GET.get("hasta") or "",
+                                       request.GET.get("ventana") or "")
+        p.update(inicio=desde, fin=hasta, desde=desde.isoformat(), hasta=hasta.isoformat(), ventana=ventana,
+                 rango_str=f"{desde:%d-%m-%Y} al {hasta:%d-%m-%Y}", anio_actual=hasta.year)
+    # el tablero general muestra los últimos 12 meses: cambia con el mes en curso
+    p["periodo"] = p["inicio"].isoformat() if p["inicio"] else timezone.localdate().strftime("%Y-%m")
+    if p.get("anios"):
+        p["periodo"] += f":{p['anios']}"
+    if modo == "rango":
+        p["periodo"] += f":{p['hasta']}"
+    # primer día que lee algún panel: años comparados (anual) y ventanas móviles
+    if p["fin"]:
+        fin_ventanas = min(p["fin"], timezone.localdate())
+        inicio_ventanas = fin_ventanas - timedelta(days=2 * max(VENTANAS_KPI) - 1)
+        p["inicio_datos"] = min(p.get("inicio_hist") or p["inicio"], inicio_ventanas)
+    return p
+
+
+def _kpi_panel(p, nombre, calcular):
+    if p["dbg"]:
+        datos = calcular(p)
+        print(f"[KPI][{p['modo'].upper()}] {nombre}:", datos)
+        return datos
+    # la firma cubre todo lo que leen los paneles (años comparados, ventanas móviles)
+    return kpi_cacheado(
+        f"{p['modo']}:{nombre}", p["programa"], p["sede_id"], p["dep_id"], p["periodo"],
+        lambda: calcular(p), p.get("inicio_datos") or p["inicio"], p["fin"],
+    )
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-@require_http_methods(["GET"])
-def dashboard_kpi(request):
-    programa = (request.GET.get("programa") or "").strip()
-    sede_id  = request.GET.get("sede") or ""
-    dep_id   = request.GET.get("disciplina") or ""
-    anio_actual = timezone.now().year
-    __dbg = request.GET.get("__dbg") == "1"
 
-    est_fecha_field = _first_existing_field(Estudiante, [
-        "creado","fecha_creacion","created_at","created","fecha_registro","fecha","inscrito_en","registrado_en"
-    ]) or "id"
+def _kpi_alerta(p):
+    # Solo el tablero general cae a "sin filtros" cuando los filtros dejan todo en cero
+    if p["modo"] != "general":
+        return False
+    datos = _kpi_panel(p, "alerta", lambda p: {
+        "alerta_filtros": calcular_kpis(("total_estudiantes",), p["programa"], p["sede_id"], p["dep_id"], respaldo=True)[1]
+    })
+    return datos["alerta_filtros"]
+
+
+def _kpi_filtros(p, alerta):
+    return ("", "", "") if alerta else (p["programa"], p["sede_id"], p["dep_id"])
+
+
+def _panel_tarjetas(p):
+    modo, inicio, fin = p["modo"], p["inicio"], p["fin"]
+    if modo == "general":
+        cards, alerta = calcular_kpis(TARJETAS_GENERAL, p["programa"], p["sede_id"], p["dep_id"], respaldo=True)
+        kpi_cards = [
+            {"label":"Total estudiantes","value":cards["total_estudiantes"],"icon":"fa-users","color":"#0ea5e9"},
+            {"label":"Activos","value":cards["activos"],"icon":"fa-user-check","color":"#10b981"},
+            {"label":"Cursos","value":cards["total_cursos"],"icon":"fa-book","color":"#84cc16"},
+            {"label":"Cumpl. planificación","value":f'{cards["cumpl_plan"]}%',"icon":"fa-clipboard-check","color":"#f59e0b"},
+            {"label":f"Uso recintos ({ocupacion.VENTANA_SEMANAS} sem.)","value":f'{cards["uso_recintos"]}%',"icon":"fa-building","color":"#a855f7"},
+            {"label":"Tasa asistencia","value":f'{cards["tasa_asist"]}%',"icon":"fa-calendar-check","color":"#06b6d4"},
+            {"label":"Tasa inasistencia","value":f'{cards["tasa_inasist"]}%',"icon":"fa-calendar-xmark","color":"#ef4444"},
+            {"label":"Ratio est./prof.","value":cards["ratio_ep"],"icon":"fa-scale-balanced","color":"#6366f1"},
+        ]
+        return {"kpi_cards": kpi_cards, "alerta_filtros": alerta}
+
+    t, _ = calcular_kpis(TARJETAS_PERIODO, p["programa"], p["sede_id"], p["dep_id"], inicio, fin)
+    if modo == "semanal":
+        cabecera = [
+            {"label": f"Semana {inicio:%d-%m} a {fin:%d-%m}", "value": "", "icon": "fa-calendar-week", "color": "#0ea5e9"},
+            {"label": "Nuevos (semana)", "value": t["nuevos"], "icon": "fa-user-plus", "color": "#84cc16"},
+        ]
+    elif modo == "mensual":
+        cabecera = [
+            {"label": f"Mes {inicio:%B %Y}", "value": "", "icon": "fa-calendar-days", "color": "#0ea5e9"},
+            {"label": "Nuevos (mes)", "value": t["nuevos"], "icon": "fa-user-plus", "color": "#84cc16"},
+        ]
+    elif modo == "rango":
+        cabecera = [
+            {"label": f"Del {inicio:%d-%m-%Y} al {fin:%d-%m-%Y}", "value": "", "icon": "fa-calendar-days", "color": "#0ea5e9"},
+            {"label": "Nuevos (rango)", "value": t["nuevos"], "icon": "fa-user-plus", "color": "#84cc16"},
+        ]
+    else:
+        cabecera = [
+            {"label": f"Año {p['anio']}", "value": "", "icon": "fa-calendar", "color": "#0ea5e9"},
+        ]
+    kpi_cards = cabecera + [
+        {"label": "Clases registradas", "value": t["clases_total"], "icon": "fa-calendar", "color": "#3b82f6"},
+        {"label": "Cumpl. planificación", "value": f'{t["cumpl_plan"]}%', "icon": "fa-clipboard-check", "color": "#f59e0b"},
+        {"label": f"Uso recintos ({ocupacion.VENTANA_SEMANAS} sem.)", "value": f'{t["uso_recintos"]}%', "icon": "fa-building", "color": "#a855f7"},
+    ]
+    return {"kpi_cards": kpi_cards, "alerta_filtros": False}
 
-    asis_fecha_field = _first_existing_field(AsistenciaCurso, [
-        "fecha","creado","fecha_creacion","created_at","created"
-    ]) or "fecha"
 
-    # QS base (con filtros)
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.select_related("sede","profesor","disciplina")
-    plan_qs  = Planificacion.objects.select_related("curso","curso__sede","curso__profesor","curso__disciplina")
-    asis_qs  = AsistenciaCurso.objects.select_related("curso","curso__sede","curso__disciplina")
-    asis_det_qs = AsistenciaCursoDetalle.objects.select_related("asistencia","asistencia__curso")
+def _panel_serie_mensual(p):
+    alerta = _kpi_alerta(p)
+    programa, sede_id, dep_id = _kpi_filtros(p, alerta)
+    datos = {"est_labels": [], "est_series": [], "cla_labels": [], "cla_series": [], "alerta_filtros": alerta}
 
-    # Filtros
-    if programa:
-        est_qs      = _sf(est_qs,      curso__programa__icontains=programa)
-        curso_qs    = _sf(curso_qs,    programa__icontains=programa)
-        plan_qs     = _sf(plan_qs,     curso__programa__icontains=programa)
-        asis_qs     = _sf(asis_qs,     curso__programa__icontains=programa)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__programa__icontains=programa)
-    if sede_id:
-        est_qs      = _sf(est_qs,      curso__sede_id=sede_id)
-        curso_qs    = _sf(curso_qs,    sede_id=sede_id)
-        plan_qs     = _sf(plan_qs,     curso__sede_id=sede_id)
-        asis_qs     = _sf(asis_qs,     curso__sede_id=sede_id)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__sede_id=sede_id)
-    if dep_id:
-        est_qs      = _sf(est_qs,      curso__disciplina_id=dep_id)
-        curso_qs    = _sf(curso_qs,    disciplina_id=dep_id)
-        plan_qs     = _sf(plan_qs,     curso__disciplina_id=dep_id)
-        asis_qs     = _sf(asis_qs,     curso__disciplina_id=dep_id)
-        asis_det_qs = _sf(asis_det_qs, asistencia__curso__disciplina_id=dep_id)
-
-    # ---- MÉTRICAS CON FILTROS
-    def _metricas(_est, _curso, _plan, _asis, _det):
-        total_estudiantes = _est.count()
-        activos           = _sf(_est, activo=True).count()
-        total_profesores  = Usuario.objects.filter(tipo_usuario=Usuario.Tipo.PROF).count()
-        total_cursos      = _curso.count()
-
-        total_plan = _plan.count()
-        plan_publicas = _sf(_plan, publica=True).count()
-        cumplimiento_planificacion = round((plan_publicas/total_plan)*100, 1) if total_plan else 0.0
-
-        clases_total    = _asis.count()
-        clases_cerradas = _sf(_asis, estado=getattr(AsistenciaCurso.Estado, "CERR", "CERR")).count() if hasattr(AsistenciaCurso, "Estado") else 0
-        uso_recintos    = round((clases_cerradas/clases_total)*100, 1) if clases_total else 0.0
-
-        detalles_total = _det.count()
-        presentes      = _sf(_det, estado="P").count()
-        ausentes       = _sf(_det, estado="A").count()
-        justificadas   = _sf(_det, estado="J").count()
-        tasa_asistencia   = round((presentes/detalles_total)*100, 1) if detalles_total else 0.0
-        tasa_inasistencia = round(((ausentes+justificadas)/detalles_total)*100, 1) if detalles_total else 0.0
-        ratio_est_prof    = round((total_estudiantes/total_profesores), 1) if total_profesores else 0.0
-
-        # Series 12 meses
+    if p["modo"] == "general":
         hoy = timezone.localdate()
         inicio_12 = (hoy.replace(day=1) - timedelta(days=365)).replace(day=1)
-        fin_12    = hoy.replace(day=1)
-        meses = []
-        y, m = inicio_12.year, inicio_12.month
-        while True:
-            meses.append(date(y, m, 1))
-            if y == fin_12.year and m == fin_12.month:
-                break
-            m += 1
-            if m == 13: m, y = 1, y+1
+        meses = _serie_meses_completos(inicio_12, hoy.replace(day=1))
 
+        est_fecha_field = _first_existing_field(Estudiante, [
+            "creado","fecha_creacion","created_at","created","fecha_registro","fecha","inscrito_en","registrado_en"
+        ])
         est_map = {}
-        if est_fecha_field != "id":
-            est_mes = (_est.annotate(m=TruncMonth(est_fecha_field))
-                           .values("m").annotate(total=Count("id")))
-            est_map = { (r["m"].date() if isinstance(r["m"], datetime) else r["m"]) : r["total"] for r in est_mes }
-
-        cla_mes = (_asis.annotate(m=TruncMonth(asis_fecha_field))
-                        .values("m").annotate(total=Count("id")))
-        cla_map = { (r["m"].date() if isinstance(r["m"], datetime) else r["m"]) : r["total"] for r in cla_mes }
-
-        est_labels = [m_.strftime("%b %Y") for m_ in meses]
-        est_series = [est_map.get(m_, 0) for m_ in meses]
-        cla_labels = [m_.strftime("%b %Y") for m_ in meses]
-        cla_series = [cla_map.get(m_, 0) for m_ in meses]
-
-        # Top inasistencia
-        top_rows = (_det.values("asistencia__curso__id","asistencia__curso__nombre")
-                        .annotate(total=Count("id"),
-                                  ina=Count("id", filter=Q(estado__in=["A","J"]))))
-
-        top_inas = []
-        for r in top_rows:
-            t = r["total"] or 0
-            pct = round((r["ina"]/t)*100, 1) if t else 0.0
-            top_inas.append({
-                "curso_id": r["asistencia__curso__id"],
-                "curso": r["asistencia__curso__nombre"],
-                "pct": pct, "total": t
-            })
-        top_inas = sorted(top_inas, key=lambda x: x["pct"], reverse=True)[:5]
-
+        if est_fecha_field:
+            est_mes = (_estudiantes_filtrados(programa, sede_id, dep_id)
+                       .annotate(m=TruncMonth(est_fecha_field)).values("m").annotate(total=Count("id")))
+            est_map = {_to_date(r["m"]): r["total"] for r in est_mes}
+        datos["est_labels"] = [m.strftime("%b %Y") for m in meses]
+        datos["est_series"] = [est_map.get(m, 0) for m in meses]
+        qs = kpi_mensual_qs(programa, sede_id, dep_id, inicio_12)
+    elif p["modo"] == "anual":
+        meses = _serie_meses_completos(p["inicio"], p["fin"])
+        qs = kpi_mensual_qs(programa, sede_id, dep_id, p["inicio"], p["fin"])
+    else:
+        return datos
+
+    datos["cla_labels"] = [m.strftime("%b %Y") for m in meses]
+    datos["cla_series"] = kpi_agregados.serie_mensual(qs, meses)
+    return datos
+
+
+def _panel_serie_diaria(p):
+    datos = {"dia_labels": [], "dia_series": [], "tasa_movil": [], "alerta_filtros": False}
+    if p["modo"] not in ("semanal", "mensual", "rango"):
+        return datos
+    inicio, fin = p["inicio"], p["fin"]
+    formato = "%a %d-%m" if p["modo"] == "semanal" else "%d-%b" if p["modo"] == "mensual" else "%d-%m-%y"
+
+    dias = [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+    qs = kpi_diario_qs(p["programa"], p["sede_id"], p["dep_id"])
+    datos["dia_labels"] = [d.strftime(formato) for d in dias]
+    datos["dia_series"] = kpi_agregados.serie_diaria(qs.filter(fecha__range=(inicio, fin)), dias)
+    datos["tasa_movil"] = kpi_agregados.tasa_asistencia_movil(qs, dias, 7)
+    return datos
+
+
+def _panel_distribucion(p):
+    alerta = _kpi_alerta(p)
+    d, _ = calcular_kpis(("presentes", "ausentes", "justificadas"),
+                         *_kpi_filtros(p, alerta), p["inicio"], p["fin"])
+    return {"presente": d["presentes"], "ausente": d["ausentes"], "justificada": d["justificadas"],
+            "alerta_filtros": alerta}
+
+
+def _panel_top(p):
+    alerta = _kpi_alerta(p)
+    programa, sede_id, dep_id = _kpi_filtros(p, alerta)
+    # semana y rango no cubren meses completos; el resto sale del resumen mensual
+    hechos = kpi_diario_qs if p["modo"] in ("semanal", "rango") else kpi_mensual_qs
+    qs = hechos(programa, sede_id, dep_id, p["inicio"], p["fin"])
+    datos = {"top_inasistencia": kpi_agregados.top_inasistencia(qs, 5), "top_prof_bajo_cumpl": [], "alerta_filtros": alerta}
+    if p["modo"] == "general":
         # Profes con menor % de cierre
-        prof_rows = (_asis.values("curso__profesor__first_name","curso__profesor__last_name")
-                          .annotate(total=Count("id"),
-                                    cerr=Count("id", filter=Q(estado=getattr(AsistenciaCurso.Estado,"CERR","CERR"))))
-                          .filter(total__gt=0))
-        prof_bad = []
-        for r in prof_rows:
-            t = r["total"] or 0
-            pct = round((r["cerr"]/t)*100, 1) if t else 0.0
-            name = f'{r["curso__profesor__first_name"]} {r["curso__profesor__last_name"]}'.strip() or "—"
-            prof_bad.append({"prof": name, "pct": pct, "total": t})
-        prof_bad = sorted(prof_bad, key=lambda x: x["pct"])[:10]
-
-        return {
-            "totales": (total_estudiantes, total_cursos, clases_total, detalles_total),
-            "cards": {
-                "total_estudiantes": total_estudiantes,
-                "activos": activos,
-                "total_cursos": total_cursos,
-                "cumpl_plan": cumplimiento_planificacion,
-                "uso_recintos": uso_recintos,
-                "tasa_asist": tasa_asistencia,
-                "tasa_inasist": tasa_inasistencia,
-                "ratio_ep": ratio_est_prof,
-            },
-            "series": (est_labels, est_series, cla_labels, cla_series),
-            "dist": (presentes, ausentes, justificadas),
-            "tops": (top_inas, prof_bad),
-        }
+        datos["top_prof_bajo_cumpl"] = kpi_agregados.top_prof_bajo_cumpl(qs, 10)
+    return datos
+
+
+def _panel_interanual(p):
+    datos = {"anios": [], "resumen": [], "mes_labels": [], "series": {}, "alerta_filtros": False}
+    if p["modo"] != "anual":
+        return datos
+    anios = list(range(p["inicio_hist"].year, p["fin"].year + 1))
+    qs = kpi_mensual_qs(p["programa"], p["sede_id"], p["dep_id"], p["inicio_hist"], p["fin"])
+    datos.update(
+        anios=anios,
+        resumen=kpi_agregados.resumen_interanual(qs, anios),
+        mes_labels=[date(2000, m, 1).strftime("%b") for m in range(1, 13)],
+        series=kpi_agregados.serie_por_anio(qs, anios),
+    )
+    return datos
 
-    M = _metricas(est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs)
-    total_estudiantes, total_cursos, clases_total, detalles_total = M["totales"]
-
-
-    alerta_filtros = False
-    if (total_estudiantes == 0 and clases_total == 0 and detalles_total == 0):
-        est_all, curso_all = Estudiante.objects.all(), Curso.objects.all()
-        plan_all = Planificacion.objects.all()
-        asis_all = AsistenciaCurso.objects.all()
-        det_all  = AsistenciaCursoDetalle.objects.all()
-        M2 = _metricas(est_all, curso_all, plan_all, asis_all, det_all)
-        if any(M2["totales"]):
-            M = M2
-            alerta_filtros = True
-
-    (est_labels, est_series, cla_labels, cla_series) = M["series"]
-    (presentes, ausentes, justificadas) = M["dist"]
-    (top_inasistencia, top_prof_bajo_cumpl) = M["tops"]
-
-    cards = M["cards"]
-    kpi_cards = [
-        {"label":"Total estudiantes","value":cards["total_estudiantes"],"icon":"fa-users","color":"#0ea5e9"},
-        {"label":"Activos","value":cards["activos"],"icon":"fa-user-check","color":"#10b981"},
-        {"label":"Cursos","value":cards["total_cursos"],"icon":"fa-book","color":"#84cc16"},
-        {"label":"Cumpl. planificación","value":f'{cards["cumpl_plan"]}%',"icon":"fa-clipboard-check","color":"#f59e0b"},
-        {"label":"Uso recintos (proxy)","value":f'{cards["uso_recintos"]}%',"icon":"fa-building","color":"#a855f7"},
-        {"label":"Tasa asistencia","value":f'{cards["tasa_asist"]}%',"icon":"fa-calendar-check","color":"#06b6d4"},
-        {"label":"Tasa inasistencia","value":f'{cards["tasa_inasist"]}%',"icon":"fa-calendar-xmark","color":"#ef4444"},
-        {"label":"Ratio est./prof.","value":cards["ratio_ep"],"icon":"fa-scale-balanced","color":"#6366f1"},
-    ]
 
-    if __dbg:
-        print("[KPI][GENERAL] filtros => programa:", programa, "sede:", sede_id, "dep:", dep_id)
-        print("[KPI][GENERAL] totales (con/fallback):", M["totales"], "| alerta_filtros:", alerta_filtros)
-        print("[KPI][GENERAL] est_series:", len(est_series), "cla_series:", len(cla_series))
-        print("[KPI][GENERAL] P/A/J:", presentes, ausentes, justificadas)
+def _ventanas_kpi(programa, sede_id, dep_id, fin):
+    """Últimos 7/30/90 días hasta `fin` (y su periodo anterior), sobre los hechos diarios."""
+    return kpi_agregados.ventanas_moviles(kpi_diario_qs(programa, sede_id, dep_id), fin, VENTANAS_KPI)
 
-    ctx = {
-        "modo":"general",
-        "programa": programa, "sede_id": str(sede_id), "dep_id": str(dep_id),
-        "sedes": Sede.objects.order_by("nombre"),
-        "disciplinas": Deporte.objects.order_by("nombre"),
-        "anio_actual": anio_actual,
-        "kpi_cards": kpi_cards,
+
+def _panel_ventanas(p):
+    # periodos en curso (y el tablero general) terminan hoy
+    fin = min(p["fin"] or timezone.localdate(), timezone.localdate())
+    return {"fin": fin, "ventanas": _ventanas_kpi(p["programa"], p["sede_id"], p["dep_id"], fin),
+            "alerta_filtros": False}
 
 
-        "est_labels": _j(est_labels), "est_series": _j(est_series),
-        "cla_labels": _j(cla_labels), "cla_series": _j(cla_series),
+KPI_PANELES = {
+    "tarjetas": _panel_tarjetas,
+    "serie-mensual": _panel_serie_mensual,
+    "serie-diaria": _panel_serie_diaria,
+    "distribucion": _panel_distribucion,
+    "top": _panel_top,
+    "interanual": _panel_interanual,
+    "ventanas": _panel_ventanas,
+}
 
-        "dist_presente": presentes, "dist_ausente": ausentes, "dist_justificada": justificadas,
-        "top_inasistencia": top_inasistencia,
-        "top_prof_bajo_cumpl": top_prof_bajo_cumpl,
 
+def _kpi_datos(p):
+    """Todos los paneles de un tablero (para el PDF y las exportaciones)."""
+    return {nombre: _kpi_panel(p, nombre, calcular) for nombre, calcular in KPI_PANELES.items()}
 
-        "dia_labels": _j([]), "dia_series": _j([]),
 
-        "semana":"", "rango_str":"", "mes":"", "anio":"",
-        "alerta_filtros": alerta_filtros,
+def _dashboard_kpi_respuesta(request, modo):
+    """Esqueleto del tablero: cada panel se carga desde la API (kpi_api)."""
+    p = _kpi_params(request, modo)
+    ctx = {
+        "modo": modo,
+        "programa": p["programa"], "sede_id": str(p["sede_id"]), "dep_id": str(p["dep_id"]),
+        "sedes": Sede.objects.order_by("nombre"),
+        "disciplinas": Deporte.objects.order_by("nombre"),
+        "anio_actual": p["anio_actual"],
+        "semana": p["semana"], "rango_str": p["rango_str"], "mes": p["mes"], "anio": p["anio"],
+        "anios": p.get("anios", ANIOS_INTERANUAL), "max_anios": MAX_ANIOS_INTERANUAL,
+        "desde": p["desde"], "hasta": p["hasta"], "ventana": p["ventana"], "ventanas_kpi": VENTANAS_KPI,
+        "kpi_cards": [], "alerta_filtros": False,
+        "kpi_api_qs": request.GET.urlencode(),
+        "cubo_qs": _cubo_qs(p),
     }
     return render(request, "core/dashboard_kpi.html", ctx)
 
+
+def _cubo_qs(p):
+    """Querystring del drill-down con el periodo (en meses) y los filtros del tablero."""
+    qs = QueryDict(mutable=True)
+    if p["inicio"]:
+        qs.update({"desde": f"{p['inicio']:%Y-%m}", "hasta": f"{p['fin']:%Y-%m}"})
+    for clave, valor in (("programa", p["programa"].upper()), ("sede", p["sede_id"]), ("disciplina", p["dep_id"])):
+        if valor:
+            qs[clave] = valor
+    return qs.urlencode()
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def dashboard_kpi(request):
+    return _dashboard_kpi_respuesta(request, "general")
+
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
 @require_http_methods(["GET"])
 def dashboard_kpi_semana(request):
-    programa   = (request.GET.get("programa") or "").strip()
-    sede_id    = request.GET.get("sede") or ""
-    dep_id     = request.GET.get("disciplina") or ""
-    semana_str = request.GET.get("semana") or ""
-    lunes, domingo = _week_range(semana_str)
-    anio_actual = timezone.now().year
-    __dbg = request.GET.get("__dbg") == "1"
-
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.select_related("sede", "profesor", "disciplina")
-    plan_qs  = Planificacion.objects.select_related("curso", "curso__sede", "curso__profesor", "curso__disciplina")\
-                                    .filter(semana__range=(lunes, domingo))
-    asis_qs  = AsistenciaCurso.objects.select_related("curso", "curso__sede", "curso__disciplina")\
-                                      .filter(fecha__range=(lunes, domingo))
-    asis_det_qs = AsistenciaCursoDetalle.objects.select_related("asistencia", "asistencia__curso")\
-                                               .filter(asistencia__fecha__range=(lunes, domingo))
-
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
-    )
+    return _dashboard_kpi_respuesta(request, "semanal")
 
-    nuevos_semana = _sf(est_qs, creado__range=(lunes, domingo)).count()
 
-    clases_total    = asis_qs.count()
-    clases_cerradas = _sf(asis_qs, estado=getattr(AsistenciaCurso.Estado, "CERR", "CERR")).count() if hasattr(AsistenciaCurso, "Estado") else 0
-    uso_recintos    = round((clases_cerradas/clases_total)*100, 1) if clases_total else 0.0
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def dashboard_kpi_mes(request):
+    return _dashboard_kpi_respuesta(request, "mensual")
 
-    presentes    = _sf(asis_det_qs, estado=ASIS_P).count()
-    ausentes     = _sf(asis_det_qs, estado=ASIS_A).count()
-    justificadas = _sf(asis_det_qs, estado=ASIS_J).count()
 
-    dias = [lunes + timedelta(days=i) for i in range(7)]
-    dia_labels = [d.strftime("%a %d-%m") for d in dias]
-    serie_diaria = (asis_qs.annotate(d=TruncDay("fecha")).values("d").annotate(total=Count("id")))
-    mapa = {_to_date(r["d"]): r["total"] for r in serie_diaria}
-    dia_series = [mapa.get(d, 0) for d in dias]
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def dashboard_kpi_anio(request):
+    return _dashboard_kpi_respuesta(request, "anual")
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def dashboard_kpi_rango(request):
+    return _dashboard_kpi_respuesta(request, "rango")
 
-    top_rows = (asis_det_qs.values("asistencia__curso__id", "asistencia__curso__nombre")
-                .annotate(total=Count("id"),
-                          ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    tmp = []
-    for r in top_rows:
-        total = r["total"] or 0
-        pct = round((r["ina"]/total)*100, 1) if total else 0.0
-        tmp.append({"curso_id": r["asistencia__curso__id"], "curso": r["asistencia__curso__nombre"], "pct": pct, "total": total})
-    top_inasistencia = sorted(tmp, key=lambda x: x["pct"], reverse=True)[:5]
 
-    total_plan = plan_qs.count()
-    plan_publicas = _sf(plan_qs, publica=True).count()
-    cumplimiento_planificacion = round((plan_publicas/total_plan)*100, 1) if total_plan else 0.0
+# ----------------- Cohortes de ingreso (retención) -----------------
+COHORTES_POR_DEFECTO = 12
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def reportes_cohortes(request):
+    programa = (request.GET.get("programa") or "").strip()
+    sede_id  = request.GET.get("sede") or ""
+    hasta, _, _, _ = _month_range(request.GET.get("hasta") or "")
+    if request.GET.get("desde"):
+        desde, _, _, _ = _month_range(request.GET["desde"])
+    else:
+        n = hasta.year * 12 + hasta.month - COHORTES_POR_DEFECTO  # 12 cohortes hasta `hasta`
+        desde = date(n // 12, n % 12 + 1, 1)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+
+    filas = cohortes.retencion(sede_id, programa, desde, hasta)
+    n_meses = max((len(f["pct"]) for f in filas), default=0)
+    for f in filas:
+        # opacidad del fondo proporcional al % (mapa de calor)
+        f["celdas"] = [{"pct": pct, "activos": a, "alfa": f"{pct / 100:.2f}"}
+                       for pct, a in zip(f["pct"], f["activos"])]
 
     ctx = {
-        "modo": "semanal",
-        "programa": programa, "sede_id": str(sede_id), "dep_id": str(dep_id),
+        "programa": programa, "sede_id": str(sede_id),
         "sedes": Sede.objects.order_by("nombre"),
-        "disciplinas": Deporte.objects.order_by("nombre"),
-        "semana": lunes.isoformat(),
-        "rango_str": f"{lunes:%d-%m-%Y} al {domingo:%d-%m-%Y}",
-        "anio_actual": anio_actual,
-        "kpi_cards": [
-            {"label": f"Semana {lunes:%d-%m} a {domingo:%d-%m}", "value": "", "icon": "fa-calendar-week", "color": "#0ea5e9"},
-            {"label": "Nuevos (semana)",  "value": nuevos_semana, "icon": "fa-user-plus", "color": "#84cc16"},
-            {"label": "Clases registradas","value": clases_total,  "icon": "fa-calendar", "color": "#3b82f6"},
-            {"label": "Cumpl. planificación", "value": f"{cumplimiento_planificacion}%", "icon": "fa-clipboard-check", "color": "#f59e0b"},
-            {"label": "Uso recintos (proxy)", "value": f"{uso_recintos}%", "icon": "fa-building", "color": "#a855f7"},
-        ],
-
-        # ✅ series en JSON
-        "dia_labels": _j(dia_labels), "dia_series": _j(dia_series),
-
-        "dist_presente": presentes, "dist_ausente": ausentes, "dist_justificada": justificadas,
-        "top_inasistencia": top_inasistencia,
-
-        # vacías para mantener la API del template
-        "est_labels": _j([]), "est_series": _j([]),
-        "cla_labels": _j([]), "cla_series": _j([]),
-
-        "top_prof_bajo_cumpl": [],
-        "mes": "", "anio": "",
+        "programas": Curso.Programa.choices,
+        "desde": f"{desde:%Y-%m}", "hasta": f"{hasta:%Y-%m}",
+        "filas": filas, "meses": range(n_meses),
     }
+    return render(request, "core/cohortes.html", ctx)
 
-    if __dbg:
-        print("[KPI][SEMANA] dias:", len(dia_labels), "serie:", len(dia_series),
-              "| P/A/J:", presentes, ausentes, justificadas)
 
-    return render(request, "core/dashboard_kpi.html", ctx)
+# ----------------- Ocupación de sedes (mapa de calor) -----------------
+def _sede_ocupacion(sede):
+    desde, hasta = ocupacion.ventana()
+    return {
+        "id": sede.id, "nombre": sede.nombre, "capacidad": sede.capacidad,
+        "uso_recintos": calcular_kpis(("uso_recintos",), sede_id=sede.id)[0]["uso_recintos"],
+        "bloque_min": ocupacion.BLOQUE_MIN, "semanas": ocupacion.VENTANA_SEMANAS,
+        "desde": desde, "hasta": hasta,
+        "filas": ocupacion.grilla(sede),
+    }
 
 
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
 @require_http_methods(["GET"])
-def dashboard_kpi_mes(request):
-    programa = (request.GET.get("programa") or "").strip()
-    sede_id  = request.GET.get("sede") or ""
-    dep_id   = request.GET.get("disciplina") or ""
-    mes_str  = request.GET.get("mes") or ""
-    inicio, fin, y, m = _month_range(mes_str)
-    anio_actual = y
-    __dbg = request.GET.get("__dbg") == "1"
-
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.select_related("sede", "profesor", "disciplina")
-    plan_qs  = Planificacion.objects.select_related("curso", "curso__sede", "curso__profesor", "curso__disciplina")\
-                                    .filter(semana__range=(inicio, fin))
-    asis_qs  = AsistenciaCurso.objects.select_related("curso", "curso__sede", "curso__disciplina")\
-                                      .filter(fecha__range=(inicio, fin))
-    asis_det_qs = AsistenciaCursoDetalle.objects.select_related("asistencia", "asistencia__curso")\
-                                               .filter(asistencia__fecha__range=(inicio, fin))
-
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
-    )
+def reportes_ocupacion(request):
+    sedes = Sede.objects.order_by("nombre")
+    sede_id = _sede_param(request)
+    sede = sedes.filter(pk=sede_id).first() if sede_id else None
+    sede = sede or sedes.filter(ocupacion__isnull=False).distinct().first() or sedes.first()
+    vista = "plan" if request.GET.get("vista") == "plan" else "real"
+
+    datos = _sede_ocupacion(sede) if sede else None
+    if datos:
+        # sin capacidad, el color es relativo al bloque más ocupado
+        campo = "cupos_plan" if vista == "plan" else "asistentes_real"
+        tope = sede.capacidad or max((c[campo] for f in datos["filas"] for c in f["celdas"]), default=0) or 1
+        for f in datos["filas"]:
+            for c in f["celdas"]:
+                c["valor"] = c[campo]
+                c["pct"] = c["pct_plan" if vista == "plan" else "pct_real"]
+                c["alfa"] = f"{min(c[campo] / tope, 1):.2f}"
+                c["sobre"] = bool(sede.capacidad) and c[campo] > sede.capacidad
 
-    nuevos_mes = _sf(est_qs, creado__range=(inicio, fin)).count()
+    ctx = {
+        "sedes": sedes, "sede": sede, "vista": vista, "datos": datos,
+        "dias": CursoHorario.Dia.labels,
+    }
+    return render(request, "core/ocupacion_sedes.html", ctx)
 
-    clases_total    = asis_qs.count()
-    clases_cerradas = _sf(asis_qs, estado=getattr(AsistenciaCurso.Estado, "CERR", "CERR")).count() if hasattr(AsistenciaCurso, "Estado") else 0
-    uso_recintos    = round((clases_cerradas/clases_total)*100, 1) if clases_total else 0.0
 
-    presentes    = _sf(asis_det_qs, estado=ASIS_P).count()
-    ausentes     = _sf(asis_det_qs, estado=ASIS_A).count()
-    justificadas = _sf(asis_det_qs, estado=ASIS_J).count()
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def reportes_ocupacion_api(request):
+    """Grilla de ocupación de una sede (?sede=) o de todas."""
+    sedes = Sede.objects.order_by("nombre")
+    sede_id = _sede_param(request)
+    if sede_id:
+        sede = get_object_or_404(Sede, pk=sede_id)
+        return JsonResponse(_sede_ocupacion(sede), json_dumps_params={"ensure_ascii": False})
+    return JsonResponse({"sedes": [_sede_ocupacion(s) for s in sedes]}, json_dumps_params={"ensure_ascii": False})
 
-    dias = [(inicio + timedelta(days=i)) for i in range((fin - inicio).days + 1)]
-    dia_labels = [d.strftime("%d-%b") for d in dias]
-    serie_diaria = (asis_qs.annotate(d=TruncDay("fecha")).values("d").annotate(total=Count("id")))
-    mapa = {_to_date(r["d"]): r["total"] for r in serie_diaria}
-    dia_series = [mapa.get(d, 0) for d in dias]
 
-    top_rows = (asis_det_qs.values("asistencia__curso__id", "asistencia__curso__nombre")
-                .annotate(total=Count("id"),
-                          ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    tmp = []
-    for r in top_rows:
-        total = r["total"] or 0
-        pct = round((r["ina"]/total)*100, 1) if total else 0.0
-        tmp.append({"curso_id": r["asistencia__curso__id"], "curso": r["asistencia__curso__nombre"], "pct": pct, "total": total})
-    top_inasistencia = sorted(tmp, key=lambda x: x["pct"], reverse=True)[:5]
+# ----------------- API JSON (paneles del tablero) -----------------
+def _kpi_api_params(request):
+    modo = request.GET.get("modo") or "general"
+    return _kpi_params(request, modo if modo in KPI_MODOS else "general")
 
-    total_plan = plan_qs.count()
-    plan_publicas = _sf(plan_qs, publica=True).count()
-    cumplimiento_planificacion = round((plan_publicas/total_plan)*100, 1) if total_plan else 0.0
 
-    ctx = {
-        "modo": "mensual",
-        "programa": programa, "sede_id": str(sede_id), "dep_id": str(dep_id),
-        "sedes": Sede.objects.order_by("nombre"),
-        "disciplinas": Deporte.objects.order_by("nombre"),
-        "anio_actual": anio_actual,
-        "kpi_cards": [
-            {"label": f"Mes {inicio:%B %Y}", "value": "", "icon": "fa-calendar-days", "color": "#0ea5e9"},
-            {"label": "Nuevos (mes)", "value": nuevos_mes, "icon": "fa-user-plus", "color": "#84cc16"},
-            {"label": "Clases registradas", "value": clases_total, "icon": "fa-calendar", "color": "#3b82f6"},
-            {"label": "Cumpl. planificación", "value": f"{cumplimiento_planificacion}%", "icon": "fa-clipboard-check", "color": "#f59e0b"},
-            {"label": "Uso recintos (proxy)", "value": f"{uso_recintos}%", "icon": "fa-building", "color": "#a855f7"},
-        ],
+def _kpi_api_version(request):
+    # etag_func y last_modified_func la piden por separado: se calcula una vez
+    if hasattr(request, "_kpi_version"):
+        return request._kpi_version
+    p = _kpi_api_params(request)
+    firma, marca = firma_kpi(p["sede_id"], p.get("inicio_datos") or p["inicio"], p["fin"])
+    if p["modo"] == "general":
+        # el respaldo "sin filtros" depende de todas las sedes
+        firma_todo, marca_todo = firma_kpi("", None, None)
+        firma, marca = f"{firma}.{firma_todo}", max(marca, marca_todo)
+    request._kpi_version = (f"{p['periodo']}.{firma}", marca)
+    return request._kpi_version
 
-        # ✅ series en JSON
-        "dia_labels": _j(dia_labels), "dia_series": _j(dia_series),
 
-        "dist_presente": presentes, "dist_ausente": ausentes, "dist_justificada": justificadas,
-        "top_inasistencia": top_inasistencia,
+def _kpi_api_etag(request, panel):
+    return _kpi_api_version(request)[0]
 
-        # vacías para mantener la API del template
-        "est_labels": _j([]), "est_series": _j([]),
-        "cla_labels": _j([]), "cla_series": _j([]),
 
-        "top_prof_bajo_cumpl": [],
-        "semana": "", "rango_str": "", "mes": f"{inicio:%Y-%m}", "anio": "",
-    }
+def _kpi_api_last_modified(request, panel):
+    marca = _kpi_api_version(request)[1]
+    return datetime.fromtimestamp(marca, tz=timezone.get_current_timezone()) if marca else None
 
-    if __dbg:
-        print("[KPI][MES] dias:", len(dia_labels), "serie:", len(dia_series),
-              "| P/A/J:", presentes, ausentes, justificadas)
 
-    return render(request, "core/dashboard_kpi.html", ctx)
+def _sin_validadores_si_obsoleto(vista):
+    """
+    El ETag/Last-Modified de @condition sale de la firma actual; si la
+    respuesta usó un resultado obsoleto (otro worker lo está recalculando)
+    se envía sin validadores, para que el cliente no lo revalide con 304.
+    """
+    @wraps(vista)
+    def envuelta(request, *args, **kwargs):
+        antes = obsoletos_servidos()
+        respuesta = vista(request, *args, **kwargs)
+        if obsoletos_servidos() != antes:
+            del respuesta["ETag"]
+            del respuesta["Last-Modified"]
+        return respuesta
+    return envuelta
 
 
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
 @require_http_methods(["GET"])
-def dashboard_kpi_anio(request):
-    programa = (request.GET.get("programa") or "").strip()
-    sede_id  = request.GET.get("sede") or ""
-    dep_id   = request.GET.get("disciplina") or ""
-    anio_str = request.GET.get("anio") or ""
-    inicio, fin, y = _year_range(anio_str)
-    anio_actual = y
-    __dbg = request.GET.get("__dbg") == "1"
-
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.select_related("sede", "profesor", "disciplina")
-    plan_qs  = Planificacion.objects.select_related("curso", "curso__sede", "curso__profesor", "curso__disciplina")\
-                                    .filter(semana__range=(inicio, fin))
-    asis_qs  = AsistenciaCurso.objects.select_related("curso", "curso__sede", "curso__disciplina")\
-                                      .filter(fecha__range=(inicio, fin))
-    asis_det_qs = AsistenciaCursoDetalle.objects.select_related("asistencia", "asistencia__curso")\
-                                               .filter(asistencia__fecha__range=(inicio, fin))
-
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
+@cache_control(private=True, no_cache=True)
+@_sin_validadores_si_obsoleto
+@condition(etag_func=_kpi_api_etag, last_modified_func=_kpi_api_last_modified)
+def kpi_api(request, panel):
+    calcular = KPI_PANELES.get(panel)
+    if calcular is None:
+        raise Http404("Panel KPI desconocido")
+    p = _kpi_api_params(request)
+    return JsonResponse(_kpi_panel(p, panel, calcular), json_dumps_params={"ensure_ascii": False})
+
+
+# ----------------- Drill-down (cubo mensual) -----------------
+MESES_CUBO = 12
+
+
+def _cubo_params(request):
+    hasta, fin, _, _ = _month_range(request.GET.get("hasta") or "")
+    if request.GET.get("desde"):
+        desde, _, _, _ = _month_range(request.GET["desde"])
+    else:
+        n = hasta.year * 12 + hasta.month - MESES_CUBO
+        desde = date(n // 12, n % 12 + 1, 1)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+        fin = _month_range(f"{hasta:%Y-%m}")[1]
+    filtros = kpi_cubo.limpiar_filtros(request.GET)
+    nivel = request.GET.get("nivel") or ""
+    if nivel not in kpi_cubo.NIVELES:
+        nivel = "estudiante" if "curso" in filtros else "sede"
+    return {"nivel": nivel, "filtros": filtros, "desde": desde, "hasta": hasta, "fin": fin}
+
+
+def _cubo_version(request):
+    if hasattr(request, "_cubo_version"):
+        return request._cubo_version
+    c = _cubo_params(request)
+    firma, marca = firma_kpi(c["filtros"].get("sede", ""), c["desde"], c["fin"])
+    corte = "".join(f".{k}{v}" for k, v in sorted(c["filtros"].items()))
+    request._cubo_version = (f"{c['nivel']}.{c['desde']:%Y%m}.{c['hasta']:%Y%m}{corte}.{firma}", marca)
+    return request._cubo_version
+
+
+def _cubo_etag(request):
+    return _cubo_version(request)[0]
+
+
+def _cubo_last_modified(request):
+    marca = _cubo_version(request)[1]
+    return datetime.fromtimestamp(marca, tz=timezone.get_current_timezone()) if marca else None
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@_sin_validadores_si_obsoleto
+@condition(etag_func=_cubo_etag, last_modified_func=_cubo_last_modified)
+def kpi_cubo_api(request):
+    c = _cubo_params(request)
+    f = c["filtros"]
+    periodo = f"{c['desde']:%Y-%m}:{c['hasta']:%Y-%m}:{f.get('curso', '')}:{f.get('profesor', '')}"
+    datos = kpi_cacheado(
+        f"cubo:{c['nivel']}", f.get("programa", ""), f.get("sede", ""), f.get("disciplina", ""), periodo,
+        lambda: kpi_cubo.cortar(c["nivel"], f, c["desde"], c["hasta"]), c["desde"], c["fin"],
     )
+    return JsonResponse({
+        **datos,
+        "nivel": c["nivel"],
+        "siguiente": kpi_cubo.SIGUIENTE[c["nivel"]],
+        "filtros": f,
+        "migas": kpi_cubo.migas(f),
+    }, json_dumps_params={"ensure_ascii": False})
 
-    clases_total    = asis_qs.count()
-    clases_cerradas = _sf(asis_qs, estado=getattr(AsistenciaCurso.Estado, "CERR", "CERR")).count() if hasattr(AsistenciaCurso, "Estado") else 0
-    uso_recintos    = round((clases_cerradas/clases_total)*100, 1) if clases_total else 0.0
-
-    presentes    = _sf(asis_det_qs, estado=ASIS_P).count()
-    ausentes     = _sf(asis_det_qs, estado=ASIS_A).count()
-    justificadas = _sf(asis_det_qs, estado=ASIS_J).count()
-
-    meses = _serie_meses_completos(inicio, fin)
-    cla_mes = (asis_qs.annotate(m=TruncMonth("fecha"))
-               .values("m").annotate(total=Count("id")))
-    cla_map = {_to_date(r["m"]): r["total"] for r in cla_mes}
-    cla_labels = [m.strftime("%b %Y") for m in meses]
-    cla_series = [cla_map.get(m, 0) for m in meses]
-
-    top_rows = (asis_det_qs.values("asistencia__curso__id", "asistencia__curso__nombre")
-                .annotate(total=Count("id"),
-                          ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    tmp = []
-    for r in top_rows:
-        total = r["total"] or 0
-        pct = round((r["ina"]/total)*100, 1) if total else 0.0
-        tmp.append({"curso_id": r["asistencia__curso__id"], "curso": r["asistencia__curso__nombre"], "pct": pct, "total": total})
-    top_inasistencia = sorted(tmp, key=lambda x: x["pct"], reverse=True)[:5]
-
-    total_plan = plan_qs.count()
-    plan_publicas = _sf(plan_qs, publica=True).count()
-    cumplimiento_planificacion = round((plan_publicas/total_plan)*100, 1) if total_plan else 0.0
 
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def kpi_cubo_vista(request):
+    c = _cubo_params(request)
     ctx = {
-        "modo": "anual",
-        "programa": programa, "sede_id": str(sede_id), "dep_id": str(dep_id),
-        "sedes": Sede.objects.order_by("nombre"),
-        "disciplinas": Deporte.objects.order_by("nombre"),
-        "anio_actual": anio_actual,
-        "kpi_cards": [
-            {"label": f"Año {y}", "value": "", "icon": "fa-calendar", "color": "#0ea5e9"},
-            {"label": "Clases registradas", "value": clases_total, "icon": "fa-calendar", "color": "#3b82f6"},
-            {"label": "Cumpl. planificación", "value": f"{cumplimiento_planificacion}%", "icon": "fa-clipboard-check", "color": "#f59e0b"},
-            {"label": "Uso recintos (proxy)", "value": f"{uso_recintos}%", "icon": "fa-building", "color": "#a855f7"},
-        ],
+        "desde": f"{c['desde']:%Y-%m}", "hasta": f"{c['hasta']:%Y-%m}",
+        "nivel": c["nivel"], "filtros": c["filtros"],
+        "niveles": [n for n in kpi_cubo.NIVELES if n != "estudiante"],
+        "programas": Curso.Programa.choices,
+    }
+    return render(request, "core/kpi_cubo.html", ctx)
 
 
-        "cla_labels": _j(cla_labels), "cla_series": _j(cla_series),
+# ----------------- EXPORTS -----------------
+def _df_top_inasistencia(qs):
+    top = pd.DataFrame(kpi_agregados.top_inasistencia(qs, 20), columns=["curso", "total", "pct"])
+    return top.rename(columns={"curso": "Curso", "total": "Registros", "pct": "% Inasistencia"})
+
+
+def _df_interanual(qs, anios):
+    inter = pd.DataFrame(kpi_agregados.resumen_interanual(qs, anios))
+    return inter.rename(columns={
+        "anio": "Año", "sesiones": "Clases", "total": "Registros",
+        "tasa_asist": "% Asistencia", "tasa_inasist": "% Inasistencia",
+        "delta_sesiones": "Δ Clases (%)", "delta_total": "Δ Registros (%)",
+        "delta_tasa_asist": "Δ Asistencia (pp)",
+    })
 
-        "dist_presente": presentes, "dist_ausente": ausentes, "dist_justificada": justificadas,
-        "top_inasistencia": top_inasistencia,
 
+def _df_clases_por_mes(qs):
+    por_mes = kpi_agregados.serie_mensual(qs)
+    return pd.DataFrame({"Mes": [f"{m:%Y-%m}" for m in por_mes], "Clases": list(por_mes.values())})
 
-        "est_labels": _j([]), "est_series": _j([]),
-        "dia_labels": _j([]), "dia_series": _j([]),
 
-        "top_prof_bajo_cumpl": [],
-        "semana": "", "rango_str": "", "mes": "", "anio": f"{y}",
+def _df_ventanas(programa, sede_id, dep_id, fin=None):
+    hoy = timezone.localdate()
+    fin = min(fin or hoy, hoy)
+    ventanas = pd.DataFrame(_ventanas_kpi(programa, sede_id, dep_id, fin))
+    ventanas.insert(0, "Hasta", fin.isoformat())
+    ventanas["desde"] = ventanas["desde"].map(date.isoformat)
+    return ventanas.rename(columns={
+        "dias": "Días", "desde": "Desde", "sesiones": "Clases", "total": "Registros",
+        "tasa_asist": "% Asistencia", "tasa_inasist": "% Inasistencia",
+        "delta_sesiones": "Δ Clases vs periodo anterior (%)",
+        "delta_tasa_asist": "Δ Asistencia vs periodo anterior (pp)",
+    })
+
+# ---- PDF: plantillas de impresión + caché en disco por huella (exports/pdf_export.py)
+PLANTILLA_PDF_KPI = "core/pdf_kpi_tablero.html"
+PLANTILLAS_PDF_KPI = (PLANTILLA_PDF_KPI, "core/pdf_kpi_base.html", "core/pdf_kpi_chart.html")
+TITULOS_PDF_KPI = {
+    "general": "Tablero de KPI",
+    "semanal": "KPI semanal",
+    "mensual": "KPI mensual",
+    "anual": "KPI anual",
+    "rango": "KPI por rango de fechas",
+}
+
+
+def _nombre_o_vacio(modelo, pk):
+    try:
+        return modelo.objects.filter(pk=int(pk)).values_list("nombre", flat=True).first() or ""
+    except (TypeError, ValueError):
+        return ""
+
+
+def _graficos_pdf_kpi(modo, datos):
+    """Specs de los gráficos del PDF (se dibujan en exports/graficos.py)."""
+    graficos = []
+    if modo in ("semanal", "mensual", "rango"):
+        d = datos["serie-diaria"]
+        graficos.append({
+            "tipo": "barras" if modo == "semanal" else "linea",
+            "titulo": "Clases del mes" if modo == "mensual" else "Clases por día",
+            "etiquetas": d["dia_labels"], "series": d["dia_series"],
+        })
+    else:
+        s = datos["serie-mensual"]
+        if modo == "general":
+            graficos.append({"tipo": "linea", "titulo": "Evolución mensual de estudiantes",
+                             "etiquetas": s["est_labels"], "series": s["est_series"]})
+        graficos.append({"tipo": "linea",
+                         "titulo": "Clases del año" if modo == "anual" else "Clases registradas por mes",
+                         "etiquetas": s["cla_labels"], "series": s["cla_series"]})
+    dist = datos["distribucion"]
+    graficos.append({
+        "tipo": "torta", "titulo": "Distribución P/A/J", "tamano": (5, 3),
+        "etiquetas": ["Presente", "Ausente", "Justificada"],
+        "series": [dist["presente"], dist["ausente"], dist["justificada"]],
+    })
+    return graficos
+
+
+def _contexto_pdf_kpi(request, modo):
+    """Todo lo que se dibuja en el PDF, sacado de los mismos paneles que la API."""
+    p = _kpi_params(request, modo)
+    datos = _kpi_datos(p)
+    if modo == "semanal":
+        subtitulo = f"Semana {p['rango_str']}"
+    elif modo == "mensual":
+        subtitulo = f"Mes {p['inicio']:%m-%Y}"
+    elif modo == "anual":
+        subtitulo = f"Año {p['anio']}"
+    elif modo == "rango":
+        subtitulo = f"Del {p['rango_str']}"
+    else:
+        subtitulo = "Últimos 12 meses"
+    filtros = [
+        ("Programa", dict(Curso.Programa.choices).get(p["programa"], p["programa"])),
+        ("Sede", _nombre_o_vacio(Sede, p["sede_id"])),
+        ("Disciplina", _nombre_o_vacio(Deporte, p["dep_id"])),
+    ]
+    filtros = " · ".join(f"{k}: {v}" for k, v in filtros if v)
+    return {
+        "titulo": TITULOS_PDF_KPI[modo],
+        "subtitulo": f"{subtitulo} — {filtros}" if filtros else subtitulo,
+        "kpi_cards": [c for c in datos["tarjetas"]["kpi_cards"] if c["value"] != ""],
+        "alerta_filtros": datos["tarjetas"]["alerta_filtros"],
+        "graficos": _graficos_pdf_kpi(modo, datos),
+        "top_inasistencia": datos["top"]["top_inasistencia"],
+        "top_prof_bajo_cumpl": datos["top"]["top_prof_bajo_cumpl"],
+        "interanual": datos["interanual"]["resumen"],
+        "ventanas": datos["ventanas"]["ventanas"],
+        "ventanas_fin": datos["ventanas"]["fin"],
     }
 
-    if __dbg:
-        print("[KPI][AÑO] meses:", len(cla_labels), "serie:", len(cla_series),
-              "| P/A/J:", presentes, ausentes, justificadas)
 
-    return render(request, "core/dashboard_kpi.html", ctx)
+def _huella_pdf_kpi(request, modo):
+    """
+    Clave del PDF sin calcular los paneles: filtros, periodo y firma de los
+    contadores KPI que leen (sede y global, por el respaldo "sin filtros").
+    """
+    p = _kpi_params(request, modo)
+    contenido = {k: p.get(k) for k in ("modo", "programa", "sede_id", "dep_id", "periodo", "inicio_datos")}
+    contenido["firmas"] = _firmas_reporte(p)
+    return pdf_export.huella(contenido, PLANTILLAS_PDF_KPI)
 
 
-# ----------------- EXPORTS -----------------
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_general_pdf(request):
-    resp = dashboard_kpi(request)
-    pdf = HTML(string=resp.content.decode("utf-8"), base_url=request.build_absolute_uri()).write_pdf()
+def _firmas_reporte(p):
+    inicio = p.get("inicio_datos") or p["inicio"]
+    return [firma_kpi(s, inicio, p["fin"])[0] for s in (p["sede_id"], "")]
+
+
+def _version_excel_kpi(request, modo):
+    p = _kpi_params(request, modo)
+    return ".".join([p["periodo"], str(p.get("inicio_datos")), *_firmas_reporte(p)])
+
+
+def _respuesta_pdf(pdf, nombre):
     r = HttpResponse(pdf, content_type="application/pdf")
-    r["Content-Disposition"] = 'attachment; filename="kpi_general.pdf"'
+    r["Content-Disposition"] = f'attachment; filename="{nombre}"'
     return r
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_general_excel(request):
+
+def _generar_pdf_kpi(request, modo, nombre):
+    clave = _huella_pdf_kpi(request, modo)
+    pdf = pdf_export.leer(clave)
+    if pdf is None:
+        pdf = pdf_export.renderizar(PLANTILLA_PDF_KPI, _contexto_pdf_kpi(request, modo))
+        pdf_export.guardar(clave, pdf)
+    return _respuesta_pdf(pdf, nombre)
+
+
+def _generar_kpi_general_pdf(request):
+    return _generar_pdf_kpi(request, "general", "kpi_general.pdf")
+
+def _generar_kpi_general_excel(request):
     programa = (request.GET.get("programa") or "").strip()
     sede_id  = request.GET.get("sede") or ""
     dep_id   = request.GET.get("disciplina") or ""
 
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.all()
-    plan_qs  = Planificacion.objects.all()
-    asis_qs  = AsistenciaCurso.objects.all()
-    asis_det_qs = AsistenciaCursoDetalle.objects.all()
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
+    est_qs = _estudiantes_filtrados(programa, sede_id, dep_id)
+    qs = kpi_mensual_qs(programa, sede_id, dep_id)
+    kpis, _ = calcular_kpis(
+        ("total_estudiantes", "activos", "total_cursos", "plan_total", "clases_total", "detalles_total"),
+        programa, sede_id, dep_id,
     )
 
     resumen = [{
-        "Total estudiantes": est_qs.count(),
-        "Activos": _sf(est_qs, activo=True).count(),
-        "Cursos": curso_qs.count(),
-        "Planificaciones": plan_qs.count(),
-        "Clases registradas": asis_qs.count(),
-        "Detalles asistencia": asis_det_qs.count(),
+        "Total estudiantes": kpis["total_estudiantes"],
+        "Activos": kpis["activos"],
+        "Cursos": kpis["total_cursos"],
+        "Planificaciones": kpis["plan_total"],
+        "Clases registradas": kpis["clases_total"],
+        "Detalles asistencia": kpis["detalles_total"],
     }]
-    df_resumen = pd.DataFrame(resumen)
 
     est_fecha_field = _first_existing_field(Estudiante, [
         "creado", "fecha_creacion", "created_at", "created", "fecha_registro", "fecha"
@@ -2618,204 +2881,293 @@ def exportar_kpi_general_excel(request):
     else:
         df_est_mes = pd.DataFrame(columns=["Mes", "Nuevos"])
 
-    cla_mes = (asis_qs.annotate(mes=TruncMonth("fecha"))
-                      .values("mes").annotate(total=Count("id")).order_by("mes"))
-    df_cla_mes = pd.DataFrame([{"Mes": c["mes"].strftime("%Y-%m"), "Clases": c["total"]} for c in cla_mes])
-
-    top = (asis_det_qs.values("asistencia__curso__nombre")
-           .annotate(total=Count("id"), ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    rows = [{
-        "Curso": r["asistencia__curso__nombre"],
-        "Registros": r["total"],
-        "% Inasistencia": round((r["ina"]/r["total"])*100, 1) if r["total"] else 0
-    } for r in top]
-    df_top = pd.DataFrame(sorted(rows, key=lambda x: x["% Inasistencia"], reverse=True)[:20])
-
-    resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    resp["Content-Disposition"] = 'attachment; filename="kpi_general.xlsx"'
-    with pd.ExcelWriter(resp, engine="openpyxl") as writer:
-        df_resumen.to_excel(writer, sheet_name="Resumen", index=False)
-        df_est_mes.to_excel(writer, sheet_name="Estudiantes por mes", index=False)
-        df_cla_mes.to_excel(writer, sheet_name="Clases por mes", index=False)
-        df_top.to_excel(writer, sheet_name="Top inasistencia", index=False)
-    return resp
+    df_cla_mes = _df_clases_por_mes(qs)
+    df_top = _df_top_inasistencia(qs)
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_semana_pdf(request):
-    resp = dashboard_kpi_semana(request)
-    pdf = HTML(string=resp.content.decode("utf-8"), base_url=request.build_absolute_uri()).write_pdf()
-    r = HttpResponse(pdf, content_type="application/pdf")
-    r["Content-Disposition"] = 'attachment; filename="kpi_semana.pdf"'
-    return r
+    hojas = [
+        hoja_dicts("Resumen", resumen),
+        hoja_df("Estudiantes por mes", df_est_mes),
+        hoja_df("Clases por mes", df_cla_mes),
+        hoja_df("Top inasistencia", df_top),
+        hoja_df("Ventanas móviles", _df_ventanas(programa, sede_id, dep_id)),
+    ]
+    if request.GET.get("detalle") == "1":
+        hojas.append(hoja_detalle(detalle_qs(programa, sede_id, dep_id)))
+    return respuesta_xlsx("kpi_general.xlsx", hojas)
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_semana_excel(request):
+def _generar_kpi_semana_pdf(request):
+    return _generar_pdf_kpi(request, "semanal", "kpi_semana.pdf")
+
+def _generar_kpi_semana_excel(request):
     programa   = (request.GET.get("programa") or "").strip()
     sede_id    = request.GET.get("sede") or ""
     dep_id     = request.GET.get("disciplina") or ""
     semana_str = request.GET.get("semana") or ""
     lunes, domingo = _week_range(semana_str)
 
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.all()
-    plan_qs  = Planificacion.objects.filter(semana__range=(lunes, domingo))
-    asis_qs  = AsistenciaCurso.objects.filter(fecha__range=(lunes, domingo))
-    asis_det_qs = AsistenciaCursoDetalle.objects.filter(asistencia__fecha__range=(lunes, domingo))
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
-    )
+    qs = kpi_diario_qs(programa, sede_id, dep_id, lunes, domingo)
+    kpis, _ = calcular_kpis(TARJETAS_PERIODO, programa, sede_id, dep_id, lunes, domingo)
 
     resumen = [{
         "Semana": f"{lunes:%Y-%m-%d} a {domingo:%Y-%m-%d}",
-        "Nuevos (semana)": _sf(est_qs, creado__range=(lunes, domingo)).count(),
-        "Clases registradas": asis_qs.count(),
-        "Planificaciones": plan_qs.count(),
-        "Detalles asistencia": asis_det_qs.count(),
+        "Nuevos (semana)": kpis["nuevos"],
+        "Clases registradas": kpis["clases_total"],
+        "Planificaciones": kpis["plan_total"],
+        "Detalles asistencia": kpis["detalles_total"],
     }]
-    df_resumen = pd.DataFrame(resumen)
-
-    serie_diaria = (asis_qs.annotate(dia=TruncDay("fecha"))
-                    .values("dia").annotate(total=Count("id")).order_by("dia"))
-    df_dias = pd.DataFrame([{"Día": r["dia"].strftime("%Y-%m-%d"), "Clases": r["total"]} for r in serie_diaria])
-
-    top = (asis_det_qs.values("asistencia__curso__nombre")
-           .annotate(total=Count("id"), ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    rows = [{
-        "Curso": r["asistencia__curso__nombre"], "Registros": r["total"],
-        "% Inasistencia": round((r["ina"]/r["total"])*100, 1) if r["total"] else 0
-    } for r in top]
-    df_top = pd.DataFrame(sorted(rows, key=lambda x: x["% Inasistencia"], reverse=True)[:20])
-
-    resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    resp["Content-Disposition"] = 'attachment; filename="kpi_semana.xlsx"'
-    with pd.ExcelWriter(resp, engine="openpyxl") as writer:
-        df_resumen.to_excel(writer, sheet_name="Resumen", index=False)
-        df_dias.to_excel(writer, sheet_name="Clases por día", index=False)
-        df_top.to_excel(writer, sheet_name="Top inasistencia", index=False)
-    return resp
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_mes_pdf(request):
-    resp = dashboard_kpi_mes(request)
-    pdf = HTML(string=resp.content.decode("utf-8"), base_url=request.build_absolute_uri()).write_pdf()
-    r = HttpResponse(pdf, content_type="application/pdf")
-    r["Content-Disposition"] = 'attachment; filename="kpi_mes.pdf"'
-    return r
+    serie_diaria = kpi_agregados.serie_diaria(qs)
+    df_dias = pd.DataFrame({"Día": [f"{d:%Y-%m-%d}" for d in serie_diaria], "Clases": list(serie_diaria.values())})
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_mes_excel(request):
+    df_top = _df_top_inasistencia(qs)
+
+    hojas = [
+        hoja_dicts("Resumen", resumen),
+        hoja_df("Clases por día", df_dias),
+        hoja_df("Top inasistencia", df_top),
+        hoja_df("Ventanas móviles", _df_ventanas(programa, sede_id, dep_id, domingo)),
+    ]
+    if request.GET.get("detalle") == "1":
+        hojas.append(hoja_detalle(detalle_qs(programa, sede_id, dep_id, lunes, domingo)))
+    return respuesta_xlsx("kpi_semana.xlsx", hojas)
+
+def _generar_kpi_mes_pdf(request):
+    return _generar_pdf_kpi(request, "mensual", "kpi_mes.pdf")
+
+def _generar_kpi_mes_excel(request):
     programa = (request.GET.get("programa") or "").strip()
     sede_id  = request.GET.get("sede") or ""
     dep_id   = request.GET.get("disciplina") or ""
     mes_str  = request.GET.get("mes") or ""
     inicio, fin, y, m = _month_range(mes_str)
 
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.all()
-    plan_qs  = Planificacion.objects.filter(semana__range=(inicio, fin))
-    asis_qs  = AsistenciaCurso.objects.filter(fecha__range=(inicio, fin))
-    asis_det_qs = AsistenciaCursoDetalle.objects.filter(asistencia__fecha__range=(inicio, fin))
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
-    )
+    hechos = kpi_diario_qs(programa, sede_id, dep_id)
+    qs = hechos.filter(fecha__range=(inicio, fin))
+    kpis, _ = calcular_kpis(TARJETAS_PERIODO, programa, sede_id, dep_id, inicio, fin)
 
     resumen = [{
         "Mes": f"{inicio:%Y-%m}",
-        "Nuevos (mes)": _sf(est_qs, creado__range=(inicio, fin)).count(),
-        "Clases registradas": asis_qs.count(),
-        "Planificaciones": plan_qs.count(),
-        "Detalles asistencia": asis_det_qs.count(),
+        "Nuevos (mes)": kpis["nuevos"],
+        "Clases registradas": kpis["clases_total"],
+        "Planificaciones": kpis["plan_total"],
+        "Detalles asistencia": kpis["detalles_total"],
     }]
-    df_resumen = pd.DataFrame(resumen)
-
-    serie_diaria = (asis_qs.annotate(dia=TruncDay("fecha"))
-                    .values("dia").annotate(total=Count("id")).order_by("dia"))
-    df_dias = pd.DataFrame([{"Día": r["dia"].strftime("%Y-%m-%d"), "Clases": r["total"]} for r in serie_diaria])
-
-    top = (asis_det_qs.values("asistencia__curso__nombre")
-           .annotate(total=Count("id"), ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    rows = [{
-        "Curso": r["asistencia__curso__nombre"], "Registros": r["total"],
-        "% Inasistencia": round((r["ina"]/r["total"])*100, 1) if r["total"] else 0
-    } for r in top]
-    df_top = pd.DataFrame(sorted(rows, key=lambda x: x["% Inasistencia"], reverse=True)[:20])
-
-    resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    resp["Content-Disposition"] = 'attachment; filename="kpi_mes.xlsx"'
-    with pd.ExcelWriter(resp, engine="openpyxl") as writer:
-        df_resumen.to_excel(writer, sheet_name="Resumen", index=False)
-        df_dias.to_excel(writer, sheet_name="Clases por día", index=False)
-        df_top.to_excel(writer, sheet_name="Top inasistencia", index=False)
-    return resp
 
-@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
-def exportar_kpi_anio_pdf(request):
-    # Llamamos al dashboard normal
-    resp = dashboard_kpi_anio(request)
+    dias = [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+    df_dias = pd.DataFrame({
+        "Día": [d.strftime("%Y-%m-%d") for d in dias],
+        "Clases": kpi_agregados.serie_diaria(qs, dias),
+        "Asistencia 7 días (%)": kpi_agregados.tasa_asistencia_movil(hechos, dias, 7),
+    })
+    df_dias = df_dias[df_dias["Clases"] > 0]
+
+    df_top = _df_top_inasistencia(qs)
+
+    hojas = [
+        hoja_dicts("Resumen", resumen),
+        hoja_df("Clases por día", df_dias),
+        hoja_df("Top inasistencia", df_top),
+        hoja_df("Ventanas móviles", _df_ventanas(programa, sede_id, dep_id, fin)),
+    ]
+    if request.GET.get("detalle") == "1":
+        hojas.append(hoja_detalle(detalle_qs(programa, sede_id, dep_id, inicio, fin)))
+    return respuesta_xlsx("kpi_mes.xlsx", hojas)
+
+def _generar_kpi_anio_pdf(request):
+    return _generar_pdf_kpi(request, "anual", "kpi_anio.pdf")
+
+def _generar_kpi_anio_excel(request):
+    programa = (request.GET.get("programa") or "").strip()
+    sede_id  = request.GET.get("sede") or ""
+    dep_id   = request.GET.get("disciplina") or ""
+    p = _kpi_params(request, "anual")
+    inicio, fin, y = p["inicio"], p["fin"], p["anio_actual"]
 
+    # resumen mensual de los años comparados; el año elegido es el último tramo
+    qs_hist = kpi_mensual_qs(programa, sede_id, dep_id, p["inicio_hist"], fin)
+    qs = qs_hist.filter(mes__gte=inicio)
+    kpis, _ = calcular_kpis(TARJETAS_PERIODO, programa, sede_id, dep_id, inicio, fin)
 
-    html = resp.content.decode("utf-8")
+    resumen = [{
+        "Año": f"{y}",
+        "Clases registradas": kpis["clases_total"],
+        "Planificaciones": kpis["plan_total"],
+        "Detalles asistencia": kpis["detalles_total"],
+    }]
 
+    df_cla_mes = _df_clases_por_mes(qs)
+    df_cursos_mes = kpi_agregados.pivote_curso_mes(qs).rename_axis("Curso")
+    df_top = _df_top_inasistencia(qs)
+    df_inter = _df_interanual(qs_hist, list(range(p["inicio_hist"].year, y + 1)))
+
+    hojas = [
+        hoja_dicts("Resumen", resumen),
+        hoja_df("Clases por mes", df_cla_mes),
+        hoja_df("Clases por curso y mes", df_cursos_mes, index=True),
+        hoja_df("Top inasistencia", df_top),
+        hoja_df("Interanual", df_inter),
+        hoja_df("Ventanas móviles", _df_ventanas(programa, sede_id, dep_id, fin)),
+    ]
+    if request.GET.get("detalle") == "1":
+        hojas.append(hoja_detalle(detalle_qs(programa, sede_id, dep_id, inicio, fin)))
+    return respuesta_xlsx("kpi_anio.xlsx", hojas)
 
-    html = html.replace("var(--primary-600)", "#008080")
-    html = html.replace("var(--primary-700)", "#006666")
-    html = html.replace("currentColor", "#000000")
+def _generar_kpi_rango_pdf(request):
+    return _generar_pdf_kpi(request, "rango", "kpi_rango.pdf")
 
+def _generar_kpi_rango_excel(request):
+    p = _kpi_params(request, "rango")
+    programa, sede_id, dep_id = p["programa"], p["sede_id"], p["dep_id"]
+    inicio, fin = p["inicio"], p["fin"]
 
-    html = re.sub(r"<svg.*?</svg>", "", html, flags=re.DOTALL)
+    hechos = kpi_diario_qs(programa, sede_id, dep_id)
+    qs = hechos.filter(fecha__range=(inicio, fin))
+    totales = kpi_agregados.totales(qs)
+    kpis, _ = calcular_kpis(TARJETAS_PERIODO, programa, sede_id, dep_id, inicio, fin)
 
+    resumen = [{
+        "Desde": inicio.isoformat(),
+        "Hasta": fin.isoformat(),
+        "Nuevos (rango)": kpis["nuevos"],
+        "Clases registradas": kpis["clases_total"],
+        "Planificaciones": kpis["plan_total"],
+        "Detalles asistencia": kpis["detalles_total"],
+        "% Asistencia": round(totales["presentes"] / totales["total"] * 100, 1) if totales["total"] else 0.0,
+    }]
 
-    pdf = HTML(string=html, base_url=request.build_absolute_uri()).write_pdf()
+    dias = [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+    df_dias = pd.DataFrame({
+        "Día": [d.strftime("%Y-%m-%d") for d in dias],
+        "Clases": kpi_agregados.serie_diaria(qs, dias),
+        "Asistencia 7 días (%)": kpi_agregados.tasa_asistencia_movil(hechos, dias, 7),
+    })
+    df_dias = df_dias[df_dias["Clases"] > 0]
 
+    hojas = [
+        hoja_dicts("Resumen", resumen),
+        hoja_df("Clases por día", df_dias),
+        hoja_df("Top inasistencia", _df_top_inasistencia(qs)),
+        hoja_df("Ventanas móviles", _df_ventanas(programa, sede_id, dep_id, fin)),
+    ]
+    if request.GET.get("detalle") == "1":
+        hojas.append(hoja_detalle(detalle_qs(programa, sede_id, dep_id, inicio, fin)))
+    return respuesta_xlsx("kpi_rango.xlsx", hojas)
+
+# ---- Cola de reportes: las vistas solo encolan; genera `manage.py run_report_worker`
+GENERADORES_REPORTE = {
+    "kpi_general_pdf": _generar_kpi_general_pdf,
+    "kpi_general_excel": _generar_kpi_general_excel,
+    "kpi_semana_pdf": _generar_kpi_semana_pdf,
+    "kpi_semana_excel": _generar_kpi_semana_excel,
+    "kpi_mes_pdf": _generar_kpi_mes_pdf,
+    "kpi_mes_excel": _generar_kpi_mes_excel,
+    "kpi_anio_pdf": _generar_kpi_anio_pdf,
+    "kpi_anio_excel": _generar_kpi_anio_excel,
+    "kpi_rango_pdf": _generar_kpi_rango_pdf,
+    "kpi_rango_excel": _generar_kpi_rango_excel,
+}
+
+
+PDF_KPI = {
+    "kpi_general_pdf": ("general", "kpi_general.pdf"),
+    "kpi_semana_pdf": ("semanal", "kpi_semana.pdf"),
+    "kpi_mes_pdf": ("mensual", "kpi_mes.pdf"),
+    "kpi_anio_pdf": ("anual", "kpi_anio.pdf"),
+    "kpi_rango_pdf": ("rango", "kpi_rango.pdf"),
+}
+
+
+MODOS_REPORTE = {"kpi_general": "general", "kpi_semana": "semanal", "kpi_mes": "mensual",
+                 "kpi_anio": "anual", "kpi_rango": "rango"}
+
+
+def _encolar_reporte(request, tipo):
+    modo = MODOS_REPORTE[tipo.rsplit("_", 1)[0]]
+    # filtros inválidos (p.ej. mes=2026-13) son un 400 aquí, no un trabajo que falla en la cola
+    _kpi_params(request, modo)
+    if request.GET.get("detalle") == "1" and tipo not in PDF_KPI:
+        # detalle crudo sin tope de filas: se escribe por trozos a un temporal y se
+        # envía desde ahí; por la cola quedaría entero en memoria y en la BD
+        return GENERADORES_REPORTE[tipo](request)
+    # la web no ve el disco del worker: un reporte ya generado se reutiliza desde la cola
+    # mientras la firma de sus datos (y, en el PDF, sus plantillas) no cambie
+    version = _huella_pdf_kpi(request, modo) if tipo in PDF_KPI else _version_excel_kpi(request, modo)
+    trabajo = reportes_jobs.encolar(tipo, request, version)
+    return redirect("core:reporte_estado", pk=trabajo.pk)
 
-    r = HttpResponse(pdf, content_type="application/pdf")
-    r["Content-Disposition"] = 'attachment; filename="kpi_anio.pdf"'
-    return r
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_general_pdf(request):
+    return _encolar_reporte(request, "kpi_general_pdf")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_general_excel(request):
+    return _encolar_reporte(request, "kpi_general_excel")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_semana_pdf(request):
+    return _encolar_reporte(request, "kpi_semana_pdf")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_semana_excel(request):
+    return _encolar_reporte(request, "kpi_semana_excel")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_mes_pdf(request):
+    return _encolar_reporte(request, "kpi_mes_pdf")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_mes_excel(request):
+    return _encolar_reporte(request, "kpi_mes_excel")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_anio_pdf(request):
+    return _encolar_reporte(request, "kpi_anio_pdf")
 
 @role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
 def exportar_kpi_anio_excel(request):
-    programa = (request.GET.get("programa") or "").strip()
-    sede_id  = request.GET.get("sede") or ""
-    dep_id   = request.GET.get("disciplina") or ""
-    anio_str = request.GET.get("anio") or ""
-    inicio, fin, y = _year_range(anio_str)
-
-    est_qs   = Estudiante.objects.all()
-    curso_qs = Curso.objects.all()
-    plan_qs  = Planificacion.objects.filter(semana__range=(inicio, fin))
-    asis_qs  = AsistenciaCurso.objects.filter(fecha__range=(inicio, fin))
-    asis_det_qs = AsistenciaCursoDetalle.objects.filter(asistencia__fecha__range=(inicio, fin))
-    est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs = _aplicar_filtros_basicos(
-        est_qs, curso_qs, plan_qs, asis_qs, asis_det_qs, programa, sede_id, dep_id
-    )
+    return _encolar_reporte(request, "kpi_anio_excel")
 
-    resumen = [{
-        "Año": f"{y}",
-        "Clases registradas": asis_qs.count(),
-        "Planificaciones": plan_qs.count(),
-        "Detalles asistencia": asis_det_qs.count(),
-    }]
-    df_resumen = pd.DataFrame(resumen)
-
-    cla_mes = (asis_qs.annotate(mes=TruncMonth("fecha"))
-               .values("mes").annotate(total=Count("id")).order_by("mes"))
-    df_cla_mes = pd.DataFrame([{"Mes": c["mes"].strftime("%Y-%m"), "Clases": c["total"]} for c in cla_mes])
-
-    top = (asis_det_qs.values("asistencia__curso__nombre")
-           .annotate(total=Count("id"), ina=Count("id", filter=Q(estado__in=[ASIS_A, ASIS_J]))))
-    rows = [{
-        "Curso": r["asistencia__curso__nombre"], "Registros": r["total"],
-        "% Inasistencia": round((r["ina"]/r["total"])*100, 1) if r["total"] else 0
-    } for r in top]
-    df_top = pd.DataFrame(sorted(rows, key=lambda x: x["% Inasistencia"], reverse=True)[:20])
-
-    resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    resp["Content-Disposition"] = 'attachment; filename="kpi_anio.xlsx"'
-    with pd.ExcelWriter(resp, engine="openpyxl") as writer:
-        pd.DataFrame(resumen).to_excel(writer, sheet_name="Resumen", index=False)
-        df_cla_mes.to_excel(writer, sheet_name="Clases por mes", index=False)
-        df_top.to_excel(writer, sheet_name="Top inasistencia", index=False)
-    return resp
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_rango_pdf(request):
+    return _encolar_reporte(request, "kpi_rango_pdf")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+def exportar_kpi_rango_excel(request):
+    return _encolar_reporte(request, "kpi_rango_excel")
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def reporte_estado(request, pk: int):
+    trabajo = get_object_or_404(TrabajoReporte.objects.defer("contenido"), pk=pk)
+    datos = {
+        "id": trabajo.pk,
+        "estado": trabajo.estado,
+        "estado_display": trabajo.get_estado_display(),
+        "intentos": trabajo.intentos,
+        "error": trabajo.error if trabajo.estado == TrabajoReporte.Estado.ERROR else "",
+        "descarga": reverse("core:reporte_descargar", args=[trabajo.pk]) if trabajo.estado == TrabajoReporte.Estado.LISTO else None,
+    }
+    if request.GET.get("formato") == "json":
+        return JsonResponse(datos)
+    return render(request, "core/reporte_estado.html", {"trabajo": trabajo, **datos})
+
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def reporte_descargar(request, pk: int):
+    trabajo = get_object_or_404(TrabajoReporte, pk=pk, estado=TrabajoReporte.Estado.LISTO)
+    r = HttpResponse(bytes(trabajo.contenido), content_type=trabajo.content_type)
+    r["Content-Disposition"] = f'attachment; filename="{trabajo.nombre_archivo}"'
+    return r
+
+@role_required(Usuario.Tipo.ADMIN, Usuario.Tipo.COORD)
+@require_http_methods(["GET"])
+def exportar_detalle_csv(request):
+    """Registros crudos de asistencia (uno por alumno y sesión) del periodo del tablero."""
+    modo = request.GET.get("modo") or "general"
+    p = _kpi_params(request, modo if modo in KPI_MODOS else "general")
+    qs = detalle_qs(p["programa"], p["sede_id"], p["dep_id"], p["inicio"], p["fin"])
+    return respuesta_csv(f"asistencia_{p['modo']}.csv", [t for _, t in DETALLE_COLUMNAS], filas_detalle(qs))
 
 @require_http_methods(["GET"])
 def comunicados_public(request):
@@ -25,6 +25,9 @@ from applications.core.models import (
     AsistenciaCurso,
     AsistenciaCursoDetalle,
 )
+from applications.core.services.asistencia import (
+    cambiar_estado, cambios_desde_post, guardar_asistencia, sesion_del_dia,
+)
 from .models import AsistenciaProfesor
 
 
@@ -331,14 +334,9 @@ def asistencia_tomar(request, curso_id):
     profesor = request.user
     curso = get_object_or_404(Curso, pk=curso_id)
 
-    hoy = timezone.localdate()
-    asistencia, _ = AsistenciaCurso.objects.get_or_create(
-        curso=curso,
-        fecha=hoy,
-        defaults={"creado_por": profesor, "estado": AsistenciaCurso.Estado.PEND},
-    )
-
     alumnos = Estudiante.objects.filter(curso=curso, activo=True).order_by("apellidos", "nombres")
+    alumnos_ids = alumnos.values_list("id", flat=True)
+    asistencia = sesion_del_dia(curso, alumnos_ids, profesor)
 
 
     if request.method == "POST":
@@ -346,46 +344,34 @@ def asistencia_tomar(request, curso_id):
 
         # Guardar estados y observaciones
         if accion == "guardar":
-            for est in alumnos:
-
-                detalle, _ = AsistenciaCursoDetalle.objects.get_or_create(
-                    asistencia=asistencia,
-                    estudiante=est,
-                )
-                estado = request.POST.get(f"estado_{detalle.id}", detalle.estado)
-                obs = request.POST.get(f"obs_{detalle.id}", detalle.observaciones)
-                detalle.estado = estado or "P"
-                detalle.observaciones = obs or ""
-                detalle.save()
+            guardar_asistencia(asistencia, alumnos_ids, cambios_desde_post(request.POST), profesor)
             messages.success(request, "✅ Asistencia de alumnos guardada correctamente.")
             return redirect("profesor:asistencia_tomar", curso_id=curso.id)
 
         # Marcar entrada / salida del profesor
         if accion == "entrada":
-            asistencia.estado = AsistenciaCurso.Estado.ENCU
-            asistencia.inicio_real = timezone.localtime().time()
-            asistencia.save()
+            cambiar_estado(asistencia, AsistenciaCurso.Estado.ENCU, profesor)
             messages.info(request, "Entrada registrada correctamente.")
             return redirect("profesor:asistencia_tomar", curso_id=curso.id)
 
         if accion == "salida":
-            asistencia.estado = AsistenciaCurso.Estado.CERR
-            asistencia.fin_real = timezone.localtime().time()
-            asistencia.save()
+            cambiar_estado(asistencia, AsistenciaCurso.Estado.CERR, profesor)
             messages.info(request, "Salida registrada correctamente.")
             return redirect("profesor:asistencia_tomar", curso_id=curso.id)
 
 
+    detalles = {
+        d.estudiante_id: d
+        for d in asistencia.detalles.filter(estudiante__in=alumnos_ids).only("id", "asistencia_id", "estudiante_id", "estado", "observaciones")
+    }
     rows = []
     for est in alumnos:
-        detalle, _ = AsistenciaCursoDetalle.objects.get_or_create(
-            asistencia=asistencia,
-            estudiante=est,
-            defaults={"estado": "P", "observaciones": ""},
-        )
+        detalle = detalles.get(est.id)
+        if detalle is None:
+            continue
         rows.append({
             "ins": {"id": detalle.id, "estudiante": est},
-            "code": detalle.estado,
+            "code": detalle.estado or "P",
             "obs": detalle.observaciones,
         })
 
@@ -434,7 +420,7 @@ def alumno_temporal_new(request):
 def asistencia_historial(request, curso_id: int):
 
     from django.core.paginator import Paginator
-    from django.db.models import Count, Q
+    from django.db.models import Count, Q, Sum
 
     curso = get_object_or_404(Curso, pk=curso_id)
 
@@ -470,10 +456,10 @@ def asistencia_historial(request, curso_id: int):
         estudiante = get_object_or_404(Estudiante, pk=est_id, curso=curso)
 
         det_qs = (
-            AsistenciaCursoDetalle.objects
+            AsistenciaCursoDetalle.objects.tomados()
             .select_related("asistencia")
-            .filter(asistencia__curso=curso, estudiante=estudiante)
-            .order_by("-asistencia__fecha", "-id")
+            .filter(curso=curso, estudiante=estudiante)
+            .order_by("-fecha", "-id")
         )
 
         paginator = Paginator(det_qs, per_page)
@@ -502,27 +488,15 @@ def asistencia_historial(request, curso_id: int):
         })
 
     # ===== Modo CURSO =====
-    sesiones_qs = (
-        AsistenciaCurso.objects
-        .filter(curso=curso)
-        .annotate(
-            n_total=Count("detalles"),
-            n_p=Count("detalles", filter=Q(detalles__estado="P")),
-            n_a=Count("detalles", filter=Q(detalles__estado="A")),
-            n_j=Count("detalles", filter=Q(detalles__estado="J")),
-        )
-        .order_by("-fecha", "-id")
-    )
+    # contadores guardados en cada sesión
+    sesiones_qs = AsistenciaCurso.objects.filter(curso=curso).order_by("-fecha", "-id")
 
     paginator = Paginator(sesiones_qs, per_page)
     sesiones = paginator.get_page(page)
 
     # KPI global del curso (todas las sesiones)
-    g = AsistenciaCursoDetalle.objects.filter(asistencia__curso=curso).aggregate(
-        total=Count("id"),
-        P=Count("id", filter=Q(estado="P")),
-        A=Count("id", filter=Q(estado="A")),
-        J=Count("id", filter=Q(estado="J")),
+    g = sesiones_qs.aggregate(
+        total=Sum("total"), P=Sum("presentes"), A=Sum("ausentes"), J=Sum("justificados"),
     )
     kpi_global = {
         "P": g["P"] or 0,
@@ -14,7 +14,7 @@ from .forms import UsuarioCreateForm, UsuarioUpdateForm
 from applications.usuarios.utils import role_required
 
 
-from applications.core.models import Comunicado
+from applications.core.models import AlertaAsistencia, Comunicado
 
 
 def _redirigir_por_tipo(user: Usuario):
@@ -88,7 +88,9 @@ def panel_admin(request):
 
 @role_required(Usuario.Tipo.COORD)
 def panel_coordinador(request):
-    return render(request, "usuarios/panel_coordinador.html")
+    alertas = (AlertaAsistencia.objects.filter(revisada=False)
+               .select_related("curso", "estudiante").order_by("-fecha", "-creado")[:20])
+    return render(request, "usuarios/panel_coordinador.html", {"alertas": alertas})
 
 
 @role_required(Usuario.Tipo.PROF)
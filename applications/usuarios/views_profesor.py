@@ -9,7 +9,9 @@ from django.db.models import Q, Count
 from django.contrib import messages
 from django.urls import reverse
 
-from applications.core.models import Curso, Planificacion, Comunicado
+from applications.core import asistencia_unificada
+from applications.core.models import AsistenciaUnificada, Curso, Planificacion, Comunicado
+from applications.atleta import alertas
 from applications.atleta.models import AsistenciaAtleta, Clase, Inscripcion
 from .forms_profesor import PlanificacionForm, ComunicadoForm
 
@@ -161,26 +163,32 @@ def asistencia_tomar(request, curso_id):
             clase.save(update_fields=["estado", "fin_real"])
 
         elif accion == "guardar":
-            guardados = 0
+            # escritura masiva (sin señales por fila); rachas, alertas y asistencia
+            # unificada se procesan una vez por clase
+            nuevos, modificados = [], []
             for ins in inscritos:
                 estado = request.POST.get(f"estado_{ins.pk}")  # 'P' | 'A' | 'J'
                 obs = request.POST.get(f"obs_{ins.pk}") or ""
-                presente = (estado == "P")
-                justificado = (estado == "J")
-
-                AsistenciaAtleta.objects.update_or_create(
-                    clase=clase,
-                    atleta=ins.atleta,
-                    defaults={
-                        "presente": presente,
-                        "justificado": justificado,
-                        "observaciones": obs,
-                        "registrada_por": request.user,
-                    }
+                valores = {"presente": estado == "P", "justificado": estado == "J", "observaciones": obs[:200]}
+                a = asist_by_atleta.get(ins.atleta_id)
+                if a is None:
+                    nuevos.append(AsistenciaAtleta(clase=clase, atleta=ins.atleta, registrada_por=request.user, **valores))
+                elif any(getattr(a, k) != v for k, v in valores.items()):
+                    for k, v in valores.items():
+                        setattr(a, k, v)
+                    a.registrada_por = request.user
+                    modificados.append(a)
+
+            with transaction.atomic():
+                AsistenciaAtleta.objects.bulk_create(nuevos, ignore_conflicts=True)
+                AsistenciaAtleta.objects.bulk_update(
+                    modificados, ["presente", "justificado", "observaciones", "registrada_por"]
                 )
-                guardados += 1
+                if nuevos or modificados:
+                    asistencia_unificada.proyectar(AsistenciaUnificada.Origen.ATLETA, clase_id=clase.pk)
+                    alertas.procesar_sesion_despues(clase.pk)
 
-            messages.success(request, f"Asistencia guardada para {guardados} alumno(s).")
+            messages.success(request, f"Asistencia guardada para {len(rows)} alumno(s).")
 
         return redirect("core:asistencia_tomar", curso_id=curso.id)
 
@@ -74,6 +74,20 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché compartida por los workers de gunicorn (tablero KPI).
+# La tabla se crea con `python manage.py createcachetable`.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache_kpi",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# PDF de los tableros KPI guardados en MEDIA_ROOT/kpi_pdf (se borran los menos usados)
+KPI_PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
 
 AUTH_USER_MODEL = "usuarios.Usuario"
 